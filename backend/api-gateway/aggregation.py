@@ -0,0 +1,131 @@
+"""
+@file: aggregation.py
+@description: Параллельный опрос сервисов с дедлайнами, пакетная загрузка по ключам и кэш снимков агрегатов для API Gateway
+@dependencies: asyncio, main.py (call_service, api_get_dashboard_stats, api_get_booking_details)
+@created: 2026-10-18
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+
+async def fan_out(
+    calls: Dict[str, Callable[[], Awaitable[Any]]],
+    timeout: Union[float, Dict[str, float]]
+) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """Параллельный запуск вызовов с дедлайном на каждый.
+
+    timeout - общий дедлайн или словарь дедлайнов по ключам вызовов.
+    Возвращает успешные результаты и причины неудач по ключам вызовов.
+    Медленный или упавший вызов не задерживает и не отменяет остальные.
+    """
+    async def run(key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        deadline = timeout[key] if isinstance(timeout, dict) else timeout
+        return await asyncio.wait_for(call(), deadline)
+
+    outcomes = await asyncio.gather(*(run(key, call) for key, call in calls.items()), return_exceptions=True)
+
+    results: Dict[str, Any] = {}
+    failures: Dict[str, str] = {}
+    for key, outcome in zip(calls, outcomes):
+        if isinstance(outcome, asyncio.TimeoutError):
+            failures[key] = "timeout"
+        elif isinstance(outcome, BaseException):
+            failures[key] = type(outcome).__name__
+        else:
+            results[key] = outcome
+    return results, failures
+
+
+class BatchLoader:
+    """Загрузчик по ключам в рамках одного запроса (dataloader).
+
+    Ключи, запрошенные через load одновременно (например, из параллельных
+    вызовов fan_out), загружаются одним вызовом fetch_many - по
+    max_batch ключей за вызов. Повторный ключ не запрашивается. fetch_many
+    возвращает словарь {ключ: значение}; отсутствующий ключ - None.
+    """
+
+    def __init__(self, fetch_many: Callable[[List[str]], Awaitable[Dict[str, Any]]], max_batch: int = 100):
+        self._fetch_many = fetch_many
+        self.max_batch = max_batch
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._pending: List[str] = []
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, key: str) -> Optional[Any]:
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[key] = loop.create_future()
+            self._pending.append(key)
+            if len(self._pending) == 1:
+                self._track(self._dispatch())
+        # shield: отмена одного ожидающего (дедлайн) не отменяет общий результат для остальных
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Значения по ключам; ключи без значения в ответ не входят"""
+        keys = list(dict.fromkeys(keys))
+        values = await asyncio.gather(*(self.load(key) for key in keys))
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def _track(self, coro: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self) -> None:
+        # Пакет отправляется, когда за итерацию event loop не добавилось ключей:
+        # успевают вложенные gather и задачи, запущенные в той же итерации
+        collected = -1
+        while collected != len(self._pending):
+            collected = len(self._pending)
+            await asyncio.sleep(0)
+        keys, self._pending = self._pending, []
+        for start in range(0, len(keys), self.max_batch):
+            self._track(self._run(keys[start:start + self.max_batch]))
+
+    async def _run(self, keys: List[str]) -> None:
+        try:
+            found = await self._fetch_many(keys)
+        except Exception as e:
+            for key in keys:
+                # Ошибка не кэшируется: следующий load запросит ключ снова
+                future = self._futures.pop(key)
+                future.set_exception(e)
+                # Ожидающих может не остаться (дедлайн): исключение считается полученным
+                future.exception()
+            return
+        for key in keys:
+            self._futures[key].set_result(found.get(key))
+
+
+class SnapshotCache:
+    """Кэш последнего снимка агрегата с коротким TTL.
+
+    Свежий снимок отдается без обращения к сервисам, а последний известный
+    используется как источник устаревших значений при частичных отказах.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._value: Optional[dict] = None
+        self._stored_at = 0.0
+
+    def get_fresh(self) -> Optional[dict]:
+        if self._value is None or time.monotonic() - self._stored_at > self.ttl_seconds:
+            return None
+        return self._value
+
+    @property
+    def last(self) -> Optional[dict]:
+        return self._value
+
+    def set(self, value: dict) -> None:
+        self._value = value
+        self._stored_at = time.monotonic()
+
+    def clear(self) -> None:
+        self._value = None
+        self._stored_at = 0.0
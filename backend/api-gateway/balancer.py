@@ -0,0 +1,163 @@
+"""
+@file: balancer.py
+@description: Балансировка запросов API Gateway между экземплярами сервиса (power of two choices) и проверки их здоровья
+@dependencies: httpx, upstream.py (UpstreamPool)
+@created: 2026-10-18
+"""
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import httpx
+
+P2C = "p2c"
+LEAST_OUTSTANDING = "least_outstanding"
+
+
+@dataclass(frozen=True)
+class BalancerSettings:
+    """Настройки балансировки и проверок здоровья одного сервиса"""
+    strategy: str = P2C
+    # Вес нового замера задержки в скользящем среднем экземпляра
+    latency_alpha: float = 0.3
+    health_interval: float = 5.0
+    health_timeout: float = 1.0
+    healthy_threshold: int = 2
+    unhealthy_threshold: int = 2
+    # Пассивное исключение: подряд идущие ошибки соединения и 5xx
+    eject_failures: int = 5
+    eject_seconds: float = 30.0
+
+
+class UpstreamInstance:
+    """Экземпляр сервиса: число запросов в работе, средняя задержка и состояние здоровья"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.latency: Optional[float] = None
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+        self._consecutive_failures = 0
+        self._health_streak = 0
+
+    def available(self, now: float) -> bool:
+        return self.healthy and now >= self.ejected_until
+
+    def observe_latency(self, latency: float, alpha: float) -> None:
+        self.latency = latency if self.latency is None else self.latency + alpha * (latency - self.latency)
+
+
+class Balancer:
+    """Выбор экземпляра сервиса для запроса.
+
+    p2c: из двух случайных доступных экземпляров выбирается тот, у которого
+    меньше (запросов в работе + 1) * средняя задержка; least_outstanding -
+    лучший по той же оценке среди всех. Экземпляр исключается из выбора, если
+    активная проверка /health неудачна unhealthy_threshold раз подряд или
+    eject_failures запросов подряд завершились ошибкой. Если доступных
+    экземпляров не осталось, выбор идет среди всех: отказ проверок здоровья
+    не должен сам по себе останавливать трафик.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        urls: List[str],
+        settings: BalancerSettings,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ):
+        if not urls:
+            raise ValueError(f"No instances configured for {name}")
+        self.name = name
+        self.instances = [UpstreamInstance(url) for url in urls]
+        self.settings = settings
+        self._clock = clock
+        self._rng = rng or random.Random()
+
+    def _score(self, instance: UpstreamInstance, default_latency: float) -> float:
+        latency = instance.latency if instance.latency is not None else default_latency
+        return (instance.outstanding + 1) * latency
+
+    def pick(self, avoid: Optional[UpstreamInstance] = None) -> UpstreamInstance:
+        """Экземпляр для следующего запроса; avoid - экземпляр, на котором запрос только что не удался"""
+        if len(self.instances) == 1:
+            return self.instances[0]
+        now = self._clock()
+        candidates = [
+            instance for instance in self.instances
+            if instance is not avoid and instance.available(now)
+        ] or [instance for instance in self.instances if instance is not avoid]
+        if len(candidates) == 1:
+            return candidates[0]
+
+        # Экземпляр без замеров оценивается по средней задержке остальных
+        known = [instance.latency for instance in candidates if instance.latency is not None]
+        default_latency = sum(known) / len(known) if known else 1.0
+        if self.settings.strategy == LEAST_OUTSTANDING:
+            return min(candidates, key=lambda instance: self._score(instance, default_latency))
+        first, second = self._rng.sample(candidates, 2)
+        return first if self._score(first, default_latency) <= self._score(second, default_latency) else second
+
+    def record(self, instance: UpstreamInstance, failed: bool, latency: Optional[float]) -> None:
+        """Учет результата запроса к экземпляру; latency - время до заголовков ответа"""
+        instance.requests += 1
+        if latency is not None and not failed:
+            instance.observe_latency(latency, self.settings.latency_alpha)
+        if not failed:
+            instance._consecutive_failures = 0
+            return
+        instance.failures += 1
+        instance._consecutive_failures += 1
+        if len(self.instances) > 1 and instance._consecutive_failures >= self.settings.eject_failures:
+            instance.ejected_until = self._clock() + self.settings.eject_seconds
+            instance.ejections += 1
+            instance._consecutive_failures = 0
+
+    def record_health(self, instance: UpstreamInstance, ok: bool, latency: float) -> None:
+        """Учет результата активной проверки: состояние меняется после серии одинаковых результатов"""
+        if ok:
+            instance.observe_latency(latency, self.settings.latency_alpha)
+        if ok != instance.healthy:
+            instance._health_streak += 1
+            threshold = self.settings.healthy_threshold if ok else self.settings.unhealthy_threshold
+            if instance._health_streak >= threshold:
+                instance.healthy = ok
+                instance._health_streak = 0
+        else:
+            instance._health_streak = 0
+
+    async def _check_instance(self, client: httpx.AsyncClient, instance: UpstreamInstance) -> None:
+        started = time.perf_counter()
+        try:
+            response = await client.get(f"{instance.url}/health", timeout=self.settings.health_timeout)
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        self.record_health(instance, ok, time.perf_counter() - started)
+
+    async def check_health(self, client_for: Callable[[UpstreamInstance], httpx.AsyncClient]) -> None:
+        """Параллельная проверка /health всех экземпляров (клиент выбирается для каждого экземпляра)"""
+        await asyncio.gather(*(self._check_instance(client_for(instance), instance) for instance in self.instances))
+
+    def stats(self) -> List[dict]:
+        now = self._clock()
+        return [
+            {
+                "url": instance.url,
+                "healthy": instance.healthy,
+                "ejected": now < instance.ejected_until,
+                "outstanding": instance.outstanding,
+                "latency_ms": round(instance.latency * 1000, 3) if instance.latency is not None else None,
+                "requests": instance.requests,
+                "failures": instance.failures,
+                "ejections": instance.ejections,
+            }
+            for instance in self.instances
+        ]
@@ -0,0 +1,58 @@
+"""
+@file: batch.py
+@description: Модели и вспомогательные функции пакетного эндпоинта POST /batch API Gateway
+@dependencies: pydantic, starlette, shared/responses.py, main.py (api_batch)
+@created: 2026-10-18
+"""
+from typing import Any, List, Optional
+
+from pydantic import BaseModel, Field
+from starlette.responses import Response, StreamingResponse
+
+from shared.responses import loads
+
+# Заголовки ответа сервиса, которые попадают в результат подзапроса
+SUB_RESPONSE_HEADERS = ("content-type", "etag", "cache-control", "location", "retry-after")
+
+
+class SubRequest(BaseModel):
+    """Подзапрос пакета: путь шлюза (с query-строкой), метод и тело"""
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+    body: Optional[Any] = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[SubRequest] = Field(..., min_length=1)
+
+
+async def read_response_body(response: Response) -> bytes:
+    """Тело ответа шлюза; потоковый ответ читается целиком и закрывается"""
+    if not isinstance(response, StreamingResponse):
+        return response.body
+    try:
+        return b"".join([chunk async for chunk in response.body_iterator])
+    finally:
+        if response.background is not None:
+            await response.background()
+
+
+def sub_response(request_id: Optional[str], status_code: int, headers: dict, body: bytes) -> dict:
+    """Результат подзапроса: JSON-тело разбирается, остальное отдается строкой"""
+    content_type = headers.get("content-type", "")
+    if not body:
+        decoded = None
+    elif "json" in content_type:
+        try:
+            decoded = loads(body)
+        except ValueError:
+            decoded = body.decode("utf-8", errors="replace")
+    else:
+        decoded = body.decode("utf-8", errors="replace")
+    return {
+        "id": request_id,
+        "status": status_code,
+        "headers": {name: value for name, value in headers.items() if name in SUB_RESPONSE_HEADERS},
+        "body": decoded,
+    }
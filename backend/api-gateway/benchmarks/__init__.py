@@ -0,0 +1,6 @@
+"""
+@file: __init__.py
+@description: Нагрузочные тесты API Gateway с локальными заглушками сервисов
+@dependencies: benchmarks/run.py
+@created: 2026-10-18
+"""
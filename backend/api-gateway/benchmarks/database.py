@@ -0,0 +1,309 @@
+"""
+@file: database.py
+@description: Конкурентность сервиса под смешанной нагрузкой чтения и записи: синхронная сессия SQLAlchemy и AsyncSession (shared/db.py)
+@dependencies: fastapi, httpx, sqlalchemy[asyncio], aiosqlite, shared/db.py, profile-service/main.py
+@created: 2026-10-18
+
+Запуск из backend/api-gateway:
+    python -m benchmarks.database --concurrency 1 16 64 --duration 5
+    python -m benchmarks.database --latency-ms 0 --write-ratio 0.5 --output /tmp/database.json
+
+Нагрузка - профили врачей Profile Service: GET /doctor-profiles/{user_id} и
+с долей --write-ratio PUT /doctor-profiles/{user_id}. "До" - прежний способ
+доступа к БД: синхронная сессия (get_db) в обработчиках async def, запросы
+выполняются прямо в event loop. "После" - приложение сервиса как есть, с
+AsyncSession из shared/db.py. Каждый вариант запускается в uvicorn (один
+процесс) с SQLite во временном каталоге и одинаковыми данными.
+
+--latency-ms добавляет задержку к каждому SQL-запросу в потоке, который его
+выполняет, - как сетевой обмен с PostgreSQL в другом контейнере. У
+синхронной сессии это поток event loop, у aiosqlite - отдельный поток
+соединения. Параллельно раз в 50 мс запрашивается GET /health: его задержка
+показывает, останавливают ли запросы к БД остальные запросы сервиса.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.util import await_only
+
+from benchmarks.serialization import load_service
+from shared.responses import FastJSONResponse
+
+GATEWAY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPECIALIZATIONS = ["therapist", "pediatrician", "cardiologist", "neurologist"]
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def _add_latency(engine: Engine, latency: float) -> None:
+    """Задержка перед каждым SQL-запросом в потоке, где запрос выполняется"""
+    if latency <= 0:
+        return
+
+    def delay(statement: str) -> None:
+        time.sleep(latency)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        driver_connection = getattr(dbapi_connection, "driver_connection", dbapi_connection)
+        result = driver_connection.set_trace_callback(delay)
+        if asyncio.iscoroutine(result):
+            # aiosqlite: обработчик устанавливается в потоке соединения
+            await_only(result)
+
+
+def seed(module: types.ModuleType, engine: Engine, profiles: int) -> None:
+    module.Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.add_all(
+            module.DoctorProfile(
+                user_id=user_id,
+                specialization=SPECIALIZATIONS[user_id % len(SPECIALIZATIONS)],
+                experience_years=user_id % 30,
+                consultation_price=1500.0,
+            )
+            for user_id in range(1, profiles + 1)
+        )
+        db.commit()
+
+
+def sync_app(module: types.ModuleType, engine: Engine) -> FastAPI:
+    """Те же эндпоинты с синхронной сессией в async def - доступ к БД до перехода на AsyncSession"""
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    DoctorProfile = module.DoctorProfile
+    app = FastAPI(default_response_class=FastJSONResponse)
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @app.get("/health")
+    async def health_check():
+        return {"status": "healthy"}
+
+    @app.get("/doctor-profiles/{user_id}", response_model=module.DoctorProfileResponse)
+    async def get_doctor_profile(user_id: int, db: Session = Depends(get_db)):
+        profile = db.query(DoctorProfile).filter(DoctorProfile.user_id == user_id).first()
+        if not profile:
+            raise HTTPException(status_code=404, detail="Doctor profile not found")
+        return profile
+
+    @app.put("/doctor-profiles/{user_id}", response_model=module.DoctorProfileResponse)
+    async def update_doctor_profile(
+        user_id: int,
+        profile_update: module.DoctorProfileUpdate,
+        db: Session = Depends(get_db),
+        current_user_id: int = Depends(module.get_user_from_header)
+    ):
+        if user_id != current_user_id:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        profile = db.query(DoctorProfile).filter(DoctorProfile.user_id == user_id).first()
+        if not profile:
+            raise HTTPException(status_code=404, detail="Doctor profile not found")
+        for field, value in profile_update.dict(exclude_unset=True).items():
+            setattr(profile, field, value)
+        db.commit()
+        db.refresh(profile)
+        return profile
+
+    return app
+
+
+def create_app() -> FastAPI:
+    """Фабрика uvicorn: вариант, база и задержка - из переменных окружения BENCH_*"""
+    module = load_service("profile", os.environ["BENCH_DATABASE_URL"])
+    latency = float(os.getenv("BENCH_LATENCY_MS", "0")) / 1000
+    if os.environ["BENCH_VARIANT"] == "async":
+        _add_latency(module.database.engine.sync_engine, latency)
+        return module.app
+    engine = create_engine(os.environ["BENCH_DATABASE_URL"], connect_args={"check_same_thread": False})
+    _add_latency(engine, latency)
+    return sync_app(module, engine)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited with code {process.returncode} before {url} became ready")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} is not ready after {timeout} s")
+
+
+@contextmanager
+def _service(variant: str, database_url: str, latency_ms: float) -> Iterator[str]:
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        "BENCH_VARIANT": variant,
+        "BENCH_DATABASE_URL": database_url,
+        "BENCH_LATENCY_MS": str(latency_ms),
+        "LOG_SAMPLE_RATE": "0",
+    })
+    command = [
+        sys.executable, "-m", "uvicorn", "benchmarks.database:create_app", "--factory",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, cwd=GATEWAY_DIR, env=env, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(f"{base_url}/health", process)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def _drive(base_url: str, profiles: int, concurrency: int, duration: float, write_ratio: float) -> dict:
+    latencies: Dict[str, List[float]] = {"read": [], "write": []}
+    probes: List[float] = []
+    statuses: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+
+        async def worker(seed_value: int, until: float) -> None:
+            rng = random.Random(seed_value)
+            while time.perf_counter() < until:
+                user_id = rng.randint(1, profiles)
+                path = f"/doctor-profiles/{user_id}"
+                kind = "write" if rng.random() < write_ratio else "read"
+                started = time.perf_counter()
+                try:
+                    if kind == "write":
+                        response = await client.put(
+                            path,
+                            json={"consultation_price": rng.randint(1000, 5000), "is_available": rng.random() < 0.8},
+                            headers={"Authorization": f"Bearer {user_id}"},
+                        )
+                    else:
+                        response = await client.get(path)
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    # Синхронная сессия при исчерпании пула соединений останавливает event loop до pool_timeout
+                    status = type(e).__name__
+                latencies[kind].append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        async def probe(until: float) -> None:
+            while time.perf_counter() < until:
+                started = time.perf_counter()
+                try:
+                    await client.get("/health")
+                except httpx.HTTPError:
+                    pass
+                probes.append(time.perf_counter() - started)
+                await asyncio.sleep(0.05)
+
+        started = time.perf_counter()
+        until = started + duration
+        await asyncio.gather(probe(until), *(worker(index, until) for index in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    total = len(latencies["read"]) + len(latencies["write"])
+    return {
+        "requests": total,
+        "statuses": statuses,
+        "requests_per_second": round(total / elapsed, 1),
+        "read_p50_ms": round(_percentile(latencies["read"], 0.5) * 1000, 1),
+        "read_p95_ms": round(_percentile(latencies["read"], 0.95) * 1000, 1),
+        "write_p95_ms": round(_percentile(latencies["write"], 0.95) * 1000, 1),
+        "health_p95_ms": round(_percentile(probes, 0.95) * 1000, 1),
+        "health_max_ms": round(max(probes, default=0.0) * 1000, 1),
+    }
+
+
+def format_table(results: List[dict]) -> str:
+    header = (
+        f"{'variant':<7} {'conc':>5} {'req/s':>8} {'read_p50':>9} {'read_p95':>9} {'write_p95':>10} "
+        f"{'errors':>7} {'health_p95':>10} {'health_max':>10}"
+    )
+    lines = [header, "-" * len(header)]
+    for row in results:
+        errors = sum(count for status, count in row["statuses"].items() if status != "200")
+        lines.append(
+            f"{row['variant']:<7} {row['concurrency']:>5} {row['requests_per_second']:>8} "
+            f"{row['read_p50_ms']:>9} {row['read_p95_ms']:>9} {row['write_p95_ms']:>10} {errors:>7} "
+            f"{row['health_p95_ms']:>10} {row['health_max_ms']:>10}"
+        )
+    return "\n".join(lines)
+
+
+def run(concurrency: List[int], duration: float, profiles: int, write_ratio: float,
+        latency_ms: float, directory: str) -> List[dict]:
+    # Модели для заполнения базы; сервис в этом процессе не запускается
+    module = load_service("profile")
+    results = []
+    for variant in ("sync", "async"):
+        database_url = f"sqlite:///{os.path.join(directory, f'{variant}.db')}"
+        engine = create_engine(database_url)
+        seed(module, engine, profiles)
+        engine.dispose()
+        with _service(variant, database_url, latency_ms) as base_url:
+            for level in concurrency:
+                result = asyncio.run(_drive(base_url, profiles, level, duration, write_ratio))
+                result.update({"variant": variant, "concurrency": level})
+                results.append(result)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Конкурентность сервиса при смешанном чтении и записи в БД")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--duration", type=float, default=5.0, help="секунд на каждый уровень")
+    parser.add_argument("--profiles", type=int, default=1000, help="профилей врачей в базе")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="доля запросов PUT")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="задержка на каждый SQL-запрос")
+    parser.add_argument("--output", help="файл результатов JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = run(args.concurrency, args.duration, args.profiles, args.write_ratio, args.latency_ms, directory)
+
+    print(format_table(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"latency_ms": args.latency_ms, "write_ratio": args.write_ratio, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+@file: loadgen.py
+@description: Асинхронный генератор нагрузки и сводка результатов (RPS, p50/p95/p99) для API Gateway
+@dependencies: httpx, benchmarks/run.py
+@created: 2026-10-18
+"""
+import asyncio
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """Сценарий нагрузки: один маршрут шлюза; headers(tokens) - заголовки запроса"""
+    name: str
+    method: str
+    path: str
+    headers: Callable[[Dict[str, str]], Dict[str, str]] = lambda tokens: {}
+    body: Optional[dict] = None
+    description: str = ""
+
+
+def _bearer(role: str) -> Callable[[Dict[str, str]], Dict[str, str]]:
+    return lambda tokens: {"Authorization": f"Bearer {tokens[role]}"}
+
+
+# Маршруты разных типов: аутентификация, проксирование и агрегация нескольких сервисов
+SCENARIOS = {
+    "auth": Scenario(
+        "auth", "POST", "/auth/login",
+        body={"email": "bench@example.com", "password": "benchmark123"},
+        description="Вход без токена: проксирование в User Service с приоритетом high",
+    ),
+    "auth_me": Scenario("auth_me", "GET", "/auth/me", headers=_bearer("patient"), description="Проверка JWT и проксирование"),
+    "proxy": Scenario("proxy", "GET", "/bookings", headers=_bearer("patient"), description="Проксирование списка заказов"),
+    "aggregate": Scenario(
+        "aggregate", "GET", "/api/dashboard/stats", headers=_bearer("admin"),
+        description="Параллельный опрос User, Profile и Booking Service",
+    ),
+}
+DEFAULT_SCENARIOS = ("auth", "proxy", "aggregate")
+
+
+@dataclass
+class ScenarioResult:
+    """Замеры одного сценария"""
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: Dict[int, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по отсортированной выборке (ближайший ранг)"""
+    if not sorted_values:
+        return 0.0
+    index = min(max(math.ceil(q * len(sorted_values)) - 1, 0), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(result: ScenarioResult) -> dict:
+    """Машиночитаемая сводка сценария; задержки в миллисекундах"""
+    latencies = sorted(result.latencies)
+    completed = len(latencies)
+    return {
+        "requests": completed + result.errors,
+        "errors": result.errors,
+        "statuses": {str(status): count for status, count in sorted(result.statuses.items())},
+        "duration_seconds": round(result.elapsed, 3),
+        "rps": round(completed / result.elapsed, 1) if result.elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    tokens: Dict[str, str],
+    concurrency: int,
+    duration: float,
+) -> ScenarioResult:
+    """Замкнутый цикл: concurrency воркеров отправляют запросы, пока не истечет duration.
+
+    Задержкой считается время до полного получения ответа. Ответы не 2xx
+    учитываются как ошибки и в перцентили не попадают.
+    """
+    result = ScenarioResult(scenario.name)
+    headers = scenario.headers(tokens)
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, scenario.path, headers=headers, json=scenario.body)
+            except httpx.HTTPError:
+                result.errors += 1
+                continue
+            latency = time.perf_counter() - started
+            result.statuses[response.status_code] = result.statuses.get(response.status_code, 0) + 1
+            if response.is_success:
+                result.latencies.append(latency)
+            else:
+                result.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def compare(baseline: dict, current: dict, max_regression: float) -> List[str]:
+    """Сравнение с результатами другого коммита.
+
+    Возвращает описания регрессий: падение RPS или рост p95/p99 больше max_regression (доля).
+    """
+    regressions = []
+    for name, summary in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        if before["rps"] and summary["rps"] < before["rps"] * (1 - max_regression):
+            regressions.append(f"{name}: rps {before['rps']} -> {summary['rps']}")
+        for metric in ("p95_ms", "p99_ms"):
+            if before[metric] and summary[metric] > before[metric] * (1 + max_regression):
+                regressions.append(f"{name}: {metric} {before[metric]} -> {summary[metric]}")
+    return regressions
+
+
+def format_table(results: Dict[str, dict], baseline: Optional[dict] = None) -> str:
+    """Таблица для вывода в консоль; при наличии baseline - изменение RPS и p95 в процентах.
+
+    conns - пик одновременных соединений шлюза с сервисами.
+    """
+    header = f"{'scenario':<12}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'conns':>7}"
+    if baseline:
+        header += f"{'rps Δ%':>9}{'p95 Δ%':>9}"
+    lines = [header]
+    for name, summary in results.items():
+        line = (
+            f"{name:<12}{summary['requests']:>10}{summary['errors']:>8}{summary['rps']:>10}"
+            f"{summary['p50_ms']:>10}{summary['p95_ms']:>10}{summary['p99_ms']:>10}"
+            f"{summary.get('upstream_connections', {}).get('peak', '-'):>7}"
+        )
+        before = (baseline or {}).get("scenarios", {}).get(name)
+        if before:
+            for metric in ("rps", "p95_ms"):
+                delta = (summary[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+                line += f"{delta:>+9.1f}"
+        lines.append(line)
+    return "\n".join(lines)
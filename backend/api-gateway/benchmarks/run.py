@@ -0,0 +1,243 @@
+"""
+@file: run.py
+@description: Нагрузочный тест API Gateway: заглушки сервисов, реальный шлюз (uvicorn), отчет и сравнение с базой
+@dependencies: uvicorn, httpx, PyJWT, benchmarks/stubs.py, benchmarks/loadgen.py
+@created: 2026-10-18
+
+Запуск из backend/api-gateway:
+    python -m benchmarks.run --duration 10 --concurrency 64
+    python -m benchmarks.run --compare benchmarks/results/<commit>.json --max-regression 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+import jwt
+
+from benchmarks.loadgen import DEFAULT_SCENARIOS, SCENARIOS, compare, format_table, run_scenario, summarize
+from benchmarks.stubs import STATS_PATH
+
+GATEWAY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(GATEWAY_DIR, "benchmarks", "results")
+BENCH_JWT_SECRET = "benchmark-secret-key-for-local-runs-only"
+
+# Записи SERVICES шлюза и переменные окружения с их адресами
+SERVICE_ENV = {
+    "user": "USER_SERVICE_URL",
+    "profile": "PROFILE_SERVICE_URL",
+    "booking": "BOOKING_SERVICE_URL",
+    "geo": "GEO_SERVICE_URL",
+    "payment": "PAYMENT_SERVICE_URL",
+    "notification": "NOTIFICATION_SERVICE_URL",
+    "chat": "CHAT_SERVICE_URL",
+    "rating": "RATING_SERVICE_URL",
+    "event": "EVENT_SERVICE_URL",
+    "emergency": "EMERGENCY_SERVICE_URL",
+    "security": "SECURITY_SERVICE_URL",
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=GATEWAY_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _tokens() -> Dict[str, str]:
+    expires = datetime.now(timezone.utc) + timedelta(hours=1)
+    return {
+        role: jwt.encode(
+            {"user_id": f"bench-{role}", "email": f"bench-{role}@example.com", "role": role, "exp": expires},
+            BENCH_JWT_SECRET,
+            algorithm="HS256",
+        )
+        for role in ("patient", "admin")
+    }
+
+
+def _stub_specs(args) -> Dict[str, dict]:
+    specs = {
+        name: {
+            "port": _free_port(),
+            "latency_ms": args.stub_latency_ms,
+            "jitter_ms": args.stub_jitter_ms,
+            "payload_bytes": args.payload_bytes,
+        }
+        for name in SERVICE_ENV
+    }
+    for override in args.stub:
+        # --stub booking:latency_ms=50,payload_bytes=4096
+        name, _, fields = override.partition(":")
+        for item in fields.split(","):
+            key, _, value = item.partition("=")
+            specs[name][key] = float(value) if key != "payload_bytes" else int(value)
+    return specs
+
+
+def _gateway_env(args, specs: Dict[str, dict]) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.pop("REDIS_URL", None)
+    env.update({
+        env_name: f"http://127.0.0.1:{specs[name]['port']}" for name, env_name in SERVICE_ENV.items()
+    })
+    env.update({
+        "JWT_SECRET": BENCH_JWT_SECRET,
+        # Ограничение частоты и снимок дашборда исказили бы измерение пропускной способности
+        "RATE_LIMIT_ENABLED": "false",
+        "DASHBOARD_CACHE_TTL_SECONDS": "0",
+        "LOG_SAMPLE_RATE": str(args.log_sample_rate),
+    })
+    env.update(dict(item.split("=", 1) for item in args.gateway_env))
+    return env
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited with code {process.returncode} before {url} became ready")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} is not ready after {timeout} s")
+
+
+@contextmanager
+def _process(command: List[str], env: Optional[Dict[str, str]] = None) -> Iterator[subprocess.Popen]:
+    process = subprocess.Popen(command, cwd=GATEWAY_DIR, env=env, stdout=subprocess.DEVNULL)
+    try:
+        yield process
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def _stub_connections(client: httpx.AsyncClient, specs: Dict[str, dict]) -> dict:
+    """Соединения шлюза с заглушками с прошлого опроса (счетчики сбрасываются)"""
+    responses = await asyncio.gather(*(
+        client.get(f"http://127.0.0.1:{spec['port']}{STATS_PATH}?reset=1") for spec in specs.values()
+    ))
+    stats = [response.json() for response in responses]
+    return {
+        "opened": sum(item["connections"] for item in stats),
+        "peak": sum(item["peak_connections"] for item in stats),
+    }
+
+
+async def _drive(base_url: str, args, specs: Dict[str, dict]) -> Dict[str, dict]:
+    tokens = _tokens()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client, \
+            httpx.AsyncClient(timeout=5.0) as stubs_client:
+        results = {}
+        for name in args.scenarios:
+            scenario = SCENARIOS[name]
+            # Прогрев: соединения пулов шлюза и замеры задержек до начала измерения
+            await run_scenario(client, scenario, tokens, args.concurrency, args.warmup)
+            await _stub_connections(stubs_client, specs)
+            result = await run_scenario(client, scenario, tokens, args.concurrency, args.duration)
+            results[name] = summarize(result)
+            # opened - новые соединения шлюза за измерение, peak - одновременно открытых
+            results[name]["upstream_connections"] = await _stub_connections(stubs_client, specs)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API Gateway с заглушками сервисов")
+    parser.add_argument("--scenarios", nargs="+", default=list(DEFAULT_SCENARIOS), choices=sorted(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд на сценарий")
+    parser.add_argument("--warmup", type=float, default=2.0, help="секунд прогрева перед сценарием")
+    parser.add_argument("--workers", type=int, default=1, help="процессов uvicorn шлюза")
+    parser.add_argument("--stub-latency-ms", type=float, default=5.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=1.0)
+    parser.add_argument("--payload-bytes", type=int, default=2048)
+    parser.add_argument("--stub", action="append", default=[], help="переопределение заглушки: booking:latency_ms=50")
+    parser.add_argument("--gateway-env", action="append", default=[], help="переменная окружения шлюза: NAME=value")
+    parser.add_argument("--log-sample-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл результатов JSON (по умолчанию benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="файл результатов другого коммита для сравнения")
+    parser.add_argument("--max-regression", type=float, default=0.1, help="допустимое ухудшение (доля)")
+    args = parser.parse_args()
+
+    specs = _stub_specs(args)
+    gateway_port = _free_port()
+    stub_command = [sys.executable, "-m", "benchmarks.stubs", "--spec", json.dumps(specs), "--seed", str(args.seed)]
+    gateway_command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1", "--port", str(gateway_port),
+        "--workers", str(args.workers), "--no-access-log", "--log-level", "warning",
+    ]
+    base_url = f"http://127.0.0.1:{gateway_port}"
+
+    with _process(stub_command) as stubs:
+        _wait_ready(f"http://127.0.0.1:{specs['user']['port']}/health", stubs)
+        with _process(gateway_command, env=_gateway_env(args, specs)) as gateway:
+            _wait_ready(f"{base_url}/health", gateway)
+            results = asyncio.run(_drive(base_url, args, specs))
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "gateway_workers": args.workers,
+            "seed": args.seed,
+            "gateway_env": args.gateway_env,
+            "stubs": specs,
+        },
+        "scenarios": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+    print(format_table(results, baseline))
+    print(f"\nResults: {output}")
+
+    if baseline is not None:
+        regressions = compare(baseline, report, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
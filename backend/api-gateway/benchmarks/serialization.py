@@ -0,0 +1,215 @@
+"""
+@file: serialization.py
+@description: Стоимость сериализации JSON списочных эндпоинтов сервисов: стандартный путь FastAPI и FastJSONResponse
+@dependencies: fastapi, pydantic, sqlalchemy, shared/responses.py, main.py сервисов
+@created: 2026-10-18
+
+Запуск из backend/api-gateway:
+    python -m benchmarks.serialization --items 50
+    python -m benchmarks.serialization --items 10 100 --output /tmp/serialization.json
+
+"До" - путь FastAPI без default_response_class: проверка результата по
+response_model, выгрузка в словари (jsonable) и JSONResponse. "После" - то,
+что делает эндпоинт сейчас: готовые модели сразу в FastJSONResponse.
+Сервисы загружаются с базой SQLite в памяти; сервис, зависимости которого
+не установлены, пропускается.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import time
+import types
+import typing
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.routing import APIRoute, serialize_response
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, BACKEND_DIR)
+
+from shared.responses import FastJSONResponse  # noqa: E402
+
+
+@dataclass
+class Case:
+    """Списочный эндпоинт: сервис, маршрут, модель элемента и форма ответа"""
+    service: str
+    method: str
+    path: str
+    model: str
+    # Ответ эндпоинта из списка элементов; по умолчанию - сам список моделей
+    build: Optional[Callable[[List[BaseModel]], Any]] = None
+
+
+def _users_page(items: List[BaseModel]) -> dict:
+    users = [item.model_dump() for item in items]
+    return {"users": users, "total": len(users), "page": 1, "limit": len(users), "pages": 1}
+
+
+def _doctors_list(items: List[BaseModel]) -> dict:
+    return {"doctors": [item.model_dump() for item in items]}
+
+
+CASES = [
+    Case("booking", "GET", "/bookings", "BookingResponse"),
+    Case("booking", "GET", "/bookings/{booking_id}/messages", "MessageResponse"),
+    Case("geo", "GET", "/geo/doctors/nearby", "NearbyDoctorResponse"),
+    Case("geo", "GET", "/geo/history/{user_id}", "LocationHistoryResponse"),
+    Case("user", "GET", "/users", "UserResponse", _users_page),
+    Case("user", "GET", "/api/doctors/list", "UserResponse", _doctors_list),
+]
+
+
+def load_service(service: str, database_url: str = "sqlite://") -> types.ModuleType:
+    """main.py сервиса под отдельным именем модуля (у всех сервисов он называется main)"""
+    # Движок создается при импорте: по умолчанию база в памяти, а не файл или PostgreSQL
+    os.environ["DATABASE_URL"] = database_url
+    path = os.path.join(BACKEND_DIR, f"{service}-service", "main.py")
+    # Соседние модули сервиса (password_pool.py у User Service)
+    if os.path.dirname(path) not in sys.path:
+        sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location(f"{service}_service_main", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _sample_value(name: str, annotation: Any, index: int) -> Any:
+    if typing.get_origin(annotation) is typing.Union:
+        annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+    if annotation is bool:
+        return index % 2 == 0
+    if annotation is int:
+        return index
+    if annotation is float:
+        return index * 0.5 + 0.25
+    if annotation is datetime:
+        return datetime(2026, 10, 18, 9, 0, 0, 123456) + timedelta(minutes=index)
+    if annotation is date:
+        return date(2026, 10, 18) + timedelta(days=index)
+    if annotation is Decimal:
+        return Decimal(index) / 4
+    if name == "id" or name.endswith("_id"):
+        return str(uuid.UUID(int=index))
+    return f"{name}-{index:06d}"
+
+
+def sample_items(model: type, count: int) -> List[BaseModel]:
+    """Модели ответа, заполненные как из базы: все необязательные поля заданы"""
+    return [
+        model(**{name: _sample_value(name, field.annotation, index) for name, field in model.model_fields.items()})
+        for index in range(count)
+    ]
+
+
+def _route(app: Any, method: str, path: str) -> APIRoute:
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.path == path and method in route.methods:
+            return route
+    raise LookupError(f"{method} {path}")
+
+
+async def _standard_body(route: APIRoute, content: Any) -> bytes:
+    """Стандартный путь FastAPI: проверка по response_model, jsonable-словари, JSONResponse"""
+    serialized = await serialize_response(field=route.response_field, response_content=content, is_coroutine=True)
+    return JSONResponse(serialized).body
+
+
+async def _fast_body(content: Any) -> bytes:
+    return FastJSONResponse(content).body
+
+
+async def _measure(func: Callable[[], Any], rounds: int, iterations: int) -> float:
+    """Медиана по раундам, микросекунд на ответ"""
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await func()
+        timings.append((time.perf_counter() - started) / iterations * 1e6)
+    return statistics.median(timings)
+
+
+async def run_case(app: Any, module: types.ModuleType, case: Case, count: int, rounds: int) -> dict:
+    route = _route(app, case.method, case.path)
+    items = sample_items(getattr(module, case.model), count)
+    content = case.build(items) if case.build else items
+
+    before_body = await _standard_body(route, content)
+    after_body = await _fast_body(content)
+    if json.loads(before_body) != json.loads(after_body):
+        raise AssertionError(f"{case.method} {case.path}: ответы различаются")
+
+    iterations = max(10, 20_000 // max(count, 1))
+    before = await _measure(lambda: _standard_body(route, content), rounds, iterations)
+    after = await _measure(lambda: _fast_body(content), rounds, iterations)
+    return {
+        "endpoint": f"{case.method} {case.path}",
+        "items": count,
+        "bytes": len(after_body),
+        "before_us": round(before, 1),
+        "after_us": round(after, 1),
+        "speedup": round(before / after, 2) if after else None,
+    }
+
+
+def format_table(results: List[dict]) -> str:
+    header = f"{'endpoint':<40} {'items':>6} {'bytes':>8} {'before_us':>10} {'after_us':>10} {'speedup':>8}"
+    lines = [header, "-" * len(header)]
+    for row in results:
+        lines.append(
+            f"{row['endpoint']:<40} {row['items']:>6} {row['bytes']:>8} "
+            f"{row['before_us']:>10} {row['after_us']:>10} {row['speedup']:>7}x"
+        )
+    return "\n".join(lines)
+
+
+async def run(counts: List[int], rounds: int, services: Optional[List[str]] = None) -> Dict[str, Any]:
+    results, skipped = [], {}
+    modules: Dict[str, types.ModuleType] = {}
+    for case in CASES:
+        if services and case.service not in services:
+            continue
+        if case.service not in modules and case.service not in skipped:
+            try:
+                modules[case.service] = load_service(case.service)
+            except ImportError as e:
+                skipped[case.service] = str(e)
+        if case.service in skipped:
+            continue
+        module = modules[case.service]
+        for count in counts:
+            results.append(await run_case(module.app, module, case, count, rounds))
+    return {"results": results, "skipped": skipped}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Стоимость сериализации списочных эндпоинтов сервисов")
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 50, 200], help="элементов в ответе")
+    parser.add_argument("--rounds", type=int, default=5, help="раундов измерения (берется медиана)")
+    parser.add_argument("--services", nargs="+", choices=sorted({case.service for case in CASES}))
+    parser.add_argument("--output", help="файл результатов JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.items, args.rounds, args.services))
+    print(format_table(report["results"]))
+    for service, error in report["skipped"].items():
+        print(f"skipped {service}: {error}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""
+@file: stubs.py
+@description: Легкие HTTP-заглушки сервисов для нагрузочных тестов API Gateway
+@dependencies: asyncio (без фреймворков), h2 (опционально, для h2c), benchmarks/run.py
+@created: 2026-10-18
+
+Запуск отдельно: python -m benchmarks.stubs --spec '{"user": {"port": 18001, "latency_ms": 5}}'
+"""
+import argparse
+import asyncio
+import json
+import random
+import signal
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+except ImportError:  # без h2 заглушки работают только по HTTP/1.1
+    h2 = None
+
+# Первая строка префикса соединения HTTP/2 (RFC 9113, раздел 3.4)
+H2_PREFACE_LINE = b"PRI * HTTP/2.0\r\n"
+STATS_PATH = "/__stub/stats"
+
+
+@dataclass(frozen=True)
+class StubSpec:
+    """Поведение заглушки одного сервиса"""
+    port: int
+    latency_ms: float = 5.0
+    jitter_ms: float = 0.0
+    payload_bytes: int = 512
+    # Принимать h2c (HTTP/2 prior knowledge); False - сервис без поддержки HTTP/2
+    http2: bool = True
+
+
+def _payload(size: int) -> bytes:
+    """JSON-массив записей заданного размера (примерно), одинаковый при каждом запуске"""
+    item = {"id": 0, "status": "pending", "comment": "x" * 64}
+    step = len(json.dumps(item)) + 1
+    items = [{**item, "id": index} for index in range(max(size // step, 1))]
+    return json.dumps(items).encode()
+
+
+# Ответы, которые шлюз разбирает сам (агрегация статистики дашборда)
+_FIXED_RESPONSES = {
+    "/health": b'{"status": "healthy"}',
+    "/users/count": b'{"count": 1000}',
+    "/doctor-profiles/count": b'{"count": 100}',
+    "/clinic-profiles/count": b'{"count": 10}',
+    "/bookings/stats": b'{"total": 500, "by_status": {"pending": 10, "assigned": 5, "in_progress": 3, "completed": 482}}',
+    "/auth/login": b'{"access_token": "stub", "token_type": "bearer"}',
+}
+
+
+class StubServer:
+    """HTTP/1.1-сервер с keep-alive (и h2c при наличии h2): отвечает на любой путь после задержки.
+
+    Обработка минимальна, чтобы заглушки не становились узким местом
+    измерения: без фреймворка, тело ответа подготовлено заранее.
+    GET /__stub/stats возвращает число соединений шлюза (?reset=1 - со сбросом).
+    """
+
+    def __init__(self, name: str, spec: StubSpec, seed: int = 0):
+        self.name = name
+        self.spec = spec
+        self.body = _payload(spec.payload_bytes)
+        self._random = random.Random(seed)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.requests = 0
+        self.connections = 0
+        self.open_connections = 0
+        self.peak_connections = 0
+
+    async def start(self, host: str = "127.0.0.1") -> None:
+        self._server = await asyncio.start_server(self._handle, host, self.spec.port, backlog=1024)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _connection_opened(self) -> None:
+        # Соединение считается при первом запросе, не относящемся к служебным
+        self.connections += 1
+        self.open_connections += 1
+        self.peak_connections = max(self.peak_connections, self.open_connections)
+
+    def _stats(self, query: bytes) -> bytes:
+        body = json.dumps({
+            "requests": self.requests,
+            "connections": self.connections,
+            "open_connections": self.open_connections,
+            "peak_connections": self.peak_connections,
+        }).encode()
+        if b"reset=1" in query:
+            self.requests = self.connections = 0
+            self.peak_connections = self.open_connections
+        return body
+
+    def _respond(self, target: bytes) -> Optional[bytes]:
+        """Тело ответа на путь; None - служебный запрос без задержки (ответ уже готов)"""
+        path = target.split(b"?")[0].decode()
+        if path == STATS_PATH:
+            return None
+        return _FIXED_RESPONSES.get(path, self.body)
+
+    def _delay(self) -> float:
+        jitter = self._random.uniform(-self.spec.jitter_ms, self.spec.jitter_ms) if self.spec.jitter_ms else 0.0
+        return max(self.spec.latency_ms + jitter, 0.0) / 1000
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        counted = False
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                if request_line == H2_PREFACE_LINE:
+                    if self.spec.http2 and h2 is not None:
+                        await self._handle_h2(request_line, reader, writer)
+                    else:
+                        # Как сервер без HTTP/2: отказ в разборе запроса и закрытие соединения
+                        writer.write(b"HTTP/1.1 400 Bad Request\r\ncontent-length: 0\r\nconnection: close\r\n\r\n")
+                    break
+                target = request_line.split(b" ")[1]
+                content_length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        content_length = int(value.strip())
+                if content_length:
+                    await reader.readexactly(content_length)
+
+                body = self._respond(target)
+                if body is None:
+                    body = self._stats(target)
+                else:
+                    if not counted and not target.startswith(b"/health"):
+                        counted = True
+                        self._connection_opened()
+                    self.requests += 1
+                    if not target.startswith(b"/health"):
+                        await asyncio.sleep(self._delay())
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+                    b"content-length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if counted:
+                self.open_connections -= 1
+            writer.close()
+
+    async def _handle_h2(self, preface: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """h2c-соединение: каждый поток обслуживается отдельной задачей, ответы мультиплексируются"""
+        connection = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False))
+        connection.initiate_connection()
+        window_updated = asyncio.Event()
+        targets: Dict[int, bytes] = {}
+        tasks = set()
+        self._connection_opened()
+
+        async def respond(stream_id: int, target: bytes) -> None:
+            body = self._respond(target)
+            if body is None:
+                body = self._stats(target)
+            else:
+                self.requests += 1
+                if not target.startswith(b"/health"):
+                    await asyncio.sleep(self._delay())
+            connection.send_headers(stream_id, [
+                (":status", "200"), ("content-type", "application/json"), ("content-length", str(len(body))),
+            ])
+            while body:
+                window = min(connection.local_flow_control_window(stream_id), connection.max_outbound_frame_size)
+                if window <= 0:
+                    # Окно управления потоком исчерпано: ждем WINDOW_UPDATE клиента
+                    window_updated.clear()
+                    writer.write(connection.data_to_send())
+                    await window_updated.wait()
+                    continue
+                connection.send_data(stream_id, body[:window])
+                body = body[window:]
+            connection.end_stream(stream_id)
+            writer.write(connection.data_to_send())
+
+        data = preface
+        try:
+            while data:
+                for event in connection.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        targets[event.stream_id] = dict(event.headers).get(b":path", b"/")
+                    elif isinstance(event, h2.events.DataReceived):
+                        connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2.events.StreamEnded):
+                        task = asyncio.ensure_future(respond(event.stream_id, targets.pop(event.stream_id, b"/")))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    elif isinstance(event, h2.events.WindowUpdated):
+                        window_updated.set()
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+                writer.write(connection.data_to_send())
+                await writer.drain()
+                data = await reader.read(65536)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.open_connections -= 1
+
+
+async def serve(specs: Dict[str, StubSpec], seed: int = 0) -> None:
+    """Запуск заглушек всех сервисов до сигнала остановки"""
+    servers = [StubServer(name, spec, seed) for name, spec in specs.items()]
+    for server in servers:
+        await server.start()
+    print(json.dumps({"ready": {name: asdict(spec) for name, spec in specs.items()}}), flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+    for server in servers:
+        await server.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTTP-заглушки сервисов ТОТ для нагрузочных тестов")
+    parser.add_argument("--spec", required=True, help='JSON: {"<service>": {"port": 18001, "latency_ms": 5, ...}}')
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    specs = {name: StubSpec(**fields) for name, fields in json.loads(args.spec).items()}
+    asyncio.run(serve(specs, args.seed))
+
+
+if __name__ == "__main__":
+    main()
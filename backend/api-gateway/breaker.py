@@ -0,0 +1,159 @@
+"""
+@file: breaker.py
+@description: Автоматический выключатель (circuit breaker) запросов API Gateway к сервису
+@dependencies: upstream.py (UpstreamPool), main.py (forward_request, call_service)
+@created: 2026-10-18
+"""
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, List
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Выключатель сервиса разомкнут: запрос отклонен без обращения к сервису"""
+
+    def __init__(self, service_name: str, retry_after: float):
+        super().__init__(f"Circuit for {service_name} is open")
+        self.service_name = service_name
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class BreakerSettings:
+    """Пороги выключателя одного сервиса"""
+    window_seconds: int = 30
+    min_calls: int = 20
+    failure_rate: float = 0.5
+    slow_call_seconds: float = 5.0
+    slow_call_rate: float = 0.8
+    open_seconds: float = 15.0
+    half_open_calls: int = 3
+
+
+class CircuitBreaker:
+    """Выключатель с состояниями closed, open и half_open.
+
+    В closed вызовы учитываются в скользящем окне по секундам. Если в окне
+    набралось min_calls вызовов и доля ошибок или медленных вызовов превысила
+    порог, выключатель размыкается: open_seconds запросы отклоняются сразу.
+    Затем в half_open пропускается half_open_calls пробных вызовов; их успех
+    замыкает выключатель, любая неудача снова размыкает.
+    """
+
+    def __init__(self, name: str, settings: BreakerSettings, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.settings = settings
+        self._clock = clock
+        self.state = CLOSED
+        # Корзины окна: [секунда, вызовы, ошибки, медленные]
+        self._buckets: Deque[List[int]] = deque()
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.opened_total = 0
+        self.rejected_total = 0
+
+    def _window(self) -> tuple:
+        horizon = int(self._clock()) - self.settings.window_seconds
+        while self._buckets and self._buckets[0][0] <= horizon:
+            self._buckets.popleft()
+        calls = sum(bucket[1] for bucket in self._buckets)
+        failures = sum(bucket[2] for bucket in self._buckets)
+        slow = sum(bucket[3] for bucket in self._buckets)
+        return calls, failures, slow
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = self._clock()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.opened_total += 1
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self._buckets.clear()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def _reject(self, retry_after: float) -> None:
+        self.rejected_total += 1
+        raise CircuitOpenError(self.name, max(retry_after, 0.0))
+
+    def before_call(self) -> bool:
+        """Разрешение вызова; True - вызов пробный (half_open).
+
+        В разомкнутом состоянии выбрасывает CircuitOpenError.
+        """
+        if self.state == OPEN:
+            remaining = self.settings.open_seconds - (self._clock() - self._opened_at)
+            if remaining > 0:
+                self._reject(remaining)
+            self.state = HALF_OPEN
+
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.settings.half_open_calls:
+                self._reject(1.0)
+            self._probes_in_flight += 1
+            return True
+        return False
+
+    def record(self, probe: bool, failed: bool, latency: float) -> None:
+        """Учет результата вызова, разрешенного before_call"""
+        slow = latency >= self.settings.slow_call_seconds
+        if probe:
+            if self.state != HALF_OPEN:
+                return
+            self._probes_in_flight -= 1
+            if failed or slow:
+                self._open()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.settings.half_open_calls:
+                self._close()
+            return
+
+        if self.state != CLOSED:
+            # Результат вызова, начатого до размыкания, на состояние не влияет
+            return
+        second = int(self._clock())
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0, 0])
+        bucket = self._buckets[-1]
+        bucket[1] += 1
+        bucket[2] += int(failed)
+        bucket[3] += int(slow)
+
+        calls, failures, slow_calls = self._window()
+        if calls >= self.settings.min_calls and (
+            failures / calls >= self.settings.failure_rate
+            or slow_calls / calls >= self.settings.slow_call_rate
+        ):
+            self._open()
+
+    def cancel(self, probe: bool) -> None:
+        """Вызов прерван без результата (например, клиент отключился)"""
+        if probe and self.state == HALF_OPEN:
+            self._probes_in_flight -= 1
+
+    def reset(self) -> None:
+        self._close()
+
+    def stats(self) -> dict:
+        calls, failures, slow = self._window()
+        retry_after = 0.0
+        if self.state == OPEN:
+            retry_after = max(self.settings.open_seconds - (self._clock() - self._opened_at), 0.0)
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "failure_rate": round(failures / calls, 3) if calls else 0.0,
+            "slow_call_rate": round(slow / calls, 3) if calls else 0.0,
+            "opened_total": self.opened_total,
+            "rejected_total": self.rejected_total,
+            "retry_after_seconds": round(retry_after, 3),
+        }
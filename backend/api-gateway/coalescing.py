@@ -0,0 +1,121 @@
+"""
+@file: coalescing.py
+@description: Объединение одинаковых одновременных GET-запросов к сервисам (single-flight)
+@dependencies: asyncio, httpx, upstream.py (UpstreamStream), main.py (forward_request, call_service)
+@created: 2026-10-18
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Union
+
+import httpx
+
+from upstream import UpstreamStream
+
+
+class FlightAborted(Exception):
+    """Ведущий запрос прерван (например, клиент отключился) - ведомые выполняют запрос сами"""
+
+
+@dataclass
+class BufferedResponse:
+    """Прочитанный ответ сервиса, общий для объединенных запросов"""
+    status_code: int
+    headers: httpx.Headers
+    body: bytes
+
+
+class _Flight:
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+        self.followers = 0
+
+
+class SingleFlight:
+    """Реестр запросов в полете.
+
+    Первый запрос с данным ключом идет к сервису, остальные ждут его результат.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.collapsed = 0
+
+    def _fail(self, flight: _Flight, error: BaseException) -> None:
+        if flight.followers and not flight.future.done():
+            flight.future.set_exception(error if isinstance(error, Exception) else FlightAborted())
+
+    async def _follow(self, flight: _Flight) -> Any:
+        flight.followers += 1
+        self.collapsed += 1
+        return await asyncio.shield(flight.future)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполнение вызова с разделением результата между одинаковыми запросами"""
+        flight = self._flights.get(key)
+        if flight is not None:
+            try:
+                return await self._follow(flight)
+            except FlightAborted:
+                return await call()
+
+        flight = self._flights[key] = _Flight()
+        self.leaders += 1
+        try:
+            result = await call()
+        except BaseException as e:
+            self._fail(flight, e)
+            raise
+        finally:
+            self._flights.pop(key, None)
+        if not flight.future.done():
+            flight.future.set_result(result)
+        return result
+
+    async def do_stream(
+        self,
+        key: Hashable,
+        open_stream: Callable[[], Awaitable[UpstreamStream]]
+    ) -> Union[UpstreamStream, BufferedResponse]:
+        """Объединение потоковых запросов.
+
+        Присоединиться можно, пока ведущий ждет заголовки ответа. Если никто не
+        присоединился, ведущий получает поток без буферизации; иначе тело читается
+        один раз и отдается всем участникам.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            try:
+                return await self._follow(flight)
+            except FlightAborted:
+                return await open_stream()
+
+        flight = self._flights[key] = _Flight()
+        self.leaders += 1
+        try:
+            stream = await open_stream()
+        except BaseException as e:
+            self._fail(flight, e)
+            raise
+        finally:
+            self._flights.pop(key, None)
+
+        if not flight.followers:
+            return stream
+
+        try:
+            body = b"".join([chunk async for chunk in stream])
+        except BaseException as e:
+            self._fail(flight, e)
+            raise
+        buffered = BufferedResponse(stream.status_code, stream.headers, body)
+        flight.future.set_result(buffered)
+        return buffered
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+        }
@@ -0,0 +1,194 @@
+"""
+@file: compression.py
+@description: Сжатие ответов API Gateway (gzip/brotli) по Accept-Encoding с порогом размера
+@dependencies: brotli (опционально), main.py (CompressionMiddleware, cached_forward)
+@created: 2026-10-18
+"""
+import asyncio
+import os
+import zlib
+from typing import Dict, List, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli не установлен - доступен только gzip
+    brotli = None
+
+# Типы содержимого, которые имеет смысл сжимать (text/event-stream не сжимается: события должны уходить сразу)
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/csv", "application/javascript", "application/xml")
+
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+OFFLOAD_SIZE = int(os.getenv("COMPRESSION_OFFLOAD_BYTES", "65536"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+
+def supported_encodings() -> List[str]:
+    """Доступные кодировки в порядке предпочтения"""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Выбор кодировки по Accept-Encoding с учетом q-значений; None - без сжатия"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[token.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in supported_encodings():
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.split(";")[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+class Compressor:
+    """Потоковый компрессор одной кодировки"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+async def run_compression(func, data: bytes) -> bytes:
+    """Сжатие большого фрагмента в пуле потоков, чтобы не блокировать event loop"""
+    if len(data) >= OFFLOAD_SIZE:
+        return await asyncio.to_thread(func, data)
+    return func(data)
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    compressor = Compressor(encoding)
+    return compressor.compress(body) + compressor.finish()
+
+
+async def precompress(body: bytes, content_type: Optional[str]) -> Dict[str, bytes]:
+    """Сжатые формы тела для записи кэша (пусто, если сжимать не нужно)"""
+    variants: Dict[str, bytes] = {}
+    if len(body) < MIN_SIZE or not is_compressible(content_type):
+        return variants
+    for encoding in supported_encodings():
+        variants[encoding] = await run_compression(lambda data: compress_body(data, encoding), body)
+    return variants
+
+
+def _header(headers: List, name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI-middleware сжатия ответов.
+
+    Ответы меньше MIN_SIZE, уже сжатые (в том числе готовые формы из кэша
+    ответов) и несжимаемых типов передаются как есть. Потоковые ответы
+    сжимаются по мере поступления частей; большие части сжимаются в пуле потоков.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = _header(scope.get("headers", []), b"accept-encoding")
+        encoding = negotiate(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSender(send, encoding).send)
+
+
+class _CompressingSender:
+    def __init__(self, send, encoding: str):
+        self._send = send
+        self.encoding = encoding
+        self._start: Optional[dict] = None
+        self._mode = "pending"  # pending | passthrough | compress
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self._compressor: Optional[Compressor] = None
+
+    async def send(self, message: dict) -> None:
+        if message["type"] == "http.response.start":
+            self._start = message
+            headers = message.get("headers", [])
+            content_length = _header(headers, b"content-length")
+            if (
+                message["status"] < 200 or message["status"] in (204, 304)
+                or _header(headers, b"content-encoding") is not None
+                or not is_compressible(_header(headers, b"content-type"))
+                or (content_length is not None and int(content_length) < MIN_SIZE)
+            ):
+                self._mode = "passthrough"
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or self._mode == "passthrough":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._mode == "pending":
+            self._buffer.append(body)
+            self._buffered += len(body)
+            if self._buffered < MIN_SIZE and more_body:
+                return
+            body = b"".join(self._buffer)
+            self._buffer = []
+            if self._buffered < MIN_SIZE:
+                # Ответ оказался меньше порога - отправляется без сжатия
+                self._mode = "passthrough"
+                await self._send(self._start)
+                await self._send({"type": "http.response.body", "body": body, "more_body": False})
+                return
+            await self._begin()
+
+        chunk = await run_compression(self._compressor.compress, body) if body else b""
+        if not more_body:
+            chunk += self._compressor.finish()
+        if chunk or not more_body:
+            await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def _begin(self) -> None:
+        self._mode = "compress"
+        self._compressor = Compressor(self.encoding)
+        original = self._start.get("headers", [])
+        headers = [(key, value) for key, value in original if key.lower() not in (b"content-length", b"vary")]
+        vary = _header(original, b"vary")
+        headers.append((b"content-encoding", self.encoding.encode()))
+        headers.append((b"vary", f"{vary}, Accept-Encoding".encode() if vary else b"Accept-Encoding"))
+        await self._send({**self._start, "headers": headers})
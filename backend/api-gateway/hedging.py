@@ -0,0 +1,155 @@
+"""
+@file: hedging.py
+@description: Хеджирование и повторы идемпотентных GET-запросов API Gateway к сервисам
+@dependencies: upstream.py (UpstreamPool)
+@created: 2026-10-18
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+
+@dataclass(frozen=True)
+class HedgeSettings:
+    """Настройки хеджирования и бюджета повторов одного сервиса"""
+    enabled: bool = True
+    # Второй запрос отправляется, если первый не ответил за этот перцентиль задержки сервиса
+    percentile: float = 0.95
+    min_samples: int = 20
+    min_delay: float = 0.01
+    max_delay: float = 2.0
+    # Бюджет повторов и хеджей: budget_ratio на каждый запрос плюс budget_min_per_second
+    budget_ratio: float = 0.1
+    budget_min_per_second: float = 1.0
+    budget_max: float = 10.0
+
+
+class LatencyWindow:
+    """Скользящее окно последних задержек сервиса.
+
+    Перцентиль пересчитывается не на каждый запрос, а раз в RECOMPUTE_EVERY
+    новых замеров: сортировка окна не попадает на горячий путь.
+    """
+
+    RECOMPUTE_EVERY = 16
+
+    def __init__(self, size: int = 512):
+        self._samples: List[float] = []
+        self._size = size
+        self._next = 0
+        self._added = 0
+        self._sorted: List[float] = []
+
+    def add(self, latency: float) -> None:
+        if len(self._samples) < self._size:
+            self._samples.append(latency)
+        else:
+            self._samples[self._next] = latency
+            self._next = (self._next + 1) % self._size
+        self._added += 1
+        if self._added % self.RECOMPUTE_EVERY == 0 or len(self._sorted) < self.RECOMPUTE_EVERY:
+            self._sorted = sorted(self._samples)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._sorted:
+            return None
+        index = min(int(q * len(self._sorted)), len(self._sorted) - 1)
+        return self._sorted[index]
+
+    def clear(self) -> None:
+        self._samples.clear()
+        self._sorted = []
+        self._next = 0
+        self._added = 0
+
+
+class RetryBudget:
+    """Бюджет дополнительных попыток (повторов и хеджей).
+
+    Каждый запрос добавляет ratio токена, кроме того бюджет пополняется на
+    min_per_second токенов в секунду; запас ограничен max_tokens. Попытка
+    списывает один токен, поэтому при отказе сервиса повторы добавляют к
+    нагрузке не больше ratio от потока запросов.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float, max_tokens: float, clock: Callable[[], float] = time.monotonic):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._clock = clock
+        self._tokens = max_tokens
+        self._updated_at = clock()
+        self.spent = 0
+        self.exhausted = 0
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.max_tokens, self._tokens + max(now - self._updated_at, 0.0) * self.min_per_second)
+        self._updated_at = now
+
+    def deposit(self) -> None:
+        """Учет исходного запроса"""
+        self._refill()
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Разрешение дополнительной попытки"""
+        self._refill()
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            self.spent += 1
+            return True
+        self.exhausted += 1
+        return False
+
+    def reset(self) -> None:
+        self._tokens = self.max_tokens
+        self._updated_at = self._clock()
+        self.spent = 0
+        self.exhausted = 0
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+
+def _discard(task: "asyncio.Task", close: Callable) -> None:
+    """Отмена проигравшей попытки; если она уже успела получить ответ, он закрывается"""
+    task.cancel()
+
+    def cleanup(finished: "asyncio.Task") -> None:
+        if finished.cancelled() or finished.exception() is not None:
+            return
+        asyncio.ensure_future(close(finished.result()))
+
+    task.add_done_callback(cleanup)
+
+
+async def first_success(attempts: List["asyncio.Task"], close: Callable[[object], Awaitable]) -> tuple:
+    """Результат первой успешной попытки и ее индекс; остальные отменяются.
+
+    Если все попытки завершились ошибкой, выбрасывается ошибка последней.
+    """
+    pending = set(attempts)
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in attempts if task in done and task.exception() is None), None)
+            if winner is None:
+                error = next(task.exception() for task in attempts if task in done)
+                continue
+            for task in attempts:
+                if task is not winner:
+                    _discard(task, close)
+            return winner.result(), attempts.index(winner)
+    except BaseException:
+        for task in attempts:
+            _discard(task, close)
+        raise
+    raise error
@@ -1,24 +1,98 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi import FastAPI, HTTPException, Depends, Request, WebSocket
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.openapi.utils import get_openapi
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.background import BackgroundTask
+from starlette.datastructures import QueryParams
+from starlette.requests import HTTPConnection
+from starlette.routing import Match
+from contextlib import asynccontextmanager
 import httpx
+import asyncio
+import math
 import os
-import logging
-from typing import Optional
+import sys
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
 import jwt
 from datetime import datetime, timedelta
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Общий пакет backend/shared
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.log import get_logger, setup_logging, should_sample
+from shared.metrics import RATE_LIMITED, set_route_label, setup_metrics
+from shared.responses import FastJSONResponse, dumps
+
+from aggregation import BatchLoader, SnapshotCache, fan_out
+from batch import BatchRequest, SubRequest, read_response_body, sub_response
+from breaker import CircuitOpenError
+from coalescing import BufferedResponse, SingleFlight
+from compression import CompressionMiddleware, negotiate, precompress
+from ratelimit import RateLimitExceeded, client_address, create_rate_limiter
+from response_cache import CachedResponse, create_response_cache, etag_matches, make_etag
+from routing import QueryParam, Route, RouteMatch, RouteParamError, RouteTrie, openapi_paths
+from streaming import WS_POLICY_VIOLATION, WS_TRY_AGAIN_LATER, StreamLimitExceeded, StreamProxy, load_stream_settings
+from token_cache import ClaimsCache
+from upstream import UpstreamRegistry, failed_instance_url
+
+logger = get_logger(__name__)
+
+# Конфигурация сервисов: адрес или несколько адресов экземпляров через запятую
+SERVICES = {
+    "user": os.getenv("USER_SERVICE_URL", "http://localhost:8001"),
+    "profile": os.getenv("PROFILE_SERVICE_URL", "http://localhost:8002"),
+    "booking": os.getenv("BOOKING_SERVICE_URL", "http://localhost:8003"),
+    "geo": os.getenv("GEO_SERVICE_URL", "http://localhost:8004"),
+    "payment": os.getenv("PAYMENT_SERVICE_URL", "http://localhost:8005"),
+    "notification": os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:8006"),
+    "chat": os.getenv("CHAT_SERVICE_URL", "http://localhost:8007"),
+    "rating": os.getenv("RATING_SERVICE_URL", "http://localhost:8008"),
+    "event": os.getenv("EVENT_SERVICE_URL", "http://localhost:8009"),
+    "emergency": os.getenv("EMERGENCY_SERVICE_URL", "http://localhost:8010"),
+    "security": os.getenv("SECURITY_SERVICE_URL", "http://localhost:8011"),
+}
+
+# Пулы соединений к сервисам (по одному на каждую запись SERVICES)
+upstreams = UpstreamRegistry(SERVICES)
+
+# Объединение одинаковых одновременных GET-запросов к сервисам
+COALESCE_UPSTREAM_GETS = os.getenv("COALESCE_UPSTREAM_GETS", "true").lower() == "true"
+single_flight = SingleFlight()
+
+# Кэш ответов для публичных и редко меняющихся GET
+response_cache = create_response_cache()
+
+# Ограничение частоты запросов (token bucket) по пользователю, маршруту и глобально
+rate_limiter = create_rate_limiter()
+
+# Потоковые соединения (WebSocket, SSE): мимо слотов пулов, с таймаутом простоя
+stream_proxy = StreamProxy(load_stream_settings())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Создание пулов соединений при старте и их закрытие при остановке"""
+    await upstreams.start()
+    yield
+    await upstreams.close()
+    await stream_proxy.aclose()
+    await response_cache.close()
+    await rate_limiter.close()
 
 app = FastAPI(
     title="ТОТ API Gateway",
     description="API Gateway для системы ТОТ – Твоя Точка Опоры",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
+setup_metrics(app)
+setup_logging(app, "api-gateway")
+
+# Сжатие ответов (gzip/brotli) по Accept-Encoding
+if os.getenv("COMPRESSION_ENABLED", "true").lower() == "true":
+    app.add_middleware(CompressionMiddleware)
 
 # Настройка CORS
 app.add_middleware(
@@ -41,25 +115,22 @@ app.add_middleware(
 # Схема аутентификации
 security = HTTPBearer()
 
-# Конфигурация сервисов
-SERVICES = {
-    "user": os.getenv("USER_SERVICE_URL", "http://localhost:8001"),
-    "profile": os.getenv("PROFILE_SERVICE_URL", "http://localhost:8002"),
-    "booking": os.getenv("BOOKING_SERVICE_URL", "http://localhost:8003"),
-    "geo": os.getenv("GEO_SERVICE_URL", "http://localhost:8004"),
-    "payment": os.getenv("PAYMENT_SERVICE_URL", "http://localhost:8005"),
-    "notification": os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:8006"),
-    "chat": os.getenv("CHAT_SERVICE_URL", "http://localhost:8007"),
-    "rating": os.getenv("RATING_SERVICE_URL", "http://localhost:8008"),
-    "event": os.getenv("EVENT_SERVICE_URL", "http://localhost:8009"),
-    "emergency": os.getenv("EMERGENCY_SERVICE_URL", "http://localhost:8010"),
-    "security": os.getenv("SECURITY_SERVICE_URL", "http://localhost:8011"),
-}
+# TTL кэша ответов (секунды)
+CACHE_TTL_DOCTORS = int(os.getenv("CACHE_TTL_DOCTORS_SECONDS", "60"))
+CACHE_TTL_EVENTS = int(os.getenv("CACHE_TTL_EVENTS_SECONDS", "60"))
+CACHE_TTL_RATINGS = int(os.getenv("CACHE_TTL_RATINGS_SECONDS", "120"))
+CACHE_TTL_CLINICS = int(os.getenv("CACHE_TTL_CLINICS_SECONDS", "300"))
 
 # JWT настройки
 JWT_SECRET = os.getenv("JWT_SECRET", "your-super-secret-jwt-key")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 
+# Кэш проверенных claims, общий для всех маршрутов с verify_token
+claims_cache = ClaimsCache(
+    max_size=int(os.getenv("JWT_CLAIMS_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("JWT_CLAIMS_CACHE_TTL_SECONDS", "300")),
+)
+
 class UserRole:
     PATIENT = "patient"
     DOCTOR = "doctor"
@@ -67,41 +138,62 @@ class UserRole:
     ADMIN = "admin"
 
 async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    """Проверка JWT токена"""
+    """Проверка JWT токена.
+
+    Проверенные claims кэшируются в claims_cache: повторный запрос с тем же
+    токеном не декодирует его заново. Срок действия проверяет jwt.decode.
+    """
+    token = credentials.credentials
+    cached_claims = claims_cache.get(token)
+    if cached_claims is not None:
+        return cached_claims
+
+    if claims_cache.is_revoked(token):
+        raise HTTPException(status_code=401, detail="Token revoked")
+
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        
-        # Проверка срока действия токена
-        exp = payload.get("exp")
-        if exp and datetime.now() > datetime.fromtimestamp(exp):
-            raise HTTPException(status_code=401, detail="Token expired")
-        
-        return payload
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
     except Exception as e:
-        logger.error(f"Token verification error: {e}")
+        logger.error("token_verification_failed", error=str(e))
         raise HTTPException(status_code=401, detail="Token verification failed")
 
-async def forward_request(
+    claims_cache.put(token, payload)
+    return payload
+
+# Заголовки ответа сервиса, которые передаются клиенту в режиме pass-through
+PASSTHROUGH_HEADERS = (
+    "content-type",
+    "content-encoding",
+    "content-length",
+    "content-disposition",
+    "cache-control",
+    "etag",
+    "last-modified",
+    "location",
+    "retry-after",
+    "www-authenticate",
+)
+
+def _prepare_upstream_call(
     service_name: str,
     path: str,
-    method: str = "GET",
-    data: Optional[dict] = None,
-    headers: Optional[dict] = None,
-    user_token: Optional[dict] = None
-) -> dict:
-    """Пересылка запроса к соответствующему сервису.
-
-    Возвращает объект FastAPI Response, сохраняя код статуса и тип контента.
-    """
-    if service_name not in SERVICES:
+    method: str,
+    data: Optional[dict],
+    headers: Optional[dict],
+    user_token: Optional[dict]
+) -> tuple:
+    """Выбор пула и подготовка метода, заголовков и тела запроса к сервису"""
+    if service_name not in upstreams:
         raise HTTPException(status_code=404, detail=f"Service {service_name} not found")
     
-    service_url = SERVICES[service_name]
-    url = f"{service_url}{path}"
-    
+    method_upper = method.upper()
+    if method_upper not in ("GET", "POST", "PUT", "DELETE"):
+        raise HTTPException(status_code=405, detail="Method not allowed")
+
     # Подготовка заголовков
     request_headers = headers.copy() if headers else {}
 
@@ -110,39 +202,174 @@ async def forward_request(
         request_headers["X-User-ID"] = str(user_token.get("user_id"))
         request_headers["X-User-Role"] = user_token.get("role", "")
 
-    timeout_seconds = float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", "30"))
+    body = data if method_upper in ("POST", "PUT") else None
+    return upstreams.get(service_name), method_upper, request_headers, body
+
+def _flight_key(service_name: str, path: str, request_headers: dict) -> tuple:
+    """Ключ объединения: сервис, путь и заголовки (в том числе контекст пользователя)"""
+    return (service_name, path, tuple(sorted(request_headers.items())))
+
+def _circuit_open_error(error: CircuitOpenError) -> HTTPException:
+    """Быстрый отказ, пока выключатель сервиса разомкнут"""
+    if should_sample():
+        logger.warning("circuit_open", upstream=error.service_name)
+    return HTTPException(
+        status_code=503,
+        detail=f"Service {error.service_name} unavailable",
+        headers={"Retry-After": str(max(int(error.retry_after + 0.999), 1))},
+    )
+
+async def forward_request(
+    service_name: str,
+    path: str,
+    method: str = "GET",
+    data: Optional[dict] = None,
+    headers: Optional[dict] = None,
+    user_token: Optional[dict] = None,
+    hedge: bool = False
+) -> StreamingResponse:
+    """Пересылка запроса к соответствующему сервису в режиме pass-through.
+
+    Тело ответа не декодируется: сырые байты и значимые заголовки передаются
+    клиенту потоком с исходным кодом статуса. hedge=True включает хеджирование GET.
+    """
+    pool, method_upper, request_headers, body = _prepare_upstream_call(
+        service_name, path, method, data, headers, user_token
+    )
+
+    def open_stream():
+        return pool.open_stream(method_upper, path, hedge=hedge, json=body, headers=request_headers)
 
     try:
-        logger.info(f"Forwarding {method.upper()} to {service_name}: {url}")
-        async with httpx.AsyncClient(timeout=timeout_seconds) as client:
-            method_upper = method.upper()
-            if method_upper == "GET":
-                upstream_response = await client.get(url, headers=request_headers)
-            elif method_upper == "POST":
-                upstream_response = await client.post(url, json=data, headers=request_headers)
-            elif method_upper == "PUT":
-                upstream_response = await client.put(url, json=data, headers=request_headers)
-            elif method_upper == "DELETE":
-                upstream_response = await client.delete(url, headers=request_headers)
-            else:
-                raise HTTPException(status_code=405, detail="Method not allowed")
-
-        content_type = upstream_response.headers.get("content-type", "")
-        status_code = upstream_response.status_code
-
-        if content_type.startswith("application/json"):
-            # Сохраняем исходный статус код
-            return JSONResponse(content=upstream_response.json(), status_code=status_code)
-        return PlainTextResponse(content=upstream_response.text, status_code=status_code)
+        if method_upper == "GET" and COALESCE_UPSTREAM_GETS:
+            upstream_stream = await single_flight.do_stream(
+                _flight_key(service_name, path, request_headers), open_stream
+            )
+        else:
+            upstream_stream = await open_stream()
+    except CircuitOpenError as e:
+        raise _circuit_open_error(e)
     except httpx.RequestError as e:
-        logger.error(f"Request error to {service_name}: {e}")
-        logger.error(f"URL: {url}")
+        logger.error("upstream_request_failed", upstream=service_name, instance=failed_instance_url(e), path=path, error=repr(e))
         raise HTTPException(status_code=503, detail=f"Service {service_name} unavailable")
-    except Exception as e:
-        logger.error(f"Unexpected error forwarding to {service_name}: {e}")
-        logger.error(f"URL: {url}")
+    except Exception:
+        logger.exception("upstream_forward_failed", upstream=service_name, path=path)
         raise HTTPException(status_code=500, detail="Internal server error")
 
+    response_headers = {
+        name: value
+        for name, value in upstream_stream.headers.items()
+        if name.lower() in PASSTHROUGH_HEADERS
+    }
+    if isinstance(upstream_stream, BufferedResponse):
+        # Запрос объединен с одинаковыми: тело уже прочитано ведущим запросом
+        return Response(content=upstream_stream.body, status_code=upstream_stream.status_code, headers=response_headers)
+    return StreamingResponse(
+        upstream_stream,
+        status_code=upstream_stream.status_code,
+        headers=response_headers,
+        background=BackgroundTask(upstream_stream.aclose),
+    )
+
+async def call_service(
+    service_name: str,
+    path: str,
+    method: str = "GET",
+    data: Optional[dict] = None,
+    headers: Optional[dict] = None,
+    user_token: Optional[dict] = None
+) -> httpx.Response:
+    """Запрос к сервису с буферизацией тела.
+
+    Используется только там, где шлюзу нужно разобрать ответ сервиса.
+    """
+    pool, method_upper, request_headers, body = _prepare_upstream_call(
+        service_name, path, method, data, headers, user_token
+    )
+
+    def send():
+        return pool.request(method_upper, path, json=body, headers=request_headers)
+
+    try:
+        if method_upper == "GET" and COALESCE_UPSTREAM_GETS:
+            return await single_flight.do(_flight_key(service_name, path, request_headers), send)
+        return await send()
+    except CircuitOpenError as e:
+        raise _circuit_open_error(e)
+    except httpx.RequestError as e:
+        logger.error("upstream_request_failed", upstream=service_name, instance=failed_instance_url(e), path=path, error=repr(e))
+        raise HTTPException(status_code=503, detail=f"Service {service_name} unavailable")
+
+def _cache_key(service_name: str, path: str, scope: str) -> str:
+    return f"{service_name}:{scope}:{path}"
+
+# Заголовки ответа из кэша, которые выставляет шлюз, а не сервис
+GATEWAY_CACHE_HEADERS = ("etag", "cache-control", "vary", "content-encoding", "content-length")
+# Заголовки ответа сервиса, которые не сохраняются в записи кэша
+CACHED_EXCLUDED_HEADERS = ("content-length", "content-encoding", "etag", "cache-control")
+
+def _cached_http_response(entry: CachedResponse, request: Optional[Request], ttl: int, scope: str) -> Response:
+    """Ответ из записи кэша: 304 при совпадении ETag, иначе тело целиком.
+
+    Если клиент принимает сжатие и в записи есть сжатая форма, она отдается
+    без повторного сжатия. Без request (подзапрос /batch) отдается несжатое тело.
+    """
+    request_headers = request.headers if request is not None else {}
+    # Заголовки кэширования задает шлюз: одноименные из записи (в любом регистре) не передаются
+    headers = {name: value for name, value in entry.headers.items() if name.lower() not in GATEWAY_CACHE_HEADERS}
+    headers["ETag"] = entry.etag
+    headers["Cache-Control"] = f"{'public' if scope == 'public' else 'private'}, max-age={ttl}"
+    if entry.variants:
+        headers["Vary"] = "Accept-Encoding"
+    if etag_matches(request_headers.get("if-none-match"), entry.etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    encoding = negotiate(request_headers.get("accept-encoding"))
+    if encoding in entry.variants:
+        headers["Content-Encoding"] = encoding
+        return Response(content=entry.variants[encoding], status_code=entry.status_code, headers=headers)
+    return Response(content=entry.body, status_code=entry.status_code, headers=headers)
+
+async def cached_forward(
+    request: Optional[Request],
+    service_name: str,
+    path: str,
+    ttl: int,
+    user_token: Optional[dict] = None,
+    vary_by_role: bool = False
+) -> Response:
+    """GET к сервису через кэш ответов с поддержкой ETag/If-None-Match.
+
+    Кэшируются только ответы 200. Если ответ зависит от роли пользователя,
+    роль входит в ключ кэша (vary_by_role).
+    """
+    scope = (user_token or {}).get("role", "anonymous") if vary_by_role else "public"
+    key = _cache_key(service_name, path, scope)
+
+    entry = await response_cache.get(key)
+    if entry is not None:
+        return _cached_http_response(entry, request, ttl, scope)
+
+    upstream_response = await call_service(service_name, path, "GET", user_token=user_token)
+    headers = {
+        name: value
+        for name, value in upstream_response.headers.items()
+        if name.lower() in PASSTHROUGH_HEADERS and name.lower() not in CACHED_EXCLUDED_HEADERS
+    }
+    if upstream_response.status_code != 200:
+        return Response(content=upstream_response.content, status_code=upstream_response.status_code, headers=headers)
+
+    entry = CachedResponse(
+        status_code=200,
+        body=upstream_response.content,
+        etag=make_etag(upstream_response.content),
+        headers=headers,
+        variants=await precompress(upstream_response.content, headers.get("content-type")),
+    )
+    await response_cache.set(key, entry, ttl)
+    return _cached_http_response(entry, request, ttl, scope)
+
 # Health check
 @app.get("/health")
 async def health_check():
@@ -183,427 +410,644 @@ async def test_auth():
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
-# User Service routes
-@app.post("/auth/register")
-async def register_user(data: dict):
-    """Регистрация пользователя"""
-    return await forward_request("user", "/auth/register", "POST", data)
-
-@app.post("/auth/login")
-async def login_user(data: dict):
-    """Авторизация пользователя"""
-    return await forward_request("user", "/auth/login", "POST", data)
-
-@app.get("/auth/me")
-async def get_current_user(user_token: dict = Depends(verify_token)):
-    """Получение информации о текущем пользователе"""
-    return await forward_request("user", "/auth/me", "GET", user_token=user_token)
-
-# Унифицированные эндпоинты для пользователей (API v1)
-@app.get("/api/v1/users")
-async def get_users(
-    page: int = 1,
-    limit: int = 10,
-    user_token: dict = Depends(verify_token)
-):
-    """Получение списка пользователей"""
-    return await forward_request("user", f"/users?page={page}&limit={limit}", "GET", user_token=user_token)
-
-@app.get("/api/v1/users/{user_id}")
-async def get_user(user_id: str, user_token: dict = Depends(verify_token)):
-    """Получение информации о пользователе"""
-    return await forward_request("user", f"/users/{user_id}", "GET", user_token=user_token)
-
-@app.post("/api/v1/users")
-async def create_user(data: dict, user_token: dict = Depends(verify_token)):
-    """Создание пользователя"""
-    return await forward_request("user", "/auth/register", "POST", data, user_token=user_token)
-
-@app.put("/api/v1/users/{user_id}")
-async def update_user(user_id: str, data: dict, user_token: dict = Depends(verify_token)):
-    """Обновление пользователя"""
-    return await forward_request("user", f"/users/{user_id}", "PUT", data, user_token=user_token)
-
-@app.delete("/api/v1/users/{user_id}")
-async def delete_user(user_id: str, user_token: dict = Depends(verify_token)):
-    """Удаление пользователя"""
-    return await forward_request("user", f"/users/{user_id}", "DELETE", user_token=user_token)
-
-@app.get("/users/{user_id}")
-async def get_user(user_id: str, user_token: dict = Depends(verify_token)):
-    """Получение информации о пользователе"""
-    return await forward_request("user", f"/users/{user_id}", "GET", user_token=user_token)
-
-@app.post("/users")
-async def create_user(data: dict, user_token: dict = Depends(verify_token)):
-    """Создание пользователя"""
-    return await forward_request("user", "/auth/register", "POST", data, user_token=user_token)
-
-@app.put("/users/{user_id}")
-async def update_user(user_id: str, data: dict, user_token: dict = Depends(verify_token)):
-    """Обновление пользователя"""
-    return await forward_request("user", f"/users/{user_id}", "PUT", data, user_token=user_token)
-
-@app.delete("/users/{user_id}")
-async def delete_user(user_id: str, user_token: dict = Depends(verify_token)):
-    """Удаление пользователя"""
-    return await forward_request("user", f"/users/{user_id}", "DELETE", user_token=user_token)
-
-# Profile Service routes
-@app.get("/profiles/{user_id}")
-async def get_profile(user_id: str, user_token: dict = Depends(verify_token)):
-    """Получение профиля пользователя"""
-    return await forward_request("profile", f"/profiles/{user_id}", "GET", user_token=user_token)
-
-@app.put("/profiles/{user_id}")
-async def update_profile(user_id: str, data: dict, user_token: dict = Depends(verify_token)):
-    """Обновление профиля пользователя"""
-    return await forward_request("profile", f"/profiles/{user_id}", "PUT", data, user_token=user_token)
-
-# Booking Service routes
-@app.post("/bookings")
-async def create_booking(data: dict, user_token: dict = Depends(verify_token)):
-    """Создание заказа вызова врача"""
-    return await forward_request("booking", "/bookings", "POST", data, user_token=user_token)
-
-@app.get("/bookings")
-async def get_bookings(user_token: dict = Depends(verify_token)):
-    """Получение списка заказов пользователя"""
-    return await forward_request("booking", "/bookings", "GET", user_token=user_token)
-
-@app.get("/bookings/{booking_id}")
-async def get_booking(booking_id: str, user_token: dict = Depends(verify_token)):
-    """Получение информации о заказе"""
-    return await forward_request("booking", f"/bookings/{booking_id}", "GET", user_token=user_token)
-
-@app.put("/bookings/{booking_id}/cancel")
-async def cancel_booking(booking_id: str, user_token: dict = Depends(verify_token)):
-    """Отмена заказа"""
-    return await forward_request("booking", f"/bookings/{booking_id}/cancel", "PUT", user_token=user_token)
-
-# Payment Service routes
-@app.post("/payments/create")
-async def create_payment(data: dict, user_token: dict = Depends(verify_token)):
-    """Создание платежа"""
-    return await forward_request("payment", "/payments/", "POST", data, user_token=user_token)
-
-@app.get("/payments")
-async def get_payments(user_token: dict = Depends(verify_token)):
-    """Получение списка платежей пользователя"""
-    return await forward_request("payment", "/payments/", "GET", user_token=user_token)
-
-@app.get("/payments/{payment_id}")
-async def get_payment(payment_id: str, user_token: dict = Depends(verify_token)):
-    """Получение информации о платеже"""
-    return await forward_request("payment", f"/payments/{payment_id}", "GET", user_token=user_token)
-
-@app.get("/wallets/me")
-async def get_wallet(user_token: dict = Depends(verify_token)):
-    """Получение кошелька пользователя"""
-    user_id = user_token.get("user_id")
-    return await forward_request("payment", f"/wallets/{user_id}", "GET", user_token=user_token)
-
-@app.get("/transactions/user/me")
-async def get_user_transactions(user_token: dict = Depends(verify_token)):
-    """Получение транзакций пользователя"""
-    user_id = user_token.get("user_id")
-    return await forward_request("payment", f"/transactions/user/{user_id}", "GET", user_token=user_token)
-
-# Geo Service routes
-@app.get("/geo/doctors/nearby")
-async def get_nearby_doctors(lat: float, lon: float, radius: float = 5.0, user_token: dict = Depends(verify_token)):
-    """Поиск врачей поблизости"""
-    params = {"lat": lat, "lon": lon, "radius": radius}
-    return await forward_request("geo", f"/geo/doctors/nearby?lat={lat}&lon={lon}&radius={radius}", "GET", user_token=user_token)
-
-@app.post("/geo/track")
-async def track_location(data: dict, user_token: dict = Depends(verify_token)):
-    """Отслеживание местоположения"""
-    return await forward_request("geo", "/geo/track", "POST", data, user_token=user_token)
-
-# Chat Service routes
-@app.post("/chat/rooms")
-async def create_chat_room(data: dict, user_token: dict = Depends(verify_token)):
-    """Создание чат-комнаты"""
-    return await forward_request("chat", "/chat/rooms", "POST", data, user_token=user_token)
-
-@app.get("/chat/rooms/{room_id}/messages")
-async def get_chat_messages(room_id: str, user_token: dict = Depends(verify_token)):
-    """Получение сообщений чата"""
-    return await forward_request("chat", f"/chat/rooms/{room_id}/messages", "GET", user_token=user_token)
-
-@app.post("/chat/rooms/{room_id}/messages")
-async def send_message(room_id: str, data: dict, user_token: dict = Depends(verify_token)):
-    """Отправка сообщения"""
-    return await forward_request("chat", f"/chat/rooms/{room_id}/messages", "POST", data, user_token=user_token)
-
-# Rating Service routes
-@app.post("/ratings")
-async def create_rating(data: dict, user_token: dict = Depends(verify_token)):
-    """Создание отзыва и рейтинга"""
-    return await forward_request("rating", "/ratings", "POST", data, user_token=user_token)
-
-@app.get("/ratings/doctors/{doctor_id}")
-async def get_doctor_ratings(doctor_id: str):
-    """Получение рейтингов врача"""
-    return await forward_request("rating", f"/ratings/doctors/{doctor_id}", "GET")
-
-# Event Service routes
-@app.get("/events")
-async def get_events():
-    """Получение списка мероприятий"""
-    return await forward_request("event", "/events", "GET")
-
-@app.post("/events")
-async def create_event(data: dict, user_token: dict = Depends(verify_token)):
-    """Создание мероприятия"""
-    return await forward_request("event", "/events", "POST", data, user_token=user_token)
-
-# Emergency Service routes
-@app.post("/emergency/alert")
-async def create_emergency_alert(data: dict, user_token: dict = Depends(verify_token)):
-    """Создание экстренного вызова"""
-    return await forward_request("emergency", "/emergency/alert", "POST", data, user_token=user_token)
-
-@app.put("/emergency/{alert_id}/status")
-async def update_emergency_status(alert_id: str, data: dict, user_token: dict = Depends(verify_token)):
-    """Обновление статуса экстренного вызова"""
-    return await forward_request("emergency", f"/emergency/{alert_id}/status", "PUT", data, user_token=user_token)
-
-# Notification Service routes
-@app.post("/notifications/send")
-async def send_notification(data: dict, user_token: dict = Depends(verify_token)):
-    """Отправка уведомления"""
-    return await forward_request("notification", "/notifications/send", "POST", data, user_token=user_token)
-
-@app.get("/notifications")
-async def get_notifications(user_token: dict = Depends(verify_token)):
-    """Получение уведомлений пользователя"""
-    return await forward_request("notification", "/notifications", "GET", user_token=user_token)
-
-# Admin routes
-@app.get("/admin/users")
-async def get_users(
-    page: int = 1,
-    limit: int = 10,
-    user_token: dict = Depends(verify_token)
-):
-    """Получение списка пользователей (только для админов)"""
+# Таблица маршрутов шлюза: путь клиента -> сервис и путь сервиса.
+# Маршруты обслуживает единый диспетчер (см. dispatch в конце файла).
+ADMIN = ("admin",)
+PAGE = QueryParam("page", default=1, cast=int)
+LIMIT = QueryParam("limit", default=10, cast=int)
+SIZE_AS_LIMIT = QueryParam("limit", source="size", default=10, cast=int)
+# Курсор страницы (next_cursor/prev_cursor ответа) и фильтр по роли списка пользователей
+CURSOR = QueryParam("cursor", default=None)
+ROLE = QueryParam("role", default=None)
+
+ROUTE_TABLE = [
+    # User Service
+    Route("POST", "/auth/register", "user", "/auth/register", auth=False, priority="high", summary="Регистрация пользователя"),
+    Route("POST", "/auth/login", "user", "/auth/login", auth=False, priority="high", summary="Авторизация пользователя"),
+    Route("GET", "/auth/me", "user", "/auth/me", priority="high", summary="Получение информации о текущем пользователе"),
+
+    # Унифицированные эндпоинты для пользователей (API v1)
+    Route("GET", "/api/v1/users", "user", "/users", query=(PAGE, LIMIT, ROLE, CURSOR), summary="Получение списка пользователей"),
+    Route("GET", "/api/v1/users/{user_id}", "user", "/users/{user_id}", hedge=True, summary="Получение информации о пользователе"),
+    Route("POST", "/api/v1/users", "user", "/auth/register", summary="Создание пользователя"),
+    Route("PUT", "/api/v1/users/{user_id}", "user", "/users/{user_id}", summary="Обновление пользователя"),
+    Route("DELETE", "/api/v1/users/{user_id}", "user", "/users/{user_id}", summary="Удаление пользователя"),
+    Route("GET", "/users/{user_id}", "user", "/users/{user_id}", hedge=True, summary="Получение информации о пользователе"),
+    Route("POST", "/users", "user", "/auth/register", summary="Создание пользователя"),
+    Route("PUT", "/users/{user_id}", "user", "/users/{user_id}", summary="Обновление пользователя"),
+    Route("DELETE", "/users/{user_id}", "user", "/users/{user_id}", summary="Удаление пользователя"),
+
+    # Profile Service
+    Route("GET", "/profiles/{user_id}", "profile", "/profiles/{user_id}", hedge=True, summary="Получение профиля пользователя"),
+    Route("PUT", "/profiles/{user_id}", "profile", "/profiles/{user_id}", summary="Обновление профиля пользователя"),
+
+    # Booking Service
+    Route("POST", "/bookings", "booking", "/bookings", summary="Создание заказа вызова врача"),
+    Route("GET", "/bookings", "booking", "/bookings", hedge=True, summary="Получение списка заказов пользователя"),
+    Route("GET", "/bookings/{booking_id}", "booking", "/bookings/{booking_id}", hedge=True, summary="Получение информации о заказе"),
+    Route("PUT", "/bookings/{booking_id}/cancel", "booking", "/bookings/{booking_id}/cancel", body=False, summary="Отмена заказа"),
+
+    # Payment Service
+    Route("POST", "/payments/create", "payment", "/payments/", summary="Создание платежа"),
+    Route("GET", "/payments", "payment", "/payments/", summary="Получение списка платежей пользователя"),
+    Route("GET", "/payments/{payment_id}", "payment", "/payments/{payment_id}", summary="Получение информации о платеже"),
+    Route("GET", "/wallets/me", "payment", "/wallets/{me}", summary="Получение кошелька пользователя"),
+    Route("GET", "/transactions/user/me", "payment", "/transactions/user/{me}", summary="Получение транзакций пользователя"),
+
+    # Geo Service
+    Route(
+        "GET", "/geo/doctors/nearby", "geo", "/geo/doctors/nearby",
+        query=(QueryParam("lat", cast=float), QueryParam("lon", cast=float), QueryParam("radius", default=5.0, cast=float)),
+        summary="Поиск врачей поблизости",
+    ),
+    Route("POST", "/geo/track", "geo", "/geo/track", summary="Отслеживание местоположения"),
+    Route(
+        "GET", "/geo/doctors/{doctor_id}/location/stream", "geo", "/geo/doctors/{doctor_id}/location/stream",
+        stream=True, summary="Поток местоположения врача (Server-Sent Events)",
+    ),
+
+    # Chat Service
+    Route("POST", "/chat/rooms", "chat", "/chat/rooms", summary="Создание чат-комнаты"),
+    Route("GET", "/chat/rooms/{room_id}/messages", "chat", "/chat/rooms/{room_id}/messages", hedge=True, summary="Получение сообщений чата"),
+    Route("POST", "/chat/rooms/{room_id}/messages", "chat", "/chat/rooms/{room_id}/messages", summary="Отправка сообщения"),
+
+    # Rating Service
+    Route(
+        "POST", "/ratings", "rating", "/ratings",
+        invalidates=(("rating", "/ratings/doctors/{doctor_id}"),),
+        summary="Создание отзыва и рейтинга",
+    ),
+    Route(
+        "GET", "/ratings/doctors/{doctor_id}", "rating", "/ratings/doctors/{doctor_id}",
+        auth=False, cache_ttl=CACHE_TTL_RATINGS, summary="Получение рейтингов врача",
+    ),
+
+    # Event Service
+    Route("GET", "/events", "event", "/events", auth=False, cache_ttl=CACHE_TTL_EVENTS, summary="Получение списка мероприятий"),
+    Route("POST", "/events", "event", "/events", invalidates=(("event", "/events"),), summary="Создание мероприятия"),
+
+    # Emergency Service
+    Route("POST", "/emergency/alert", "emergency", "/emergency/alert", priority="high", summary="Создание экстренного вызова"),
+    Route(
+        "PUT", "/emergency/{alert_id}/status", "emergency", "/emergency/{alert_id}/status",
+        priority="high", summary="Обновление статуса экстренного вызова",
+    ),
+
+    # Notification Service
+    Route("POST", "/notifications/send", "notification", "/notifications/send", summary="Отправка уведомления"),
+    Route("GET", "/notifications", "notification", "/notifications", hedge=True, summary="Получение уведомлений пользователя"),
+
+    # Admin routes
+    Route(
+        "GET", "/admin/users", "user", "/users", roles=ADMIN, query=(PAGE, LIMIT, ROLE, CURSOR),
+        priority="low", summary="Получение списка пользователей (только для админов)",
+    ),
+    Route("GET", "/admin/users/{user_id}", "user", "/users/{user_id}", roles=ADMIN, summary="Получение информации о пользователе (только для админов)"),
+    Route("PUT", "/admin/users/{user_id}", "user", "/users/{user_id}", roles=ADMIN, summary="Обновление пользователя (только для админов)"),
+    Route("DELETE", "/admin/users/{user_id}", "user", "/users/{user_id}", roles=ADMIN, summary="Удаление пользователя (только для админов)"),
+    Route("GET", "/admin/me", "user", "/auth/me", roles=ADMIN, summary="Получение профиля админа"),
+
+    # Admin Panel API
+    Route(
+        "GET", "/api/users", "user", "/users", roles=ADMIN, query=(PAGE, SIZE_AS_LIMIT, ROLE, CURSOR),
+        priority="low", summary="Получение списка пользователей через API",
+    ),
+    Route("GET", "/api/users/{user_id}", "user", "/users/{user_id}", roles=ADMIN, summary="Получение информации о пользователе через API"),
+    Route("POST", "/api/users", "user", "/auth/register", roles=ADMIN, summary="Создание пользователя через API"),
+    Route("PUT", "/api/users/{user_id}", "user", "/users/{user_id}", roles=ADMIN, summary="Обновление пользователя через API"),
+    Route("DELETE", "/api/users/{user_id}", "user", "/users/{user_id}", roles=ADMIN, summary="Удаление пользователя через API"),
+
+    Route("GET", "/api/doctors", "profile", "/doctor-profiles/", roles=ADMIN, priority="low", summary="Получение списка врачей через API"),
+    Route(
+        "GET", "/api/doctors/list", "user", "/api/doctors/list",
+        cache_ttl=CACHE_TTL_DOCTORS, summary="Получение списка врачей (требует аутентификации)",
+    ),
+    Route("GET", "/api/doctors/{doctor_id}", "profile", "/doctor-profiles/{doctor_id}", roles=ADMIN, summary="Получение информации о враче через API"),
+    Route("POST", "/api/doctors", "profile", "/doctor-profiles/", roles=ADMIN, summary="Создание врача через API"),
+    Route("PUT", "/api/doctors/{doctor_id}", "profile", "/doctor-profiles/{doctor_id}", roles=ADMIN, summary="Обновление врача через API"),
+    Route("DELETE", "/api/doctors/{doctor_id}", "profile", "/doctor-profiles/{doctor_id}", roles=ADMIN, summary="Удаление врача через API"),
+    Route(
+        "GET", "/doctors", "user", "/api/doctors/list",
+        auth=False, cache_ttl=CACHE_TTL_DOCTORS, summary="Получение списка врачей (без аутентификации)",
+    ),
+
+    Route("GET", "/api/clinics", "profile", "/clinic-profiles/", roles=ADMIN, priority="low", summary="Получение списка клиник через API"),
+    Route(
+        "GET", "/api/clinics/list", "profile", "/clinic-profiles/", roles=ADMIN,
+        cache_ttl=CACHE_TTL_CLINICS, summary="Получение списка клиник для форм",
+    ),
+    Route("GET", "/api/clinics/{clinic_id}", "profile", "/clinic-profiles/{clinic_id}", roles=ADMIN, summary="Получение информации о клинике через API"),
+    Route("POST", "/api/clinics", "profile", "/clinic-profiles/", roles=ADMIN, summary="Создание клиники через API"),
+    Route("PUT", "/api/clinics/{clinic_id}", "profile", "/clinic-profiles/{clinic_id}", roles=ADMIN, summary="Обновление клиники через API"),
+    Route("DELETE", "/api/clinics/{clinic_id}", "profile", "/clinic-profiles/{clinic_id}", roles=ADMIN, summary="Удаление клиники через API"),
+    Route("GET", "/api/patients", "user", "/users?role=patient", roles=ADMIN, query=(PAGE, LIMIT, CURSOR), priority="low", summary="Получение списка пациентов"),
+]
+
+# Маршруты WebSocket: токен передается заголовком Authorization или параметром access_token
+WEBSOCKET_ROUTE_TABLE = [
+    Route("WEBSOCKET", "/chat/rooms/{room_id}/ws", "chat", "/chat/rooms/{room_id}/ws", summary="Сообщения чата в реальном времени"),
+]
+
+# Дерево строится один раз при импорте; дубликаты маршрутов - ошибка конфигурации
+route_trie = RouteTrie(ROUTE_TABLE)
+websocket_trie = RouteTrie(WEBSOCKET_ROUTE_TABLE)
+
+# Статистика внутренних механизмов шлюза
+@app.get("/admin/upstreams")
+async def get_upstream_pools(user_token: dict = Depends(verify_token)):
+    """Статистика пулов соединений к сервисам (только для админов)"""
     if user_token.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("user", f"/users?page={page}&limit={limit}", "GET", user_token=user_token)
+    return {"pools": upstreams.stats()}
 
-@app.get("/admin/users/{user_id}")
-async def get_user(user_id: str, user_token: dict = Depends(verify_token)):
-    """Получение информации о пользователе (только для админов)"""
+@app.get("/admin/breakers")
+async def get_circuit_breakers(user_token: dict = Depends(verify_token)):
+    """Состояние выключателей сервисов (только для админов)"""
     if user_token.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("user", f"/users/{user_id}", "GET", user_token=user_token)
+    return {"breakers": upstreams.breaker_stats()}
 
-@app.put("/admin/users/{user_id}")
-async def update_user(user_id: str, data: dict, user_token: dict = Depends(verify_token)):
-    """Обновление пользователя (только для админов)"""
+@app.post("/admin/breakers/{service_name}/reset")
+async def reset_circuit_breaker(service_name: str, user_token: dict = Depends(verify_token)):
+    """Принудительное замыкание выключателя сервиса (только для админов)"""
     if user_token.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("user", f"/users/{user_id}", "PUT", data, user_token=user_token)
+    if service_name not in upstreams:
+        raise HTTPException(status_code=404, detail=f"Service {service_name} not found")
+    breaker = upstreams.get(service_name).breaker
+    breaker.reset()
+    return breaker.stats()
 
-@app.delete("/admin/users/{user_id}")
-async def delete_user(user_id: str, user_token: dict = Depends(verify_token)):
-    """Удаление пользователя (только для админов)"""
+@app.get("/admin/rate-limits")
+async def get_rate_limit_stats(user_token: dict = Depends(verify_token)):
+    """Статистика ограничения частоты запросов (только для админов)"""
     if user_token.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("user", f"/users/{user_id}", "DELETE", user_token=user_token)
+    return rate_limiter.stats()
 
-@app.get("/admin/me")
-async def get_admin_profile(user_token: dict = Depends(verify_token)):
-    """Получение профиля админа"""
+@app.get("/admin/auth-cache")
+async def get_auth_cache_stats(user_token: dict = Depends(verify_token)):
+    """Статистика кэша проверенных токенов (только для админов)"""
     if user_token.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("user", "/auth/me", "GET", user_token=user_token)
-
-# Admin Panel API endpoints
-@app.get("/api/users")
-async def api_get_users(
-    page: int = 1,
-    size: int = 10,
-    user_token: dict = Depends(verify_token)
-):
-    """Получение списка пользователей через API"""
-    if user_token.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("user", f"/users?page={page}&limit={size}", "GET", user_token=user_token)
+    return claims_cache.stats()
 
-@app.get("/api/users/{user_id}")
-async def api_get_user(user_id: str, user_token: dict = Depends(verify_token)):
-    """Получение информации о пользователе через API"""
+@app.get("/admin/response-cache")
+async def get_response_cache_stats(user_token: dict = Depends(verify_token)):
+    """Статистика кэша ответов (только для админов)"""
     if user_token.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("user", f"/users/{user_id}", "GET", user_token=user_token)
+    return response_cache.stats()
 
-@app.post("/api/users")
-async def api_create_user(data: dict, user_token: dict = Depends(verify_token)):
-    """Создание пользователя через API"""
+@app.get("/admin/coalescing")
+async def get_coalescing_stats(user_token: dict = Depends(verify_token)):
+    """Статистика объединения одинаковых запросов (только для админов)"""
     if user_token.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("user", "/auth/register", "POST", data, user_token=user_token)
+    return single_flight.stats()
 
-@app.put("/api/users/{user_id}")
-async def api_update_user(user_id: str, data: dict, user_token: dict = Depends(verify_token)):
-    """Обновление пользователя через API"""
+@app.get("/admin/streams")
+async def get_stream_stats(user_token: dict = Depends(verify_token)):
+    """Открытые потоковые соединения WebSocket и SSE со счетчиками каждого (только для админов)"""
     if user_token.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("user", f"/users/{user_id}", "PUT", data, user_token=user_token)
+    return stream_proxy.stats()
+
+# Агрегация статистики дашборда
+DASHBOARD_CALL_TIMEOUT_SECONDS = float(os.getenv("DASHBOARD_CALL_TIMEOUT_SECONDS", "2"))
+dashboard_snapshot = SnapshotCache(ttl_seconds=float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "10")))
+
+# Поля дашборда, которые заполняет каждый источник
+DASHBOARD_SOURCES = {
+    "users": ("total_users",),
+    "doctors": ("total_doctors",),
+    "clinics": ("total_clinics",),
+    "bookings": ("total_appointments", "active_appointments", "pending_appointments", "completed_appointments"),
+}
 
-@app.delete("/api/users/{user_id}")
-async def api_delete_user(user_id: str, user_token: dict = Depends(verify_token)):
-    """Удаление пользователя через API"""
-    if user_token.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("user", f"/users/{user_id}", "DELETE", user_token=user_token)
-
-@app.get("/api/doctors")
-async def api_get_doctors(
-    page: int = 1,
-    size: int = 10,
-    user_token: dict = Depends(verify_token)
-):
-    """Получение списка врачей через API"""
-    if user_token.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("profile", "/doctor-profiles/", "GET", user_token=user_token)
+async def _fetch_count(service_name: str, path: str, user_token: dict) -> int:
+    """Получение счетчика {"count": N} от сервиса"""
+    response = await call_service(service_name, path, "GET", user_token=user_token)
+    response.raise_for_status()
+    return response.json()["count"]
+
+async def _fetch_booking_stats(user_token: dict) -> dict:
+    """Получение количества заказов по статусам от Booking Service"""
+    response = await call_service("booking", "/bookings/stats", "GET", user_token=user_token)
+    response.raise_for_status()
+    stats = response.json()
+    by_status = stats.get("by_status", {})
+    return {
+        "total_appointments": stats.get("total", 0),
+        "active_appointments": by_status.get("assigned", 0) + by_status.get("in_progress", 0),
+        "pending_appointments": by_status.get("pending", 0),
+        "completed_appointments": by_status.get("completed", 0),
+    }
 
-@app.get("/api/doctors/{doctor_id}")
-async def api_get_doctor(doctor_id: str, user_token: dict = Depends(verify_token)):
-    """Получение информации о враче через API"""
-    if user_token.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("profile", f"/doctor-profiles/{doctor_id}", "GET", user_token=user_token)
+@app.get("/api/dashboard/stats")
+async def api_get_dashboard_stats(user_token: dict = Depends(verify_token)):
+    """Получение статистики для дашборда.
 
-@app.post("/api/doctors")
-async def api_create_doctor(data: dict, user_token: dict = Depends(verify_token)):
-    """Создание врача через API"""
+    Сервисы опрашиваются параллельно с дедлайном на каждый вызов. Если источник
+    не ответил вовремя, его поля берутся из последнего снимка и перечисляются в "stale".
+    """
     if user_token.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("profile", "/doctor-profiles/", "POST", data, user_token=user_token)
 
-@app.put("/api/doctors/{doctor_id}")
-async def api_update_doctor(doctor_id: str, data: dict, user_token: dict = Depends(verify_token)):
-    """Обновление врача через API"""
-    if user_token.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("profile", f"/doctor-profiles/{doctor_id}", "PUT", data, user_token=user_token)
+    cached = dashboard_snapshot.get_fresh()
+    if cached is not None:
+        return cached
+
+    results, failures = await fan_out(
+        {
+            "users": lambda: _fetch_count("user", "/users/count", user_token),
+            "doctors": lambda: _fetch_count("profile", "/doctor-profiles/count", user_token),
+            "clinics": lambda: _fetch_count("profile", "/clinic-profiles/count", user_token),
+            "bookings": lambda: _fetch_booking_stats(user_token),
+        },
+        timeout=DASHBOARD_CALL_TIMEOUT_SECONDS,
+    )
+    for source, reason in failures.items():
+        logger.warning("dashboard_source_failed", source=source, reason=reason)
+
+    previous = dashboard_snapshot.last or {}
+    stats = {}
+    stale = []
+    for source, fields in DASHBOARD_SOURCES.items():
+        if source in results:
+            value = results[source]
+            stats.update(value if isinstance(value, dict) else {fields[0]: value})
+            continue
+        stale.extend(fields)
+        for field in fields:
+            stats[field] = previous.get(field, 0)
+
+    stats["stale"] = stale
+    stats["generated_at"] = datetime.utcnow().isoformat()
+    dashboard_snapshot.set(stats)
+    return stats
+
+# Агрегация карточки заказа: дедлайн на каждую часть документа
+BOOKING_DETAILS_TIMEOUTS = {
+    "booking": float(os.getenv("BOOKING_DETAILS_BOOKING_TIMEOUT_SECONDS", "2")),
+    "doctor": float(os.getenv("BOOKING_DETAILS_DOCTOR_TIMEOUT_SECONDS", "1")),
+    "doctor_location": float(os.getenv("BOOKING_DETAILS_LOCATION_TIMEOUT_SECONDS", "0.5")),
+    "payments": float(os.getenv("BOOKING_DETAILS_PAYMENTS_TIMEOUT_SECONDS", "1")),
+    "users": float(os.getenv("BOOKING_DETAILS_USERS_TIMEOUT_SECONDS", "1")),
+}
+# Поля участников заказа в карточке (без контактов)
+BOOKING_DETAILS_USER_FIELDS = ["first_name", "last_name", "role"]
+BOOKING_DETAILS_PARTS = ("doctor", "doctor_location", "payments", "users")
+
+async def _fetch_json(service_name: str, path: str, user_token: dict) -> Any:
+    """Получение JSON-документа от сервиса; ответ не 2xx считается ошибкой"""
+    response = await call_service(service_name, path, "GET", user_token=user_token)
+    response.raise_for_status()
+    return response.json()
+
+def user_loader(user_token: dict, fields: List[str]) -> BatchLoader:
+    """Загрузчик пользователей для агрегаций: ID одного запроса - одним POST /users/batch"""
+    async def fetch_many(ids: List[str]) -> Dict[str, dict]:
+        response = await call_service("user", "/users/batch", "POST", data={"ids": ids, "fields": fields}, user_token=user_token)
+        response.raise_for_status()
+        return response.json()["users"]
+    return BatchLoader(fetch_many)
+
+@app.get("/api/bookings/{booking_id}/details")
+async def api_get_booking_details(booking_id: str, request: Request, user_token: dict = Depends(verify_token)):
+    """Карточка заказа одним ответом: заказ, профиль и местоположение врача, платежи, имена участников.
+
+    Сначала запрашивается заказ: Booking Service проверяет доступ к нему, а
+    doctor_id нужен для остальных частей. Остальные части запрашиваются
+    параллельно, каждая со своим дедлайном; не полученные вовремя или с ошибкой
+    не включаются в ответ и перечисляются в "missing".
+    """
+    await admit_request(request, "GET /api/bookings/{booking_id}/details", "normal", user_token)
 
-@app.delete("/api/doctors/{doctor_id}")
-async def api_delete_doctor(doctor_id: str, user_token: dict = Depends(verify_token)):
-    """Удаление врача через API"""
-    if user_token.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("profile", f"/doctor-profiles/{doctor_id}", "DELETE", user_token=user_token)
-
-@app.get("/api/doctors/list")
-async def api_get_doctors_list(user_token: dict = Depends(verify_token)):
-    """Получение списка врачей (требует аутентификации)"""
-    return await forward_request("user", "/api/doctors/list", "GET", user_token=user_token)
-
-@app.get("/doctors")
-async def get_doctors_list():
-    """Получение списка врачей (без аутентификации)"""
-    return await forward_request("user", "/api/doctors/list", "GET")
-
-@app.get("/api/clinics")
-async def api_get_clinics(
-    page: int = 1,
-    size: int = 10,
-    user_token: dict = Depends(verify_token)
-):
-    """Получение списка клиник через API"""
+    try:
+        response = await asyncio.wait_for(
+            call_service("booking", f"/bookings/{booking_id}", "GET", user_token=user_token),
+            BOOKING_DETAILS_TIMEOUTS["booking"],
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Service booking timed out")
+    if not response.is_success:
+        # Ошибка заказа (404, 403) возвращается клиенту как есть
+        return Response(
+            content=response.content,
+            status_code=response.status_code,
+            media_type=response.headers.get("content-type", "application/json"),
+        )
+    booking = response.json()
+
+    calls = {"payments": lambda: _fetch_json("payment", f"/payments/booking/{booking_id}", user_token)}
+    participants = [user_id for user_id in (booking.get("patient_id"), booking.get("doctor_id")) if user_id]
+    if participants:
+        users = user_loader(user_token, BOOKING_DETAILS_USER_FIELDS)
+        calls["users"] = lambda: users.load_many(participants)
+    doctor_id = booking.get("doctor_id")
+    if doctor_id:
+        calls["doctor"] = lambda: _fetch_json("profile", f"/doctor-profiles/{doctor_id}", user_token)
+        calls["doctor_location"] = lambda: _fetch_json("geo", f"/geo/doctors/{doctor_id}/location", user_token)
+
+    results, failures = await fan_out(calls, timeout=BOOKING_DETAILS_TIMEOUTS)
+    for part, reason in failures.items():
+        logger.warning("booking_details_part_failed", part=part, reason=reason)
+
+    details = {"booking": booking}
+    for part in BOOKING_DETAILS_PARTS:
+        if part in results:
+            details[part] = results[part]
+    details["missing"] = [part for part in BOOKING_DETAILS_PARTS if part in failures]
+    return details
+
+@app.get("/admin/routes")
+async def get_route_table(user_token: dict = Depends(verify_token)):
+    """Таблица маршрутов шлюза (только для админов)"""
     if user_token.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("profile", "/clinic-profiles/", "GET", user_token=user_token)
+    return {
+        "routes": [
+            {
+                "method": route.method,
+                "path": route.path,
+                "service": route.service,
+                "upstream": route.upstream,
+                "auth": route.auth,
+                "roles": list(route.roles),
+                "cache_ttl": route.cache_ttl,
+                "priority": route.priority,
+                "hedge": route.hedge,
+                "stream": route.stream,
+            }
+            for route in ROUTE_TABLE + WEBSOCKET_ROUTE_TABLE
+        ]
+    }
 
-@app.get("/api/clinics/{clinic_id}")
-async def api_get_clinic(clinic_id: str, user_token: dict = Depends(verify_token)):
-    """Получение информации о клинике через API"""
-    if user_token.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("profile", f"/clinic-profiles/{clinic_id}", "GET", user_token=user_token)
+async def _read_json_body(request: Request) -> dict:
+    """Тело запроса как JSON-объект (422, как у FastAPI при data: dict)"""
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(
+            status_code=422,
+            detail=[{"type": "json_invalid", "loc": ["body"], "msg": "JSON decode error"}],
+        )
+    if not isinstance(data, dict):
+        raise HTTPException(
+            status_code=422,
+            detail=[{"type": "dict_type", "loc": ["body"], "msg": "Input should be a valid dictionary"}],
+        )
+    return data
+
+async def admit_request(request: HTTPConnection, route_key: str, priority: str, user_token: Optional[dict]) -> None:
+    """Проверка лимитов частоты до обращения к сервису (429 с Retry-After при превышении).
+
+    Бюджет пользователя ведется по user_id, для анонимных запросов - по адресу
+    клиента (за доверенным прокси - из X-Forwarded-For/X-Real-IP).
+    """
+    if user_token:
+        user_key = str(user_token.get("user_id"))
+    else:
+        peer = request.client.host if request.client else None
+        user_key = f"ip:{client_address(peer, request.headers, rate_limiter.settings.trusted_proxies)}"
+    try:
+        await rate_limiter.check(user_key, route_key, priority)
+    except RateLimitExceeded as e:
+        RATE_LIMITED.labels(e.scope).inc()
+        # Отказы 429 массовые при перегрузке: в журнал попадает только выборка
+        if should_sample():
+            logger.warning("rate_limited", scope=e.scope, key=user_key, route=route_key)
+        raise HTTPException(
+            status_code=429,
+            detail="Too Many Requests",
+            headers={"Retry-After": str(max(math.ceil(e.retry_after), 1))},
+        )
+
+async def _invalidate(route: Route, params: dict, data: Optional[dict]) -> None:
+    """Сброс записей кэша ответов, которые меняет маршрут"""
+    for service_name, template in route.invalidates:
+        try:
+            path = template.format(**{**(data or {}), **params})
+        except KeyError:
+            continue
+        await response_cache.delete(_cache_key(service_name, path, "public"))
+
+def _explicit_route_methods(request: Request) -> tuple:
+    """Методы явного эндпоинта с тем же путем (например, POST /health -> 405, а не 404)"""
+    methods = []
+    for app_route in request.app.router.routes:
+        if getattr(app_route, "endpoint", None) is dispatch:
+            continue
+        matched, _ = app_route.matches(request.scope)
+        if matched != Match.NONE:
+            methods.extend(sorted(getattr(app_route, "methods", None) or ()))
+    return tuple(methods)
+
+async def _execute_route(
+    request: Optional[Request],
+    route: Route,
+    params: dict,
+    query: Any,
+    user_token: Optional[dict],
+    data: Optional[dict]
+) -> Response:
+    """Выполнение маршрута таблицы после аутентификации и проверки лимитов.
+
+    request передается, если ответ уходит клиенту напрямую (условные запросы и готовые сжатые формы кэша).
+    """
+    try:
+        path = route.build_upstream_path(params, query, user_token)
+    except RouteParamError as e:
+        raise HTTPException(status_code=422, detail=e.detail)
 
-@app.post("/api/clinics")
-async def api_create_clinic(data: dict, user_token: dict = Depends(verify_token)):
-    """Создание клиники через API"""
-    if user_token.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("profile", "/clinic-profiles/", "POST", data, user_token=user_token)
+    if route.stream:
+        return await _proxy_event_stream(request, route, path, user_token)
 
-@app.put("/api/clinics/{clinic_id}")
-async def api_update_clinic(clinic_id: str, data: dict, user_token: dict = Depends(verify_token)):
-    """Обновление клиники через API"""
-    if user_token.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("profile", f"/clinic-profiles/{clinic_id}", "PUT", data, user_token=user_token)
+    if route.method == "GET" and route.cache_ttl is not None:
+        return await cached_forward(request, route.service, path, route.cache_ttl, user_token, vary_by_role=route.auth)
 
-@app.delete("/api/clinics/{clinic_id}")
-async def api_delete_clinic(clinic_id: str, user_token: dict = Depends(verify_token)):
-    """Удаление клиники через API"""
-    if user_token.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("profile", f"/clinic-profiles/{clinic_id}", "DELETE", user_token=user_token)
+    response = await forward_request(route.service, path, route.method, data, user_token=user_token, hedge=route.hedge)
+    if route.invalidates:
+        await _invalidate(route, params, data)
+    return response
 
-@app.get("/api/clinics/list")
-async def api_get_clinics_list(user_token: dict = Depends(verify_token)):
-    """Получение списка клиник для форм"""
-    if user_token.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("profile", "/clinic-profiles/", "GET", user_token=user_token)
+async def _proxy_event_stream(request: Optional[Request], route: Route, path: str, user_token: Optional[dict]) -> Response:
+    """Проксирование потока Server-Sent Events.
 
-@app.get("/api/patients")
-async def api_get_patients(user_token: dict = Depends(verify_token)):
-    """Получение списка пациентов"""
-    if user_token.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
-    return await forward_request("user", "/users?role=patient", "GET", user_token=user_token)
+    Ответ сервиса не в формате text/event-stream (например, 404) возвращается как обычный.
+    Last-Event-ID клиента передается сервису, чтобы поток продолжился после переподключения.
+    """
+    headers = {}
+    if request is not None and "last-event-id" in request.headers:
+        headers["Last-Event-ID"] = request.headers["last-event-id"]
+    pool, _, request_headers, _ = _prepare_upstream_call(route.service, path, "GET", None, headers, user_token)
+    user_id = str(user_token.get("user_id")) if user_token else None
+    try:
+        stream = await stream_proxy.open_event_stream(pool, route.path, path, request_headers, user_id)
+    except StreamLimitExceeded:
+        raise HTTPException(status_code=503, detail="Too many streams", headers={"Retry-After": "1"})
+    except CircuitOpenError as e:
+        raise _circuit_open_error(e)
+    except httpx.RequestError as e:
+        logger.error("upstream_request_failed", upstream=route.service, path=path, error=repr(e))
+        raise HTTPException(status_code=503, detail=f"Service {route.service} unavailable")
 
-@app.get("/api/dashboard/stats")
-async def api_get_dashboard_stats(user_token: dict = Depends(verify_token)):
-    """Получение статистики для дашборда"""
-    if user_token.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Доступ запрещен")
-    
+    response_headers = {
+        name: value
+        for name, value in stream.response.headers.items()
+        if name.lower() in PASSTHROUGH_HEADERS and name.lower() != "content-length"
+    }
+    if not stream.is_event_stream:
+        return Response(content=await stream.read_rejected(), status_code=stream.status_code, headers=response_headers)
+    # Промежуточные прокси (nginx) не должны буферизовать события
+    response_headers.update({"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return StreamingResponse(
+        stream,
+        status_code=stream.status_code,
+        headers=response_headers,
+        background=BackgroundTask(stream.aclose),
+    )
+
+# Пакетные запросы мобильных клиентов: несколько подзапросов за один round trip
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+
+async def _run_sub_request(request: Request, sub: SubRequest, user_token: dict) -> dict:
+    """Выполнение подзапроса пакета; ошибка подзапроса не прерывает остальные"""
+    parts = urlsplit(sub.path)
     try:
-        # Получаем статистику от всех сервисов
-        users_response = await forward_request("user", "/users/count", "GET", user_token=user_token)
-        doctors_response = await forward_request("profile", "/doctor-profiles/count", "GET", user_token=user_token)
-        clinics_response = await forward_request("profile", "/clinic-profiles/count", "GET", user_token=user_token)
-        
-        # Извлекаем данные
-        total_users = users_response.get("data", {}).get("count", 0) if users_response.get("status_code") == 200 else 0
-        total_doctors = doctors_response.get("data", {}).get("count", 0) if doctors_response.get("status_code") == 200 else 0
-        total_clinics = clinics_response.get("data", {}).get("count", 0) if clinics_response.get("status_code") == 200 else 0
-        
-        # Получаем статистику от Booking Service
-        bookings_response = await forward_request("booking", "/bookings/count", "GET", user_token=user_token)
-        total_appointments = bookings_response.get("data", {}).get("count", 0) if bookings_response.get("status_code") == 200 else 0
-        
-        return {
-            "total_users": total_users,
-            "total_doctors": total_doctors,
-            "total_clinics": total_clinics,
-            "total_appointments": total_appointments,
-            "active_appointments": 0,  # TODO: Добавить фильтрацию по статусу
-            "pending_appointments": 0,
-            "completed_appointments": 0
-        }
-    except Exception as e:
-        logger.error(f"Ошибка получения статистики: {e}")
-        return {
-            "total_users": 0,
-            "total_doctors": 0,
-            "total_clinics": 0,
-            "total_appointments": 0,
-            "active_appointments": 0,
-            "pending_appointments": 0,
-            "completed_appointments": 0
-        }
+        match = route_trie.match(sub.method.upper(), parts.path)
+        if match is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        if match.route is None:
+            raise HTTPException(status_code=405, detail="Method Not Allowed")
+        route = match.route
+        if route.stream:
+            raise HTTPException(status_code=400, detail="Streaming routes are not available in batch")
+        if route.roles and user_token.get("role") not in route.roles:
+            raise HTTPException(status_code=403, detail="Доступ запрещен")
+        route_token = user_token if route.auth else None
+        await admit_request(request, f"{route.method} {route.path}", route.priority, route_token)
+
+        data = None
+        if route.has_body:
+            if not isinstance(sub.body, dict):
+                raise HTTPException(
+                    status_code=422,
+                    detail=[{"type": "dict_type", "loc": ["body"], "msg": "Input should be a valid dictionary"}],
+                )
+            data = sub.body
+        response = await _execute_route(None, route, match.params, QueryParams(parts.query), route_token, data)
+        body = await read_response_body(response)
+        return sub_response(sub.id, response.status_code, dict(response.headers), body)
+    except HTTPException as e:
+        body = dumps({"detail": e.detail})
+        return sub_response(sub.id, e.status_code, {"content-type": "application/json", **(e.headers or {})}, body)
+
+@app.post("/batch")
+async def api_batch(request: Request, batch: BatchRequest, user_token: dict = Depends(verify_token)):
+    """Пакетное выполнение запросов к маршрутам шлюза.
+
+    Токен проверяется один раз, подзапросы выполняются параллельно, каждый
+    получает собственный код ответа в порядке следования в пакете.
+    """
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=422, detail=f"Too many requests in batch (max {BATCH_MAX_REQUESTS})")
+    responses = await asyncio.gather(*(_run_sub_request(request, sub, user_token) for sub in batch.requests))
+    return {"responses": responses}
+
+# Единый диспетчер маршрутов таблицы. Объявлен последним, чтобы явные
+# эндпоинты выше (health, статистика, дашборд) сопоставлялись первыми.
+@app.api_route("/{full_path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"], include_in_schema=False)
+async def dispatch(request: Request, full_path: str):
+    """Проксирование запроса по таблице маршрутов"""
+    match = route_trie.match(request.method, "/" + full_path)
+    if match is None:
+        allowed = _explicit_route_methods(request)
+        if not allowed:
+            raise HTTPException(status_code=404, detail="Not Found")
+        match = RouteMatch(None, {}, allowed)
+    if match.route is None:
+        raise HTTPException(
+            status_code=405,
+            detail="Method Not Allowed",
+            headers={"Allow": ", ".join(match.allowed_methods)},
+        )
+    route = match.route
+    set_route_label(request, route.path)
+
+    user_token = None
+    if route.auth:
+        user_token = await verify_token(await security(request))
+        if route.roles and user_token.get("role") not in route.roles:
+            raise HTTPException(status_code=403, detail="Доступ запрещен")
+    await admit_request(request, f"{route.method} {route.path}", route.priority, user_token)
+
+    data = await _read_json_body(request) if route.has_body else None
+    return await _execute_route(request, route, match.params, request.query_params, user_token, data)
+
+@app.websocket("/{full_path:path}")
+async def websocket_dispatch(websocket: WebSocket, full_path: str):
+    """Проксирование WebSocket по таблице WEBSOCKET_ROUTE_TABLE.
+
+    Токен проверяется при рукопожатии: до принятия соединения отказ
+    (неизвестный путь, неверный токен, нет роли) закрывает его с кодом 1008.
+    """
+    match = websocket_trie.match("WEBSOCKET", "/" + full_path)
+    if match is None or match.route is None:
+        await websocket.close(code=WS_POLICY_VIOLATION)
+        return
+    route = match.route
+
+    user_token = None
+    try:
+        if route.auth:
+            authorization = websocket.headers.get("authorization", "")
+            scheme, _, token = authorization.partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                token = websocket.query_params.get("access_token", "")
+            if not token:
+                raise HTTPException(status_code=401, detail="Not authenticated")
+            user_token = await verify_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+            if route.roles and user_token.get("role") not in route.roles:
+                raise HTTPException(status_code=403, detail="Доступ запрещен")
+        await admit_request(websocket, f"{route.method} {route.path}", route.priority, user_token)
+        path = route.build_upstream_path(match.params, websocket.query_params, user_token)
+    except HTTPException as e:
+        code = WS_TRY_AGAIN_LATER if e.status_code == 429 else WS_POLICY_VIOLATION
+        await websocket.close(code=code, reason=str(e.detail))
+        return
+    except RouteParamError:
+        await websocket.close(code=WS_POLICY_VIOLATION)
+        return
+
+    pool, _, headers, _ = _prepare_upstream_call(route.service, path, "GET", None, None, user_token)
+    await stream_proxy.proxy_websocket(
+        websocket,
+        pool,
+        route.path,
+        path,
+        headers,
+        str(user_token.get("user_id")) if user_token else None,
+        subprotocols=websocket.scope.get("subprotocols", ()),
+    )
+
+def custom_openapi() -> dict:
+    """OpenAPI-схема: явные эндпоинты FastAPI и маршруты таблицы"""
+    if app.openapi_schema:
+        return app.openapi_schema
+    schema = get_openapi(title=app.title, version=app.version, description=app.description, routes=app.routes)
+    for path, operations in openapi_paths(ROUTE_TABLE).items():
+        schema.setdefault("paths", {}).setdefault(path, {}).update(operations)
+    schema.setdefault("components", {}).setdefault("securitySchemes", {})["HTTPBearer"] = {
+        "type": "http",
+        "scheme": "bearer",
+    }
+    app.openapi_schema = schema
+    return schema
+
+app.openapi = custom_openapi
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,326 @@
+"""
+@file: ratelimit.py
+@description: Ограничение частоты запросов API Gateway (token bucket): по пользователю, маршруту и глобально
+@dependencies: redis (опционально), main.py (dispatch), shared/log.py
+@created: 2026-10-18
+"""
+import ipaddress
+import os
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis не установлен - лимиты считаются в памяти процесса
+    aioredis = None
+
+from shared.log import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class BucketLimit:
+    """Пополнение rate токенов в секунду, емкость burst"""
+    rate: float
+    burst: float
+
+
+# Ведро уровня: ключ, лимит и остаток, который должен сохраниться после списания
+Bucket = Tuple[str, BucketLimit, float]
+
+
+class RateLimitExceeded(Exception):
+    """Исчерпан бюджет запросов одного из уровней (user, route, global)"""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded: {scope}")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+def refill(tokens: float, updated_at: float, now: float, limit: BucketLimit) -> float:
+    """Число токенов в ведре к моменту now"""
+    return min(limit.burst, tokens + max(now - updated_at, 0.0) * limit.rate)
+
+
+class MemoryBucketStore:
+    """Ведра в памяти процесса, разбитые на шарды.
+
+    Каждый шард - LRU с ограниченным числом ключей: поток запросов с
+    уникальными ключами (например, с разных адресов) не раздувает память,
+    вытесненное ведро просто начинает с полной емкости.
+    """
+
+    def __init__(self, shards: int = 16, max_keys_per_shard: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self._shards: List["OrderedDict[str, Tuple[float, float]]"] = [OrderedDict() for _ in range(shards)]
+        self.max_keys_per_shard = max_keys_per_shard
+        self._clock = clock
+
+    def _shard(self, key: str) -> "OrderedDict[str, Tuple[float, float]]":
+        return self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+    async def take(self, key: str, limit: BucketLimit, cost: float = 1.0, reserve: float = 0.0) -> Tuple[bool, float]:
+        """Списание cost токенов, если после него в ведре останется не меньше reserve.
+
+        Возвращает (разрешено, через сколько секунд повторить).
+        """
+        rejected, retry_after = await self.take_all([(key, limit, reserve)], cost)
+        return rejected is None, retry_after
+
+    async def take_all(self, buckets: Sequence[Bucket], cost: float = 1.0) -> Tuple[Optional[int], float]:
+        """Списание cost токенов из всех ведер или ни из одного.
+
+        Возвращает (индекс первого ведра, где не хватает токенов, или None;
+        через сколько секунд повторить).
+        """
+        now = self._clock()
+        balances = []
+        for index, (key, limit, reserve) in enumerate(buckets):
+            tokens, updated_at = self._shard(key).get(key, (limit.burst, now))
+            tokens = refill(tokens, updated_at, now, limit)
+            if tokens - cost < reserve:
+                return index, (cost + reserve - tokens) / limit.rate
+            balances.append(tokens - cost)
+
+        for (key, _, _), tokens in zip(buckets, balances):
+            shard = self._shard(key)
+            shard[key] = (tokens, now)
+            shard.move_to_end(key)
+            if len(shard) > self.max_keys_per_shard:
+                shard.popitem(last=False)
+        return None, 0.0
+
+    async def clear(self) -> None:
+        for shard in self._shards:
+            shard.clear()
+
+    async def close(self) -> None:
+        pass
+
+    def size(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+
+# Атомарное списание из всех ведер (все или ни одного); время берется у Redis, чтобы часы
+# экземпляров шлюза не расходились. ARGV: cost, затем rate, burst, reserve для каждого ключа.
+# Возвращает {номер первого ведра без токенов (с 1) или 0, время до повтора}
+TAKE_ALL_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local balances = {}
+for i, key in ipairs(KEYS) do
+    local limit_rate = tonumber(ARGV[i * 3 - 1])
+    local burst = tonumber(ARGV[i * 3])
+    local reserve = tonumber(ARGV[i * 3 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(now - ts, 0) * limit_rate)
+    if tokens - cost < reserve then
+        return {i, tostring((cost + reserve - tokens) / limit_rate)}
+    end
+    balances[i] = tokens - cost
+end
+for i, key in ipairs(KEYS) do
+    local limit_rate = tonumber(ARGV[i * 3 - 1])
+    local burst = tonumber(ARGV[i * 3])
+    redis.call('HSET', key, 'tokens', balances[i], 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(burst / limit_rate * 1000) + 1000)
+end
+return {0, '0'}
+"""
+
+
+class RedisBucketStore:
+    """Ведра в Redis: общий бюджет для нескольких процессов шлюза"""
+
+    def __init__(self, url: str, prefix: str = "tot:gateway:ratelimit:"):
+        self.prefix = prefix
+        self._client = aioredis.from_url(url)
+        self._script = self._client.register_script(TAKE_ALL_SCRIPT)
+
+    async def take(self, key: str, limit: BucketLimit, cost: float = 1.0, reserve: float = 0.0) -> Tuple[bool, float]:
+        rejected, retry_after = await self.take_all([(key, limit, reserve)], cost)
+        return rejected is None, retry_after
+
+    async def take_all(self, buckets: Sequence[Bucket], cost: float = 1.0) -> Tuple[Optional[int], float]:
+        args = [cost]
+        for _, limit, reserve in buckets:
+            args.extend([limit.rate, limit.burst, reserve])
+        rejected, retry_after = await self._script(keys=[self.prefix + key for key, _, _ in buckets], args=args)
+        return (int(rejected) - 1 if int(rejected) else None), float(retry_after)
+
+    async def clear(self) -> None:
+        async for key in self._client.scan_iter(match=self.prefix + "*"):
+            await self._client.delete(key)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def parse_trusted_proxies(value: str) -> tuple:
+    """Адреса и подсети доверенных прокси через запятую: "10.0.0.5, 172.16.0.0/12" """
+    return tuple(ipaddress.ip_network(item.strip(), strict=False) for item in value.split(",") if item.strip())
+
+
+def _is_trusted(address: str, trusted_proxies: tuple) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+
+def client_address(peer: Optional[str], headers: Mapping[str, str], trusted_proxies: tuple) -> str:
+    """Адрес клиента для анонимного бюджета.
+
+    X-Forwarded-For и X-Real-IP учитываются, только если запрос пришел от
+    доверенного прокси: X-Forwarded-For просматривается справа налево, клиент -
+    первый адрес не из доверенных прокси. Иначе заголовки может подделать сам
+    клиент, и адрес берется из соединения.
+    """
+    if not peer or not _is_trusted(peer, trusted_proxies):
+        return peer or "unknown"
+    forwarded = [item.strip() for item in headers.get("x-forwarded-for", "").split(",") if item.strip()]
+    for address in reversed(forwarded):
+        if not _is_trusted(address, trusted_proxies):
+            return address
+    if forwarded:
+        return forwarded[0]
+    return headers.get("x-real-ip", "").strip() or peer
+
+
+@dataclass(frozen=True)
+class RateLimitSettings:
+    """Лимиты уровней; None - уровень отключен"""
+    user: Optional[BucketLimit]
+    route: Optional[BucketLimit]
+    global_: Optional[BucketLimit]
+    # Доля глобального бюджета, недоступная маршрутам с priority="low"
+    low_priority_reserve: float = 0.2
+    # Прокси перед шлюзом (nginx), которым доверяется X-Forwarded-For/X-Real-IP
+    trusted_proxies: tuple = ()
+
+
+class RateLimiter:
+    """Проверка запроса по ведрам пользователя, маршрута и глобальному.
+
+    Маршруты с priority="high" (аутентификация, экстренные вызовы) не
+    ограничиваются глобальным ведром; маршруты с priority="low" получают
+    глобальный бюджет, только пока в нем остается low_priority_reserve, и
+    поэтому отсекаются первыми при перегрузке.
+    При ошибке Redis лимиты на RETRY_SECONDS считаются в памяти процесса.
+    """
+
+    RETRY_SECONDS = 30
+
+    def __init__(self, settings: RateLimitSettings, primary=None, memory: Optional[MemoryBucketStore] = None):
+        self.settings = settings
+        self.memory = memory or MemoryBucketStore()
+        self.primary = primary
+        self._primary_down_until = 0.0
+        self.allowed = 0
+        self.limited: Dict[str, int] = {"user": 0, "route": 0, "global": 0}
+
+    def _store(self):
+        if self.primary is not None and time.monotonic() >= self._primary_down_until:
+            return self.primary
+        return self.memory
+
+    async def _take_all(self, buckets: List[Bucket]) -> Tuple[Optional[int], float]:
+        store = self._store()
+        try:
+            return await store.take_all(buckets)
+        except Exception as e:
+            if store is self.memory:
+                raise
+            logger.warning("rate_limit_backend_down", error=repr(e))
+            self._primary_down_until = time.monotonic() + self.RETRY_SECONDS
+            return await self.memory.take_all(buckets)
+
+    async def check(self, user_key: str, route_key: str, priority: str = "normal") -> None:
+        """Списание токенов; при превышении выбрасывает RateLimitExceeded.
+
+        Токены списываются со всех уровней сразу или ни с одного: запрос,
+        отклоненный маршрутом или глобальным ведром, не расходует бюджет
+        пользователя.
+        """
+        levels = [
+            ("user", f"user:{user_key}", self.settings.user, 0.0),
+            ("route", f"route:{route_key}", self.settings.route, 0.0),
+        ]
+        if priority != "high" and self.settings.global_ is not None:
+            reserve = self.settings.global_.burst * self.settings.low_priority_reserve if priority == "low" else 0.0
+            levels.append(("global", "global", self.settings.global_, reserve))
+        levels = [level for level in levels if level[2] is not None]
+        if not levels:
+            self.allowed += 1
+            return
+
+        rejected, retry_after = await self._take_all([(key, limit, reserve) for _, key, limit, reserve in levels])
+        if rejected is not None:
+            scope = levels[rejected][0]
+            self.limited[scope] += 1
+            raise RateLimitExceeded(scope, retry_after)
+        self.allowed += 1
+
+    async def clear(self) -> None:
+        await self.memory.clear()
+        if self.primary is not None:
+            try:
+                await self.primary.clear()
+            except Exception as e:
+                logger.warning("rate_limit_clear_failed", error=repr(e))
+        self.allowed = 0
+        self.limited = {scope: 0 for scope in self.limited}
+
+    async def close(self) -> None:
+        if self.primary is not None:
+            await self.primary.close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis" if self._store() is self.primary else "memory",
+            "allowed": self.allowed,
+            "limited": dict(self.limited),
+            "memory_keys": self.memory.size(),
+        }
+
+
+def _limit_from_env(level: str, rate: str, burst: str) -> Optional[BucketLimit]:
+    """RATE_LIMIT_<LEVEL>_RATE / RATE_LIMIT_<LEVEL>_BURST; rate 0 отключает уровень"""
+    limit_rate = float(os.getenv(f"RATE_LIMIT_{level}_RATE", rate))
+    if limit_rate <= 0:
+        return None
+    return BucketLimit(rate=limit_rate, burst=float(os.getenv(f"RATE_LIMIT_{level}_BURST", burst)))
+
+
+def create_rate_limiter() -> RateLimiter:
+    """Создание ограничителя по настройкам окружения.
+
+    RATE_LIMIT_ENABLED=false отключает все уровни.
+    RATE_LIMIT_BACKEND: auto (Redis, если задан REDIS_URL и установлен redis), redis или memory.
+    RATE_LIMIT_TRUSTED_PROXIES: адреса и подсети прокси перед шлюзом (см. client_address).
+    """
+    if os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "true":
+        return RateLimiter(RateLimitSettings(user=None, route=None, global_=None))
+
+    settings = RateLimitSettings(
+        user=_limit_from_env("USER", "20", "40"),
+        route=_limit_from_env("ROUTE", "500", "1000"),
+        global_=_limit_from_env("GLOBAL", "2000", "4000"),
+        low_priority_reserve=float(os.getenv("RATE_LIMIT_LOW_PRIORITY_RESERVE", "0.2")),
+        trusted_proxies=parse_trusted_proxies(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "")),
+    )
+    backend = os.getenv("RATE_LIMIT_BACKEND", "auto")
+    redis_url = os.getenv("REDIS_URL")
+    if backend == "memory" or not redis_url or aioredis is None:
+        if backend == "redis":
+            logger.warning("rate_limit_redis_unavailable", reason="REDIS_URL or redis package is missing")
+        return RateLimiter(settings)
+    return RateLimiter(settings, primary=RedisBucketStore(redis_url))
@@ -0,0 +1,230 @@
+"""
+@file: response_cache.py
+@description: Кэш ответов API Gateway для публичных и редко меняющихся GET (Redis или LRU в памяти)
+@dependencies: redis (опционально), main.py (cached_forward), shared/log.py
+@created: 2026-10-18
+"""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis не установлен - работаем только с кэшем в памяти
+    aioredis = None
+
+from shared.log import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class CachedResponse:
+    """Сохраненный ответ сервиса"""
+    status_code: int
+    body: bytes
+    etag: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    # Сжатые формы тела по кодировкам (gzip, br), чтобы не сжимать одно и то же при каждом попадании
+    variants: Dict[str, bytes] = field(default_factory=dict)
+
+    def to_bytes(self) -> bytes:
+        meta = {
+            "status_code": self.status_code,
+            "etag": self.etag,
+            "headers": self.headers,
+            "variants": {encoding: len(data) for encoding, data in self.variants.items()},
+        }
+        return json.dumps(meta).encode() + b"\n" + self.body + b"".join(self.variants.values())
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "CachedResponse":
+        meta, _, payload = raw.partition(b"\n")
+        data = json.loads(meta)
+        variants = {}
+        offset = len(payload) - sum(data.get("variants", {}).values())
+        body = payload[:offset]
+        for encoding, length in data.get("variants", {}).items():
+            variants[encoding] = payload[offset:offset + length]
+            offset += length
+        return cls(
+            status_code=data["status_code"],
+            body=body,
+            etag=data["etag"],
+            headers=data["headers"],
+            variants=variants,
+        )
+
+
+def make_etag(body: bytes) -> str:
+    """Слабый ETag по содержимому тела"""
+    return f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка заголовка If-None-Match (список или "*")"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    weak_etag = etag[2:] if etag.startswith("W/") else etag
+    return "*" in candidates or any(
+        (candidate[2:] if candidate.startswith("W/") else candidate) == weak_etag
+        for candidate in candidates
+    )
+
+
+class MemoryBackend:
+    """LRU в памяти процесса с TTL на запись"""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, raw = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return raw
+
+    async def set(self, key: str, raw: bytes, ttl: int) -> None:
+        self._entries[key] = (time.monotonic() + ttl, raw)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisBackend:
+    """Общий для нескольких экземпляров шлюза кэш в Redis"""
+
+    def __init__(self, url: str, prefix: str = "tot:gateway:cache:"):
+        self.prefix = prefix
+        self._client = aioredis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(self.prefix + key)
+
+    async def set(self, key: str, raw: bytes, ttl: int) -> None:
+        await self._client.set(self.prefix + key, raw, ex=ttl)
+
+    async def delete(self, key: str) -> None:
+        await self._client.delete(self.prefix + key)
+
+    async def clear(self) -> None:
+        async for key in self._client.scan_iter(match=self.prefix + "*"):
+            await self._client.delete(key)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class ResponseCache:
+    """Кэш ответов с основным хранилищем и резервным LRU в памяти.
+
+    При ошибке Redis кэш на RETRY_SECONDS переключается на память, чтобы
+    недоступность Redis не сказывалась на запросах.
+    """
+
+    RETRY_SECONDS = 30
+
+    def __init__(self, primary=None, max_entries: int = 1000):
+        self.memory = MemoryBackend(max_entries)
+        self.primary = primary
+        self._primary_down_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _backend(self):
+        if self.primary is not None and time.monotonic() >= self._primary_down_until:
+            return self.primary
+        return self.memory
+
+    def _mark_primary_down(self, error: Exception) -> None:
+        logger.warning("response_cache_backend_down", error=repr(error))
+        self._primary_down_until = time.monotonic() + self.RETRY_SECONDS
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        backend = self._backend()
+        try:
+            raw = await backend.get(key)
+        except Exception as e:
+            self._mark_primary_down(e)
+            raw = await self.memory.get(key)
+
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CachedResponse.from_bytes(raw)
+
+    async def set(self, key: str, response: CachedResponse, ttl: int) -> None:
+        backend = self._backend()
+        try:
+            await backend.set(key, response.to_bytes(), ttl)
+        except Exception as e:
+            self._mark_primary_down(e)
+            await self.memory.set(key, response.to_bytes(), ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.memory.delete(key)
+        if self.primary is not None:
+            try:
+                await self.primary.delete(key)
+            except Exception as e:
+                self._mark_primary_down(e)
+
+    async def clear(self) -> None:
+        await self.memory.clear()
+        if self.primary is not None:
+            try:
+                await self.primary.clear()
+            except Exception as e:
+                self._mark_primary_down(e)
+        self.hits = self.misses = self.not_modified = 0
+
+    async def close(self) -> None:
+        if self.primary is not None:
+            await self.primary.close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis" if self._backend() is self.primary else "memory",
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "memory_entries": len(self.memory._entries),
+        }
+
+
+def create_response_cache() -> ResponseCache:
+    """Создание кэша по настройкам окружения.
+
+    RESPONSE_CACHE_BACKEND: auto (Redis, если задан REDIS_URL и установлен redis), redis или memory.
+    """
+    backend = os.getenv("RESPONSE_CACHE_BACKEND", "auto")
+    redis_url = os.getenv("REDIS_URL")
+    max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+
+    if backend == "memory" or not redis_url or aioredis is None:
+        if backend == "redis":
+            logger.warning("response_cache_redis_unavailable", reason="REDIS_URL or redis package is missing")
+        return ResponseCache(max_entries=max_entries)
+    return ResponseCache(primary=RedisBackend(redis_url), max_entries=max_entries)
@@ -0,0 +1,208 @@
+"""
+@file: routing.py
+@description: Декларативная таблица маршрутов API Gateway и префиксное дерево для их сопоставления
+@dependencies: main.py (ROUTE_TABLE, dispatch)
+@created: 2026-10-18
+"""
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+REQUIRED = object()
+
+
+class RouteParamError(ValueError):
+    """Отсутствующий или некорректный query-параметр запроса"""
+
+    def __init__(self, name: str, error_type: str, message: str):
+        super().__init__(message)
+        self.detail = [{"type": error_type, "loc": ["query", name], "msg": message}]
+
+
+@dataclass(frozen=True)
+class QueryParam:
+    """Query-параметр, передаваемый сервису.
+
+    source - имя параметра у клиента (по умолчанию совпадает с name).
+    default=None - необязательный параметр: передается сервису, только если задан клиентом.
+    """
+    name: str
+    source: Optional[str] = None
+    default: Any = REQUIRED
+    cast: Callable[[str], Any] = str
+
+
+@dataclass(frozen=True)
+class Route:
+    """Описание маршрута шлюза.
+
+    upstream - шаблон пути сервиса: подставляются параметры пути и {me} (user_id из токена).
+    invalidates - записи кэша ответов (сервис, шаблон пути), сбрасываемые после запроса;
+    в шаблоне доступны параметры пути и поля тела запроса.
+    hedge - разрешение хеджа для идемпотентного GET (второй запрос, если сервис не ответил за p95).
+    stream - поток Server-Sent Events: идет мимо слотов пула, ограничен таймаутом простоя, а не запроса.
+    Маршруты WebSocket описываются тем же классом с методом WEBSOCKET.
+    """
+    method: str
+    path: str
+    service: str
+    upstream: str
+    auth: bool = True
+    roles: Tuple[str, ...] = ()
+    query: Tuple[QueryParam, ...] = ()
+    body: Optional[bool] = None
+    cache_ttl: Optional[int] = None
+    invalidates: Tuple[Tuple[str, str], ...] = ()
+    priority: str = "normal"
+    hedge: bool = False
+    stream: bool = False
+    summary: str = ""
+    param_names: Tuple[str, ...] = field(init=False, default=())
+
+    def __post_init__(self):
+        names = tuple(segment[1:-1] for segment in _split(self.path) if _is_param(segment))
+        object.__setattr__(self, "param_names", names)
+
+    @property
+    def has_body(self) -> bool:
+        return self.body if self.body is not None else self.method in ("POST", "PUT")
+
+    def build_upstream_path(self, params: Dict[str, str], query: Any, user_token: Optional[dict]) -> str:
+        """Путь запроса к сервису с подставленными параметрами"""
+        path = self.upstream.format(me=(user_token or {}).get("user_id"), **params)
+        values = []
+        for param in self.query:
+            raw = query.get(param.source or param.name)
+            if raw is None:
+                if param.default is REQUIRED:
+                    raise RouteParamError(param.source or param.name, "missing", "Field required")
+                if param.default is not None:
+                    values.append((param.name, param.default))
+                continue
+            try:
+                values.append((param.name, param.cast(raw)))
+            except ValueError:
+                raise RouteParamError(param.source or param.name, "parsing", f"Invalid value: {raw}")
+        if not values:
+            return path
+        return f"{path}{'&' if '?' in path else '?'}{urlencode(values)}"
+
+
+@dataclass
+class RouteMatch:
+    """Результат сопоставления: маршрут (None - путь есть, но метод не поддерживается)"""
+    route: Optional[Route]
+    params: Dict[str, str]
+    allowed_methods: Tuple[str, ...]
+
+
+def _split(path: str) -> List[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+def _is_param(segment: str) -> bool:
+    return segment.startswith("{") and segment.endswith("}")
+
+
+class _Node:
+    __slots__ = ("static", "param", "routes")
+
+    def __init__(self):
+        self.static: Dict[str, "_Node"] = {}
+        self.param: Optional["_Node"] = None
+        self.routes: Dict[str, Route] = {}
+
+
+class RouteTrie:
+    """Префиксное дерево маршрутов по сегментам пути.
+
+    Статический сегмент имеет приоритет над параметром, поэтому /api/doctors/list
+    не перехватывается маршрутом /api/doctors/{doctor_id} независимо от порядка в таблице.
+    """
+
+    def __init__(self, routes: List[Route]):
+        self._root = _Node()
+        self.routes = list(routes)
+        for route in self.routes:
+            self._add(route)
+
+    def _add(self, route: Route) -> None:
+        node = self._root
+        for segment in _split(route.path):
+            if _is_param(segment):
+                node.param = node.param or _Node()
+                node = node.param
+            else:
+                node = node.static.setdefault(segment, _Node())
+        if route.method in node.routes:
+            raise ValueError(f"Duplicate route: {route.method} {route.path}")
+        node.routes[route.method] = route
+
+    def _find(self, node: _Node, segments: List[str], index: int, values: List[str], method: Optional[str]) -> Optional[_Node]:
+        if index == len(segments):
+            if method is None:
+                return node if node.routes else None
+            return node if method in node.routes else None
+
+        child = node.static.get(segments[index])
+        if child is not None:
+            found = self._find(child, segments, index + 1, values, method)
+            if found is not None:
+                return found
+
+        if node.param is not None:
+            values.append(segments[index])
+            found = self._find(node.param, segments, index + 1, values, method)
+            if found is not None:
+                return found
+            values.pop()
+        return None
+
+    def match(self, method: str, path: str) -> Optional[RouteMatch]:
+        """Поиск маршрута; None - путь не найден"""
+        segments = _split(path)
+        values: List[str] = []
+        node = self._find(self._root, segments, 0, values, method)
+        if node is not None:
+            route = node.routes[method]
+            return RouteMatch(route, dict(zip(route.param_names, values)), tuple(node.routes))
+
+        values = []
+        node = self._find(self._root, segments, 0, values, None)
+        if node is None:
+            return None
+        return RouteMatch(None, {}, tuple(node.routes))
+
+
+def openapi_paths(routes: List[Route]) -> Dict[str, dict]:
+    """Описание маршрутов таблицы для OpenAPI-схемы"""
+    paths: Dict[str, dict] = {}
+    for route in routes:
+        parameters = [
+            {"name": name, "in": "path", "required": True, "schema": {"type": "string"}}
+            for name in route.param_names
+        ]
+        parameters += [
+            {
+                "name": param.source or param.name,
+                "in": "query",
+                "required": param.default is REQUIRED,
+                "schema": {"type": "number" if param.cast is float else "integer" if param.cast is int else "string"},
+            }
+            for param in route.query
+        ]
+        operation = {
+            "summary": route.summary,
+            "tags": [route.service],
+            "parameters": parameters,
+            "responses": {"200": {"description": "Ответ сервиса"}},
+        }
+        if route.has_body:
+            operation["requestBody"] = {
+                "required": True,
+                "content": {"application/json": {"schema": {"type": "object"}}},
+            }
+        if route.auth:
+            operation["security"] = [{"HTTPBearer": []}]
+        paths.setdefault(route.path, {})[route.method.lower()] = operation
+    return paths
@@ -0,0 +1,433 @@
+"""
+@file: streaming.py
+@description: Проксирование WebSocket и Server-Sent Events через API Gateway: таймаут простоя, обратное давление, учет соединений
+@dependencies: websockets (опционально), httpx, starlette, upstream.py, shared/metrics.py, main.py (websocket_dispatch, _proxy_event_stream)
+@created: 2026-10-18
+"""
+import asyncio
+import itertools
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
+
+try:
+    import websockets
+    import websockets.exceptions
+except ImportError:  # без websockets проксируются только SSE
+    websockets = None
+
+from shared.log import get_logger
+from shared.metrics import (
+    GATEWAY_STREAM_BYTES,
+    GATEWAY_STREAM_DURATION,
+    GATEWAY_STREAM_MESSAGES,
+    GATEWAY_STREAMS_ACTIVE,
+    GATEWAY_STREAMS_CLOSED,
+)
+from upstream import UpstreamPool
+
+logger = get_logger(__name__)
+
+WEBSOCKET = "websocket"
+SSE = "sse"
+TO_UPSTREAM = "to_upstream"
+TO_CLIENT = "to_client"
+
+# Коды закрытия WebSocket (RFC 6455, раздел 7.4.1)
+WS_NORMAL = 1000
+WS_GOING_AWAY = 1001
+WS_POLICY_VIOLATION = 1008
+WS_MESSAGE_TOO_BIG = 1009
+WS_INTERNAL_ERROR = 1011
+WS_TRY_AGAIN_LATER = 1013
+
+
+@dataclass(frozen=True)
+class StreamSettings:
+    """Настройки потоковых соединений шлюза"""
+    idle_timeout: float = 60.0
+    connect_timeout: float = 5.0
+    max_connections: int = 1000
+    max_message_bytes: int = 1024 * 1024
+    # Сообщений сервиса, принятых, но еще не переданных клиенту (дальше сервис ждет)
+    queue_size: int = 16
+
+
+def load_stream_settings() -> StreamSettings:
+    return StreamSettings(
+        idle_timeout=float(os.getenv("STREAM_IDLE_TIMEOUT_SECONDS", "60")),
+        connect_timeout=float(os.getenv("STREAM_CONNECT_TIMEOUT_SECONDS", "5")),
+        max_connections=int(os.getenv("STREAM_MAX_CONNECTIONS", "1000")),
+        max_message_bytes=int(os.getenv("WS_MAX_MESSAGE_BYTES", str(1024 * 1024))),
+        queue_size=int(os.getenv("WS_QUEUE_SIZE", "16")),
+    )
+
+
+class StreamLimitExceeded(Exception):
+    """Достигнут предел одновременных потоковых соединений шлюза"""
+
+
+class StreamConnection:
+    """Счетчики одного потокового соединения"""
+
+    def __init__(self, connection_id: int, kind: str, upstream: str, route: str, user_id: Optional[str]):
+        self.id = connection_id
+        self.kind = kind
+        self.upstream = upstream
+        self.route = route
+        self.user_id = user_id
+        self.opened_at = datetime.utcnow()
+        self.started = time.monotonic()
+        self.last_activity = self.started
+        self.messages = {TO_UPSTREAM: 0, TO_CLIENT: 0}
+        self.bytes = {TO_UPSTREAM: 0, TO_CLIENT: 0}
+
+    def record(self, direction: str, size: int, messages: int = 1) -> None:
+        self.last_activity = time.monotonic()
+        self.messages[direction] += messages
+        self.bytes[direction] += size
+        GATEWAY_STREAM_MESSAGES.labels(self.kind, self.upstream, direction).inc(messages)
+        GATEWAY_STREAM_BYTES.labels(self.kind, self.upstream, direction).inc(size)
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self.last_activity
+
+    def stats(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "upstream": self.upstream,
+            "route": self.route,
+            "user_id": self.user_id,
+            "opened_at": self.opened_at.isoformat(),
+            "duration_seconds": round(time.monotonic() - self.started, 3),
+            "idle_seconds": round(self.idle_for(), 3),
+            "messages": dict(self.messages),
+            "bytes": dict(self.bytes),
+        }
+
+
+class StreamTracker:
+    """Открытые потоковые соединения: предел числа, метрики и запись в журнал при закрытии"""
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self._active: Dict[int, StreamConnection] = {}
+        self._ids = itertools.count(1)
+        self._closed: Dict[str, int] = {}
+
+    def open(self, kind: str, upstream: str, route: str, user_id: Optional[str]) -> StreamConnection:
+        if len(self._active) >= self.max_connections:
+            GATEWAY_STREAMS_CLOSED.labels(kind, upstream, "rejected").inc()
+            self._closed["rejected"] = self._closed.get("rejected", 0) + 1
+            raise StreamLimitExceeded()
+        connection = StreamConnection(next(self._ids), kind, upstream, route, user_id)
+        self._active[connection.id] = connection
+        GATEWAY_STREAMS_ACTIVE.labels(kind, upstream).inc()
+        return connection
+
+    def close(self, connection: StreamConnection, reason: str) -> None:
+        if self._active.pop(connection.id, None) is None:
+            return
+        duration = time.monotonic() - connection.started
+        GATEWAY_STREAMS_ACTIVE.labels(connection.kind, connection.upstream).dec()
+        GATEWAY_STREAMS_CLOSED.labels(connection.kind, connection.upstream, reason).inc()
+        GATEWAY_STREAM_DURATION.labels(connection.kind, connection.upstream).observe(duration)
+        self._closed[reason] = self._closed.get(reason, 0) + 1
+        logger.info("stream_closed", reason=reason, **connection.stats())
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._active),
+            "max_connections": self.max_connections,
+            "closed": dict(self._closed),
+            "connections": [connection.stats() for connection in self._active.values()],
+        }
+
+
+def _handshake_failed(error: BaseException) -> bool:
+    """Ошибка открытия потока, которая говорит о неисправности сервиса"""
+    if websockets is not None:
+        if isinstance(error, websockets.exceptions.InvalidStatusCode):
+            return error.status_code >= 500
+        if isinstance(error, websockets.exceptions.InvalidHandshake):
+            return True
+    return isinstance(error, (httpx.HTTPError, OSError, asyncio.TimeoutError))
+
+
+def _websocket_url(base_url: str, path: str) -> str:
+    if base_url.startswith("https://"):
+        return "wss://" + base_url[len("https://"):] + path
+    return "ws://" + base_url[len("http://"):] + path
+
+
+def _client_close_code(code: Optional[int]) -> int:
+    """Код закрытия сервиса, допустимый для отправки клиенту (1005/1006 отправлять нельзя)"""
+    if code is None or code == 1005:
+        return WS_NORMAL
+    if code == 1006:
+        return WS_INTERNAL_ERROR
+    return code
+
+
+class EventStream:
+    """Открытый поток SSE от сервиса.
+
+    Байты передаются клиенту без разбора по мере поступления: следующий
+    фрагмент читается только после отправки предыдущего, поэтому медленный
+    клиент замедляет чтение из сервиса, а не накапливает буфер в шлюзе.
+    Таймаут чтения равен таймауту простоя: сервис, молчащий дольше, отключается.
+    """
+
+    def __init__(self, tracker: StreamTracker, response: httpx.Response, connection: StreamConnection):
+        self._tracker = tracker
+        self.response = response
+        self.connection = connection
+        # Пока поток не завершился сам, закрытие означает отключение клиента
+        self._reason = "client"
+        self._closed = False
+
+    @property
+    def status_code(self) -> int:
+        return self.response.status_code
+
+    @property
+    def is_event_stream(self) -> bool:
+        content_type = self.response.headers.get("content-type", "")
+        return self.response.is_success and content_type.startswith("text/event-stream")
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self.response.aiter_raw():
+                # Событие SSE заканчивается пустой строкой
+                self.connection.record(TO_CLIENT, len(chunk), messages=chunk.count(b"\n\n"))
+                yield chunk
+            self._reason = "upstream"
+        except httpx.ReadTimeout:
+            self._reason = "idle"
+        except httpx.HTTPError:
+            self._reason = "error"
+
+    async def read_rejected(self) -> bytes:
+        """Тело ответа сервиса, отказавшего в потоке (например, 404)"""
+        self._reason = "rejected"
+        try:
+            return await self.response.aread()
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self.response.aclose()
+        finally:
+            self._tracker.close(self.connection, self._reason)
+
+
+class StreamProxy:
+    """Потоковые соединения шлюза с сервисами.
+
+    Потоки живут долго, поэтому не занимают слоты пулов UpstreamPool: SSE
+    идет через отдельный клиент httpx, WebSocket - через websockets. От пула
+    сервиса используются выбор экземпляра и выключатель: открытие потока
+    учитывается как вызов сервиса, а сам поток - нет.
+    """
+
+    def __init__(self, settings: StreamSettings):
+        self.settings = settings
+        self.tracker = StreamTracker(settings.max_connections)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._loop is loop:
+            return self._client
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.settings.idle_timeout, connect=self.settings.connect_timeout),
+            limits=httpx.Limits(max_connections=self.settings.max_connections),
+        )
+        self._loop = loop
+        return self._client
+
+    async def _handshake(self, pool: UpstreamPool, connect: Callable[[str], Awaitable[Tuple[Any, bool]]]) -> Any:
+        """Открытие потока к экземпляру сервиса с учетом в выключателе и балансировщике.
+
+        connect(base_url) возвращает поток и признак ошибки сервиса (ответ 5xx).
+        """
+        probe = pool.breaker.before_call()
+        instance = pool.balancer.pick()
+        started = time.perf_counter()
+        try:
+            result, failed = await connect(instance.url)
+        except BaseException as e:
+            if _handshake_failed(e):
+                pool.breaker.record(probe, failed=True, latency=time.perf_counter() - started)
+                pool.balancer.record(instance, failed=True, latency=None)
+            else:
+                pool.breaker.cancel(probe)
+            raise
+        latency = time.perf_counter() - started
+        pool.breaker.record(probe, failed=failed, latency=latency)
+        pool.balancer.record(instance, failed=failed, latency=latency)
+        return result
+
+    async def open_event_stream(
+        self,
+        pool: UpstreamPool,
+        route: str,
+        path: str,
+        headers: Dict[str, str],
+        user_id: Optional[str],
+    ) -> EventStream:
+        """Открытие потока SSE; StreamLimitExceeded, CircuitOpenError и ошибки httpx - вызывающему"""
+        connection = self.tracker.open(SSE, pool.name, route, user_id)
+        client = self._ensure_client()
+
+        async def connect(base_url: str) -> Tuple[httpx.Response, bool]:
+            request = client.build_request("GET", base_url + path, headers={**headers, "Accept": "text/event-stream"})
+            response = await client.send(request, stream=True)
+            return response, response.status_code >= 500
+
+        try:
+            response = await self._handshake(pool, connect)
+        except BaseException:
+            self.tracker.close(connection, "rejected")
+            raise
+        return EventStream(self.tracker, response, connection)
+
+    async def proxy_websocket(
+        self,
+        websocket: WebSocket,
+        pool: UpstreamPool,
+        route: str,
+        path: str,
+        headers: Dict[str, str],
+        user_id: Optional[str],
+        subprotocols: Sequence[str] = (),
+    ) -> None:
+        """Соединение клиента с WebSocket сервиса до закрытия одной из сторон или простоя.
+
+        Сообщения пересылаются по одному в каждую сторону: следующее читается
+        только после отправки предыдущего, а очередь принятых от сервиса
+        сообщений ограничена queue_size, поэтому медленная сторона замедляет
+        быструю через управление потоком TCP вместо роста памяти шлюза.
+        """
+        if websockets is None:
+            logger.error("stream_open_failed", kind=WEBSOCKET, upstream=pool.name, path=path, error="websockets is not installed")
+            await websocket.close(code=WS_INTERNAL_ERROR)
+            return
+        try:
+            connection = self.tracker.open(WEBSOCKET, pool.name, route, user_id)
+        except StreamLimitExceeded:
+            await websocket.accept()
+            await websocket.close(code=WS_TRY_AGAIN_LATER, reason="Too many streams")
+            return
+
+        async def connect(base_url: str) -> Tuple[Any, bool]:
+            upstream = await websockets.connect(
+                _websocket_url(base_url, path),
+                extra_headers=headers,
+                subprotocols=list(subprotocols) or None,
+                open_timeout=self.settings.connect_timeout,
+                close_timeout=self.settings.connect_timeout,
+                max_size=self.settings.max_message_bytes,
+                max_queue=self.settings.queue_size,
+            )
+            return upstream, False
+
+        try:
+            upstream = await self._handshake(pool, connect)
+        except Exception as e:
+            logger.warning("stream_open_failed", kind=WEBSOCKET, upstream=pool.name, path=path, error=repr(e))
+            self.tracker.close(connection, "rejected")
+            await websocket.accept()
+            await websocket.close(code=WS_TRY_AGAIN_LATER, reason=f"Service {pool.name} unavailable")
+            return
+
+        await websocket.accept(subprotocol=upstream.subprotocol)
+        reason = "error"
+        client_code = WS_INTERNAL_ERROR
+        tasks: List[asyncio.Task] = []
+        try:
+            tasks = [
+                asyncio.create_task(self._client_to_upstream(websocket, upstream, connection)),
+                asyncio.create_task(self._upstream_to_client(websocket, upstream, connection)),
+                asyncio.create_task(self._watch_idle(connection)),
+            ]
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            reason = next(iter(done)).result()
+            if reason == "upstream":
+                client_code = _client_close_code(upstream.close_code)
+            elif reason == "idle":
+                client_code = WS_GOING_AWAY
+            elif reason == "too_big":
+                reason, client_code = "error", WS_MESSAGE_TOO_BIG
+        except Exception as e:
+            logger.error("stream_failed", kind=WEBSOCKET, upstream=pool.name, path=path, error=repr(e))
+        finally:
+            # Соединение снимается с учета и при отмене задачи во время закрытия
+            try:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await upstream.close(code=WS_GOING_AWAY if reason == "idle" else WS_NORMAL)
+                if reason != "client" and websocket.application_state == WebSocketState.CONNECTED:
+                    try:
+                        await websocket.close(code=client_code)
+                    except Exception:
+                        pass
+            finally:
+                self.tracker.close(connection, reason)
+
+    async def _client_to_upstream(self, websocket: WebSocket, upstream: Any, connection: StreamConnection) -> str:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return "client"
+            data = message.get("text") if message.get("text") is not None else message.get("bytes")
+            size = len(data) if isinstance(data, bytes) else len(data.encode())
+            if size > self.settings.max_message_bytes:
+                return "too_big"
+            connection.record(TO_UPSTREAM, size)
+            try:
+                await upstream.send(data)
+            except websockets.exceptions.ConnectionClosed:
+                return "upstream"
+
+    async def _upstream_to_client(self, websocket: WebSocket, upstream: Any, connection: StreamConnection) -> str:
+        try:
+            async for data in upstream:
+                connection.record(TO_CLIENT, len(data) if isinstance(data, bytes) else len(data.encode()))
+                if isinstance(data, bytes):
+                    await websocket.send_bytes(data)
+                else:
+                    await websocket.send_text(data)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except WebSocketDisconnect:
+            return "client"
+        return "upstream"
+
+    async def _watch_idle(self, connection: StreamConnection) -> str:
+        while True:
+            remaining = self.settings.idle_timeout - connection.idle_for()
+            if remaining <= 0:
+                return "idle"
+            await asyncio.sleep(remaining)
+
+    def stats(self) -> dict:
+        return self.tracker.stats()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
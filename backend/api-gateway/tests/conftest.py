@@ -14,6 +14,16 @@ import sys
 # Добавляем путь к модулям
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+@pytest.fixture(autouse=True)
+def reset_rate_limiter():
+    """Сброс бюджетов ограничения частоты между тестами"""
+    import asyncio
+    from main import rate_limiter
+
+    asyncio.run(rate_limiter.clear())
+    yield
+    asyncio.run(rate_limiter.clear())
+
 @pytest.fixture
 def client():
     """Фикстура для тестового клиента FastAPI"""
@@ -46,3 +56,80 @@ def test_user_data():
         "email": "test@example.com",
         "password": "testpassword123"
     }
+
+@pytest.fixture
+def make_token():
+    """Фикстура-фабрика валидных JWT токенов"""
+    import jwt
+    from datetime import datetime, timedelta
+    from main import JWT_SECRET, JWT_ALGORITHM
+
+    def _make_token(role: str = "patient", user_id: str = "test-user", ttl_seconds: int = 3600) -> str:
+        payload = {
+            "user_id": user_id,
+            "email": f"{user_id}@example.com",
+            "role": role,
+            "exp": datetime.now() + timedelta(seconds=ttl_seconds),
+        }
+        return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+    return _make_token
+
+@pytest.fixture
+def admin_headers(make_token):
+    """Фикстура для заголовков авторизации администратора"""
+    return {"Authorization": f"Bearer {make_token('admin', 'admin-user')}"}
+
+@pytest.fixture
+def patient_headers(make_token):
+    """Фикстура для заголовков авторизации пациента"""
+    return {"Authorization": f"Bearer {make_token('patient', 'patient-user')}"}
+
+@pytest.fixture
+def mock_upstream(monkeypatch):
+    """Фикстура подмены транспорта пулов: ответы сервисов формирует функция-обработчик"""
+    import asyncio
+    import inspect
+    import upstream
+    from main import response_cache, upstreams
+
+    class _AsyncBody(httpx.AsyncByteStream):
+        """Непрочитанное тело ответа, как у реального сетевого транспорта"""
+
+        def __init__(self, content: bytes):
+            self._content = content
+
+        async def __aiter__(self):
+            yield self._content
+
+    def _install(handler):
+        async def _streaming_handler(request: httpx.Request) -> httpx.Response:
+            response = handler(request)
+            if inspect.isawaitable(response):
+                response = await response
+            return httpx.Response(
+                response.status_code,
+                headers=response.headers,
+                stream=_AsyncBody(b"".join(response.stream)),
+            )
+
+        monkeypatch.setattr(
+            upstream.httpx,
+            "AsyncHTTPTransport",
+            lambda **kwargs: httpx.MockTransport(_streaming_handler),
+        )
+        for pool in upstreams._pools.values():
+            pool._client = None
+            pool._loop = None
+            pool.breaker.reset()
+            pool.reset_hedging()
+        asyncio.run(response_cache.clear())
+
+    yield _install
+
+    for pool in upstreams._pools.values():
+        pool._client = None
+        pool._loop = None
+        pool.breaker.reset()
+        pool.reset_hedging()
+    asyncio.run(response_cache.clear())
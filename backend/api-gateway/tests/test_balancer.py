@@ -0,0 +1,135 @@
+"""
+@file: test_balancer.py
+@description: Тесты балансировки запросов API Gateway между экземплярами сервиса
+@dependencies: pytest, httpx, balancer.py, upstream.py
+@created: 2026-10-18
+"""
+import asyncio
+import random
+
+import httpx
+
+import upstream
+from balancer import LEAST_OUTSTANDING, Balancer, BalancerSettings
+from upstream import UpstreamPool, UpstreamRegistry, load_pool_settings, parse_instances
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def _balancer(urls, clock=None, **overrides) -> Balancer:
+    settings = BalancerSettings(**{"eject_failures": 2, "eject_seconds": 10, **overrides})
+    return Balancer("booking", urls, settings, clock=clock or _Clock(), rng=random.Random(1))
+
+def test_parse_instances():
+    """Тест списка экземпляров из строки через запятую"""
+    assert parse_instances("http://a:1/, http://b:2") == ["http://a:1", "http://b:2"]
+    assert parse_instances(["http://a"]) == ["http://a"]
+
+def test_p2c_prefers_less_loaded_and_faster():
+    """Тест выбора экземпляра с меньшей загрузкой и задержкой"""
+    balancer = _balancer(["http://a", "http://b"])
+    first, second = balancer.instances
+    first.outstanding = 5
+    assert all(balancer.pick() is second for _ in range(10))
+
+    first.outstanding = second.outstanding = 0
+    first.latency, second.latency = 0.01, 0.2
+    assert all(balancer.pick() is first for _ in range(10))
+
+def test_least_outstanding_scans_all_instances():
+    """Тест стратегии least_outstanding: выбирается лучший из всех экземпляров"""
+    balancer = _balancer(["http://a", "http://b", "http://c"], strategy=LEAST_OUTSTANDING)
+    for instance, outstanding in zip(balancer.instances, (3, 0, 2)):
+        instance.outstanding = outstanding
+    assert balancer.pick().url == "http://b"
+
+def test_failing_instance_is_ejected_and_returns():
+    """Тест пассивного исключения экземпляра после ошибок подряд и его возврата"""
+    clock = _Clock()
+    balancer = _balancer(["http://a", "http://b"], clock=clock)
+    bad, good = balancer.instances
+    for _ in range(2):
+        balancer.record(bad, failed=True, latency=None)
+
+    bad.latency, good.latency = 0.001, 1.0
+    assert all(balancer.pick() is good for _ in range(10))
+    assert balancer.pick(avoid=good) is bad
+
+    clock.now += 11
+    assert balancer.pick() is bad
+
+def test_all_unhealthy_falls_back_to_all_instances():
+    """Тест: если все экземпляры нездоровы, трафик не останавливается"""
+    balancer = _balancer(["http://a", "http://b"], unhealthy_threshold=1)
+    for instance in balancer.instances:
+        balancer.record_health(instance, ok=False, latency=0.0)
+
+    assert not any(instance.healthy for instance in balancer.instances)
+    assert balancer.pick() in balancer.instances
+
+def test_health_state_changes_after_threshold():
+    """Тест смены состояния здоровья только после серии одинаковых проверок"""
+    balancer = _balancer(["http://a", "http://b"], unhealthy_threshold=2, healthy_threshold=2)
+    instance = balancer.instances[0]
+
+    balancer.record_health(instance, ok=False, latency=0.0)
+    assert instance.healthy
+    balancer.record_health(instance, ok=False, latency=0.0)
+    assert not instance.healthy
+
+    balancer.record_health(instance, ok=True, latency=0.05)
+    balancer.record_health(instance, ok=True, latency=0.05)
+    assert instance.healthy and instance.latency is not None
+
+def test_retry_goes_to_another_instance(monkeypatch):
+    """Тест повтора GET на другом экземпляре после ошибки соединения"""
+    hosts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hosts.append(request.url.host)
+        if request.url.host == "down":
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, json={"host": request.url.host})
+
+    monkeypatch.setattr(upstream.httpx, "AsyncHTTPTransport", lambda **kwargs: httpx.MockTransport(handler))
+    pool = UpstreamPool("booking", "http://down:8003,http://up:8003", load_pool_settings("booking"))
+    down, up = pool.balancer.instances
+    down.latency, up.latency = 0.001, 1.0
+
+    async def scenario():
+        response = await pool.request("GET", "/bookings")
+        await pool.aclose()
+        return response
+
+    response = asyncio.run(scenario())
+    assert response.json() == {"host": "up"}
+    assert hosts == ["down", "up"]
+    assert down.outstanding == 0 and up.outstanding == 0
+    assert [instance["failures"] for instance in pool.stats()["instances"]] == [1, 0]
+
+def test_registry_runs_health_checks_for_multi_instance_services(monkeypatch):
+    """Тест проверок /health: запускаются для сервиса из нескольких экземпляров и останавливаются при закрытии"""
+    checked = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        checked.append(str(request.url))
+        return httpx.Response(503 if request.url.host == "b" else 200)
+
+    monkeypatch.setattr(upstream.httpx, "AsyncHTTPTransport", lambda **kwargs: httpx.MockTransport(handler))
+    monkeypatch.setenv("UPSTREAM_HEALTH_CHECK_INTERVAL_SECONDS", "0.01")
+    monkeypatch.setenv("UPSTREAM_UNHEALTHY_THRESHOLD", "1")
+    registry = UpstreamRegistry({"booking": "http://a,http://b", "geo": "http://c"})
+
+    async def scenario():
+        await registry.start()
+        await asyncio.sleep(0.05)
+        await registry.close()
+
+    asyncio.run(scenario())
+    assert "http://a/health" in checked and "http://b/health" in checked
+    assert "http://c/health" not in checked
+    assert [instance["healthy"] for instance in registry.stats()["booking"]["instances"]] == [True, False]
@@ -0,0 +1,58 @@
+"""
+@file: test_batch.py
+@description: Тесты пакетного эндпоинта POST /batch API Gateway
+@dependencies: pytest, httpx, fastapi
+@created: 2026-10-18
+"""
+import httpx
+from fastapi.testclient import TestClient
+
+def _handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/auth/me":
+        return httpx.Response(200, json={"id": "patient-user"})
+    if request.url.path.startswith("/wallets/"):
+        return httpx.Response(200, json={"balance": 100})
+    if request.url.path == "/geo/doctors/nearby":
+        return httpx.Response(200, json={"query": str(request.url.query, "ascii")})
+    if request.url.path == "/notifications":
+        return httpx.Response(500, content=b"boom", headers={"content-type": "text/plain"})
+    return httpx.Response(404, json={"detail": "Not Found"})
+
+def test_batch_runs_sub_requests(client: TestClient, mock_upstream, patient_headers):
+    """Тест выполнения подзапросов с отдельными кодами ответа в исходном порядке"""
+    mock_upstream(_handler)
+    response = client.post("/batch", headers=patient_headers, json={"requests": [
+        {"id": "me", "path": "/auth/me"},
+        {"id": "wallet", "path": "/wallets/me"},
+        {"id": "nearby", "path": "/geo/doctors/nearby?lat=55.7&lon=37.6"},
+        {"id": "notifications", "path": "/notifications"},
+    ]})
+
+    assert response.status_code == 200
+    results = response.json()["responses"]
+    assert [item["id"] for item in results] == ["me", "wallet", "nearby", "notifications"]
+    assert results[0]["status"] == 200 and results[0]["body"] == {"id": "patient-user"}
+    assert results[1]["body"] == {"balance": 100}
+    assert results[2]["body"] == {"query": "lat=55.7&lon=37.6&radius=5.0"}
+    assert results[3]["status"] == 500 and results[3]["body"] == "boom"
+
+def test_batch_reports_errors_per_sub_request(client: TestClient, mock_upstream, patient_headers):
+    """Тест ошибок отдельных подзапросов: неизвестный путь, чужая роль, некорректное тело"""
+    mock_upstream(_handler)
+    response = client.post("/batch", headers=patient_headers, json={"requests": [
+        {"id": "unknown", "path": "/no/such/path"},
+        {"id": "admin", "path": "/api/users"},
+        {"id": "bad-body", "method": "POST", "path": "/bookings", "body": [1, 2]},
+        {"id": "bad-query", "path": "/geo/doctors/nearby?lat=1"},
+    ]})
+
+    statuses = {item["id"]: item["status"] for item in response.json()["responses"]}
+    assert statuses == {"unknown": 404, "admin": 403, "bad-body": 422, "bad-query": 422}
+
+def test_batch_requires_auth_and_limits_size(client: TestClient, patient_headers):
+    """Тест обязательной аутентификации и ограничения размера пакета"""
+    from main import BATCH_MAX_REQUESTS
+
+    assert client.post("/batch", json={"requests": [{"path": "/auth/me"}]}).status_code in [401, 403]
+    too_many = {"requests": [{"path": "/auth/me"}] * (BATCH_MAX_REQUESTS + 1)}
+    assert client.post("/batch", headers=patient_headers, json=too_many).status_code == 422
@@ -0,0 +1,60 @@
+"""
+@file: test_benchmarks.py
+@description: Тесты инструментов нагрузочного теста: заглушки сервисов, генератор нагрузки, сравнение результатов
+@dependencies: pytest, httpx, benchmarks/
+@created: 2026-10-18
+"""
+import asyncio
+
+import httpx
+
+from benchmarks.loadgen import SCENARIOS, ScenarioResult, compare, percentile, run_scenario, summarize
+from benchmarks.stubs import StubServer, StubSpec
+
+def _free_port() -> int:
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_percentile_nearest_rank():
+    """Тест перцентиля по ближайшему рангу"""
+    values = [i / 100 for i in range(1, 101)]
+    assert percentile(values, 0.5) == 0.5
+    assert percentile(values, 0.99) == 0.99
+    assert percentile([], 0.95) == 0.0
+
+def test_stub_and_load_generator():
+    """Тест заглушки сервиса (задержка, размер ответа, keep-alive) под генератором нагрузки"""
+    server = StubServer("booking", StubSpec(port=_free_port(), latency_ms=10, payload_bytes=4096))
+
+    async def scenario():
+        await server.start()
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{server.spec.port}") as client:
+                body = (await client.get("/bookings")).content
+                result = await run_scenario(client, SCENARIOS["proxy"], {"patient": "token"}, concurrency=4, duration=0.3)
+        finally:
+            await server.close()
+        return body, result
+
+    body, result = asyncio.run(scenario())
+    summary = summarize(result)
+
+    assert 3500 <= len(body) <= 4200
+    assert summary["errors"] == 0 and summary["requests"] > 0
+    assert summary["p50_ms"] >= 10
+    assert summary["statuses"] == {"200": summary["requests"]}
+
+def test_compare_reports_regressions():
+    """Тест сравнения с базой: падение RPS и рост p95 сверх допуска"""
+    baseline = {"scenarios": {"proxy": {"rps": 1000.0, "p95_ms": 10.0, "p99_ms": 20.0}}}
+    current = {"scenarios": {
+        "proxy": {"rps": 850.0, "p95_ms": 10.5, "p99_ms": 25.0},
+        "aggregate": {"rps": 10.0, "p95_ms": 1.0, "p99_ms": 1.0},
+    }}
+
+    regressions = compare(baseline, current, max_regression=0.1)
+    assert regressions == ["proxy: rps 1000.0 -> 850.0", "proxy: p99_ms 20.0 -> 25.0"]
+    assert summarize(ScenarioResult("empty"))["rps"] == 0.0
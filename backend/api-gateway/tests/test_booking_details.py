@@ -0,0 +1,138 @@
+"""
+@file: test_booking_details.py
+@description: Тесты агрегации карточки заказа в API Gateway (заказ, врач, местоположение, платежи, участники)
+@dependencies: pytest, httpx, fastapi, aggregation.py
+@created: 2026-10-18
+"""
+import asyncio
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+from aggregation import BatchLoader, fan_out
+
+BOOKING = {"id": "b-1", "patient_id": "test-user", "doctor_id": "d-1", "status": "assigned"}
+DOCTOR = {"user_id": "d-1", "specialization": "Терапевт"}
+LOCATION = {"user_id": "d-1", "latitude": 55.75, "longitude": 37.61}
+PAYMENTS = [{"id": 1, "booking_id": "b-1", "amount": 2500.0, "status": "completed"}]
+USERS = {
+    "test-user": {"id": "test-user", "first_name": "Иван", "last_name": "Петров", "role": "patient"},
+    "d-1": {"id": "d-1", "first_name": "Анна", "last_name": "Смирнова", "role": "doctor"},
+}
+
+def details_handler(calls: list, booking: dict = BOOKING, failing_path: str = "", slow_path: str = ""):
+    responses = {
+        "/bookings/b-1": booking,
+        "/doctor-profiles/d-1": DOCTOR,
+        "/geo/doctors/d-1/location": LOCATION,
+        "/payments/booking/b-1": PAYMENTS,
+    }
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path == slow_path:
+            await asyncio.sleep(1)
+        if request.url.path == failing_path:
+            return httpx.Response(500, json={"detail": "boom"})
+        if request.url.path == "/users/batch":
+            ids = json.loads(request.content)["ids"]
+            return httpx.Response(200, json={"users": {user_id: USERS[user_id] for user_id in ids if user_id in USERS}})
+        if request.url.path not in responses:
+            return httpx.Response(404, json={"detail": "Booking not found"})
+        return httpx.Response(200, json=responses[request.url.path])
+    return handler
+
+def test_fan_out_per_call_timeouts():
+    """Тест дедлайна, заданного отдельно для каждого вызова"""
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    results, failures = asyncio.run(fan_out({"patient": slow, "impatient": slow}, timeout={"patient": 1, "impatient": 0.01}))
+    assert results == {"patient": "done"}
+    assert failures == {"impatient": "timeout"}
+
+def test_batch_loader_coalesces_keys():
+    """Тест: ключи, запрошенные параллельно, загружаются одним вызовом; повторный ключ - из памяти"""
+    batches = []
+
+    async def fetch_many(keys):
+        batches.append(keys)
+        return {key: key.upper() for key in keys if key != "missing"}
+
+    async def run():
+        loader = BatchLoader(fetch_many)
+        first, second, many = await asyncio.gather(loader.load("a"), loader.load("b"), loader.load_many(["b", "c", "missing"]))
+        again = await loader.load("a")
+        return first, second, many, again
+
+    first, second, many, again = asyncio.run(run())
+    assert (first, second, again) == ("A", "B", "A")
+    assert many == {"b": "B", "c": "C"}
+    assert batches == [["a", "b", "c", "missing"]]
+
+def test_booking_details_merges_all_parts(client: TestClient, mock_upstream, patient_headers):
+    """Тест сборки карточки заказа из пяти сервисов; участники - одним пакетным запросом"""
+    calls = []
+    mock_upstream(details_handler(calls))
+    response = client.get("/api/bookings/b-1/details", headers=patient_headers)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "booking": BOOKING,
+        "doctor": DOCTOR,
+        "doctor_location": LOCATION,
+        "payments": PAYMENTS,
+        "users": USERS,
+        "missing": [],
+    }
+    assert calls[0] == "/bookings/b-1"
+    assert sorted(calls[1:]) == ["/doctor-profiles/d-1", "/geo/doctors/d-1/location", "/payments/booking/b-1", "/users/batch"]
+
+def test_booking_details_forwards_user_to_payments(client: TestClient, mock_upstream, patient_headers):
+    """Тест: платежи заказа запрашиваются с контекстом пользователя (Payment Service фильтрует по нему)"""
+    forwarded = {}
+    handler = details_handler([])
+
+    async def recording_handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/payments/booking/b-1":
+            forwarded.update(user_id=request.headers.get("x-user-id"), role=request.headers.get("x-user-role"))
+        return await handler(request)
+
+    mock_upstream(recording_handler)
+    assert client.get("/api/bookings/b-1/details", headers=patient_headers).status_code == 200
+    assert forwarded == {"user_id": "patient-user", "role": "patient"}
+
+def test_booking_details_omits_failed_and_slow_parts(client: TestClient, mock_upstream, patient_headers, monkeypatch):
+    """Тест: упавшая и не уложившаяся в дедлайн части не попадают в ответ"""
+    import main
+    monkeypatch.setitem(main.BOOKING_DETAILS_TIMEOUTS, "doctor_location", 0.05)
+    mock_upstream(details_handler([], failing_path="/payments/booking/b-1", slow_path="/geo/doctors/d-1/location"))
+    response = client.get("/api/bookings/b-1/details", headers=patient_headers)
+
+    data = response.json()
+    assert response.status_code == 200
+    assert data["doctor"] == DOCTOR
+    assert "doctor_location" not in data and "payments" not in data
+    assert data["missing"] == ["doctor_location", "payments"]
+
+def test_booking_details_without_doctor(client: TestClient, mock_upstream, patient_headers):
+    """Тест заказа без назначенного врача: профиль и местоположение не запрашиваются"""
+    calls = []
+    mock_upstream(details_handler(calls, booking={**BOOKING, "doctor_id": None}))
+    data = client.get("/api/bookings/b-1/details", headers=patient_headers).json()
+
+    assert sorted(calls) == ["/bookings/b-1", "/payments/booking/b-1", "/users/batch"]
+    assert data["users"] == {"test-user": USERS["test-user"]}
+    assert data["payments"] == PAYMENTS and data["missing"] == []
+
+def test_booking_details_passes_booking_error(client: TestClient, mock_upstream, patient_headers):
+    """Тест: ошибка Booking Service (нет заказа или доступа) возвращается без запросов к остальным"""
+    calls = []
+    mock_upstream(details_handler(calls))
+    response = client.get("/api/bookings/unknown/details", headers=patient_headers)
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Booking not found"}
+    assert calls == ["/bookings/unknown"]
@@ -0,0 +1,101 @@
+"""
+@file: test_breaker.py
+@description: Тесты выключателей запросов API Gateway к сервисам
+@dependencies: pytest, httpx, fastapi, breaker.py
+@created: 2026-10-18
+"""
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from breaker import CLOSED, HALF_OPEN, OPEN, BreakerSettings, CircuitBreaker, CircuitOpenError
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def _breaker(clock, **overrides) -> CircuitBreaker:
+    settings = BreakerSettings(**{"min_calls": 4, "open_seconds": 10, "half_open_calls": 2, **overrides})
+    return CircuitBreaker("geo", settings, clock=clock)
+
+def test_opens_on_error_rate_and_fails_fast():
+    """Тест размыкания по доле ошибок и быстрого отказа"""
+    clock = _Clock()
+    breaker = _breaker(clock)
+    for failed in (False, True, True, True):
+        breaker.record(breaker.before_call(), failed=failed, latency=0.01)
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == pytest.approx(10)
+    assert breaker.stats()["rejected_total"] == 1
+
+def test_opens_on_slow_calls():
+    """Тест размыкания по доле медленных вызовов"""
+    clock = _Clock()
+    breaker = _breaker(clock, slow_call_seconds=1.0, slow_call_rate=0.5)
+    for latency in (0.1, 0.1, 2.0, 2.0):
+        breaker.record(breaker.before_call(), failed=False, latency=latency)
+
+    assert breaker.state == OPEN
+
+def test_old_calls_leave_window():
+    """Тест вытеснения старых вызовов из скользящего окна"""
+    clock = _Clock()
+    breaker = _breaker(clock, window_seconds=5)
+    for _ in range(3):
+        breaker.record(breaker.before_call(), failed=True, latency=0.01)
+    clock.now += 10
+    breaker.record(breaker.before_call(), failed=True, latency=0.01)
+
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 1
+
+def test_half_open_probes_close_or_reopen():
+    """Тест пробных вызовов: успех замыкает, неудача снова размыкает"""
+    clock = _Clock()
+    breaker = _breaker(clock)
+    for _ in range(4):
+        breaker.record(breaker.before_call(), failed=True, latency=0.01)
+    clock.now += 11
+
+    first = breaker.before_call()
+    second = breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record(first, failed=True, latency=0.01)
+    breaker.record(second, failed=False, latency=0.01)
+    assert breaker.state == OPEN
+
+    clock.now += 11
+    for probe in (breaker.before_call(), breaker.before_call()):
+        breaker.record(probe, failed=False, latency=0.01)
+    assert breaker.state == CLOSED
+
+def test_gateway_fails_fast_when_open(client: TestClient, mock_upstream, admin_headers, patient_headers):
+    """Тест 503 с Retry-After без обращения к сервису при разомкнутом выключателе"""
+    from main import upstreams
+
+    calls = []
+    mock_upstream(lambda request: calls.append(request) or httpx.Response(502))
+    min_calls = upstreams.get("notification").breaker.settings.min_calls
+    for _ in range(min_calls):
+        assert client.get("/notifications", headers=patient_headers).status_code == 502
+
+    response = client.get("/notifications", headers=patient_headers)
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) >= 1
+    assert len(calls) == min_calls
+
+    breakers = client.get("/admin/breakers", headers=admin_headers).json()["breakers"]
+    assert breakers["notification"]["state"] == OPEN
+    assert breakers["geo"]["state"] == CLOSED
+
+    reset = client.post("/admin/breakers/notification/reset", headers=admin_headers)
+    assert reset.json()["state"] == CLOSED
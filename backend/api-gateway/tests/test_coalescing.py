@@ -0,0 +1,100 @@
+"""
+@file: test_coalescing.py
+@description: Тесты объединения одинаковых одновременных запросов (single-flight)
+@dependencies: pytest, httpx, coalescing.py
+@created: 2026-10-18
+"""
+import asyncio
+import httpx
+
+from coalescing import BufferedResponse, SingleFlight
+
+class FakeStream:
+    """Заглушка потокового ответа сервиса"""
+
+    def __init__(self, body: bytes):
+        self.status_code = 200
+        self.headers = httpx.Headers({"content-type": "application/json"})
+        self._body = body
+
+    async def __aiter__(self):
+        yield self._body
+
+def test_concurrent_calls_collapsed():
+    """Тест: одинаковые одновременные вызовы выполняются один раз"""
+    flights = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*(flights.do("key", call) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["result"] * 5
+    assert len(calls) == 1
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "collapsed": 4}
+
+def test_different_keys_not_collapsed():
+    """Тест: запросы с разным ключом (например, разные пользователи) не объединяются"""
+    flights = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def scenario():
+        await asyncio.gather(flights.do("user-1", call), flights.do("user-2", call))
+
+    asyncio.run(scenario())
+    assert flights.stats()["collapsed"] == 0
+
+def test_leader_error_shared_with_followers():
+    """Тест: ошибка ведущего запроса передается ведомым"""
+    flights = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise httpx.ConnectError("refused")
+
+    async def scenario():
+        return await asyncio.gather(*(flights.do("key", call) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, httpx.ConnectError) for result in results)
+
+def test_single_stream_not_buffered():
+    """Тест: без ведомых ведущий получает поток без буферизации"""
+    flights = SingleFlight()
+    stream = FakeStream(b"[]")
+
+    async def open_stream():
+        return stream
+
+    assert asyncio.run(flights.do_stream("key", open_stream)) is stream
+
+def test_collapsed_stream_body_shared():
+    """Тест: при объединении тело читается один раз и отдается всем участникам"""
+    flights = SingleFlight()
+    opened = []
+
+    async def open_stream():
+        opened.append(1)
+        await asyncio.sleep(0.05)
+        return FakeStream(b'{"doctors": []}')
+
+    async def scenario():
+        return await asyncio.gather(*(flights.do_stream("key", open_stream) for _ in range(3)))
+
+    results = asyncio.run(scenario())
+    assert len(opened) == 1
+    assert all(isinstance(result, BufferedResponse) for result in results)
+    assert {result.body for result in results} == {b'{"doctors": []}'}
+
+def test_coalescing_stats_endpoint(client, admin_headers):
+    """Тест эндпоинта статистики объединения запросов"""
+    response = client.get("/admin/coalescing", headers=admin_headers)
+    assert response.status_code == 200
+    assert set(response.json()) == {"in_flight", "leaders", "collapsed"}
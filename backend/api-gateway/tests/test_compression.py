@@ -0,0 +1,96 @@
+"""
+@file: test_compression.py
+@description: Тесты сжатия ответов API Gateway и сжатых форм в кэше ответов
+@dependencies: pytest, httpx, fastapi, compression.py
+@created: 2026-10-18
+"""
+import asyncio
+import gzip
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+import compression
+from compression import negotiate, supported_encodings
+from response_cache import CachedResponse
+
+LARGE_BODY = json.dumps([{"id": i, "name": f"Клиника {i}"} for i in range(300)]).encode()
+
+def _json_response(body: bytes):
+    return lambda request: httpx.Response(200, content=body, headers={"content-type": "application/json"})
+
+def test_negotiate_respects_q_values():
+    """Тест выбора кодировки по Accept-Encoding"""
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("gzip;q=0, identity") is None
+    assert negotiate("*") == supported_encodings()[0]
+    assert negotiate(None) is None
+
+def test_large_response_compressed(client: TestClient, mock_upstream, patient_headers):
+    """Тест сжатия большого потокового ответа"""
+    mock_upstream(_json_response(LARGE_BODY))
+    response = client.get("/notifications", headers={**patient_headers, "Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers.get("content-length", 0)) < len(LARGE_BODY) or "content-length" not in response.headers
+    assert response.content == LARGE_BODY
+
+def test_small_and_precompressed_responses_untouched(client: TestClient, mock_upstream, patient_headers):
+    """Тест: ответы меньше порога и уже сжатые сервисом передаются как есть"""
+    mock_upstream(_json_response(b'{"ok": true}'))
+    small = client.get("/notifications", headers={**patient_headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    packed = gzip.compress(LARGE_BODY)
+    mock_upstream(lambda request: httpx.Response(
+        200, content=packed, headers={"content-type": "application/json", "content-encoding": "gzip"}
+    ))
+    response = client.get("/notifications", headers={**patient_headers, "Accept-Encoding": "gzip"})
+    assert response.content == LARGE_BODY
+
+def test_large_chunks_compressed_off_loop(client: TestClient, mock_upstream, patient_headers, monkeypatch):
+    """Тест сжатия больших частей в пуле потоков"""
+    offloaded = []
+    original = asyncio.to_thread
+
+    async def spy(func, *args):
+        offloaded.append(len(args[0]))
+        return await original(func, *args)
+
+    monkeypatch.setattr(compression, "OFFLOAD_SIZE", 4096)
+    monkeypatch.setattr(compression.asyncio, "to_thread", spy)
+    mock_upstream(_json_response(LARGE_BODY))
+    response = client.get("/notifications", headers={**patient_headers, "Accept-Encoding": "gzip"})
+
+    assert response.content == LARGE_BODY
+    assert offloaded and offloaded[0] >= 4096
+
+def test_cache_hit_reuses_compressed_form(client: TestClient, mock_upstream, monkeypatch):
+    """Тест: попадание в кэш отдает сохраненную сжатую форму без повторного сжатия"""
+    mock_upstream(_json_response(LARGE_BODY))
+    first = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert first.headers["content-encoding"] == "gzip"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("compressed again")
+
+    monkeypatch.setattr(compression.Compressor, "compress", fail)
+    second = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert second.headers["content-encoding"] == "gzip"
+    assert second.content == LARGE_BODY
+    assert second.headers["etag"] == first.headers["etag"]
+
+    plain = client.get("/events", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.content == LARGE_BODY
+
+def test_cached_response_serializes_variants():
+    """Тест сериализации записи кэша со сжатыми формами"""
+    entry = CachedResponse(200, LARGE_BODY, 'W/"x"', {"content-type": "application/json"}, {"gzip": gzip.compress(LARGE_BODY)})
+    restored = CachedResponse.from_bytes(entry.to_bytes())
+
+    assert restored.body == LARGE_BODY
+    assert gzip.decompress(restored.variants["gzip"]) == LARGE_BODY
+    assert CachedResponse.from_bytes(CachedResponse(200, b"{}", 'W/"y"').to_bytes()).variants == {}
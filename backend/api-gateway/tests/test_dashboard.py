@@ -0,0 +1,100 @@
+"""
+@file: test_dashboard.py
+@description: Тесты параллельной агрегации статистики дашборда в API Gateway
+@dependencies: pytest, httpx, fastapi, aggregation.py
+@created: 2026-10-18
+"""
+import asyncio
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from aggregation import SnapshotCache, fan_out
+
+COUNTS = {
+    "/users/count": 10,
+    "/doctor-profiles/count": 4,
+    "/clinic-profiles/count": 2,
+}
+BOOKING_STATS = {"total": 9, "by_status": {"pending": 3, "assigned": 1, "in_progress": 2, "completed": 3}}
+
+@pytest.fixture(autouse=True)
+def reset_dashboard_snapshot():
+    """Сброс кэша снимка между тестами"""
+    from main import dashboard_snapshot
+    dashboard_snapshot.clear()
+    yield
+    dashboard_snapshot.clear()
+
+def stats_handler(calls: list, failing_path: str = ""):
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path == failing_path:
+            return httpx.Response(500, json={"detail": "boom"})
+        if request.url.path == "/bookings/stats":
+            return httpx.Response(200, json=BOOKING_STATS)
+        return httpx.Response(200, json={"count": COUNTS[request.url.path]})
+    return handler
+
+def test_fan_out_returns_partial_results():
+    """Тест: медленный вызов отсекается по дедлайну, остальные результаты сохраняются"""
+    async def fast():
+        return 1
+
+    async def slow():
+        await asyncio.sleep(1)
+        return 2
+
+    results, failures = asyncio.run(fan_out({"fast": fast, "slow": slow}, timeout=0.05))
+    assert results == {"fast": 1}
+    assert failures == {"slow": "timeout"}
+
+def test_snapshot_cache_ttl():
+    """Тест выдачи снимка только в пределах TTL"""
+    cache = SnapshotCache(ttl_seconds=0)
+    cache.set({"total_users": 1})
+    assert cache.get_fresh() is None
+    assert cache.last == {"total_users": 1}
+
+def test_dashboard_stats_aggregates_services(client: TestClient, mock_upstream, admin_headers):
+    """Тест сбора статистики со всех сервисов и счетчиков по статусам заказов"""
+    calls = []
+    mock_upstream(stats_handler(calls))
+    response = client.get("/api/dashboard/stats", headers=admin_headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_users"] == 10
+    assert data["total_doctors"] == 4
+    assert data["total_clinics"] == 2
+    assert data["total_appointments"] == 9
+    assert data["active_appointments"] == 3
+    assert data["pending_appointments"] == 3
+    assert data["completed_appointments"] == 3
+    assert data["stale"] == []
+
+def test_dashboard_stats_marks_failed_source_stale(client: TestClient, mock_upstream, admin_headers):
+    """Тест частичного результата: поля упавшего сервиса помечаются как устаревшие"""
+    mock_upstream(stats_handler([], failing_path="/bookings/stats"))
+    response = client.get("/api/dashboard/stats", headers=admin_headers)
+
+    data = response.json()
+    assert data["total_users"] == 10
+    assert data["total_appointments"] == 0
+    assert "total_appointments" in data["stale"]
+    assert "total_users" not in data["stale"]
+
+def test_dashboard_stats_served_from_snapshot(client: TestClient, mock_upstream, admin_headers):
+    """Тест повторного запроса: снимок отдается из кэша без обращения к сервисам"""
+    calls = []
+    mock_upstream(stats_handler(calls))
+    client.get("/api/dashboard/stats", headers=admin_headers)
+    client.get("/api/dashboard/stats", headers=admin_headers)
+
+    assert len(calls) == 4
+
+def test_dashboard_stats_requires_admin(client: TestClient, make_token):
+    """Тест доступа к статистике только для админа"""
+    headers = {"Authorization": f"Bearer {make_token('doctor')}"}
+    response = client.get("/api/dashboard/stats", headers=headers)
+    assert response.status_code == 403
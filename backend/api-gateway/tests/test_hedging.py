@@ -0,0 +1,139 @@
+"""
+@file: test_hedging.py
+@description: Тесты хеджирования и повторов GET-запросов API Gateway к сервисам
+@dependencies: pytest, httpx, fastapi, hedging.py
+@created: 2026-10-18
+"""
+import asyncio
+import time
+
+import httpx
+from fastapi.testclient import TestClient
+
+from hedging import LatencyWindow, RetryBudget
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_latency_window_percentile():
+    """Тест перцентиля по скользящему окну задержек"""
+    window = LatencyWindow(size=100)
+    assert window.percentile(0.95) is None
+    for latency in range(1, 201):
+        window.add(latency / 1000)
+
+    assert len(window) == 100
+    # В окне остались последние 100 замеров (101..200 мс); перцентиль пересчитывается
+    # раз в RECOMPUTE_EVERY замеров и может отставать на несколько последних
+    assert 0.18 <= window.percentile(0.95) <= 0.2
+
+def test_retry_budget_is_bounded():
+    """Тест бюджета: запас ограничен, пополнение - долей запросов и по времени"""
+    clock = _Clock()
+    budget = RetryBudget(ratio=0.5, min_per_second=1.0, max_tokens=2.0, clock=clock)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+    clock.now += 1
+    assert budget.withdraw()
+    assert budget.exhausted == 2
+
+def test_slow_upstream_is_hedged(client: TestClient, mock_upstream, patient_headers):
+    """Тест хеджа: медленный первый запрос, ответ второго уходит клиенту"""
+    from main import upstreams
+
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) == 1:
+            await asyncio.sleep(2)
+            return httpx.Response(200, json={"attempt": "first"})
+        return httpx.Response(200, json={"attempt": "second"})
+
+    mock_upstream(handler)
+    pool = upstreams.get("booking")
+    for _ in range(pool.hedge_settings.min_samples):
+        pool.latencies.add(0.01)
+
+    started = time.perf_counter()
+    response = client.get("/bookings", headers=patient_headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"attempt": "second"}
+    assert time.perf_counter() - started < 1.5
+    stats = pool.hedging_stats()
+    assert stats["hedges"] == 1 and stats["hedges_won"] == 1
+    assert pool.stats()["in_use"] == 0
+
+def test_route_without_hedge_waits(client: TestClient, mock_upstream, admin_headers):
+    """Тест маршрута без hedge=True: второй запрос не отправляется"""
+    from main import upstreams
+
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        await asyncio.sleep(0.1)
+        return httpx.Response(200, json=[])
+
+    mock_upstream(handler)
+    pool = upstreams.get("profile")
+    for _ in range(pool.hedge_settings.min_samples):
+        pool.latencies.add(0.01)
+
+    assert client.get("/api/doctors", headers=admin_headers).status_code == 200
+    assert len(calls) == 1
+    assert pool.hedging_stats()["hedges"] == 0
+
+def test_connect_error_is_retried(client: TestClient, mock_upstream, patient_headers):
+    """Тест повтора GET после ошибки соединения"""
+    from main import upstreams
+
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, json=[])
+
+    mock_upstream(handler)
+    assert client.get("/notifications", headers=patient_headers).status_code == 200
+    assert len(calls) == 2
+    assert upstreams.get("notification").hedging_stats()["retries"] == 1
+
+def test_retry_budget_limits_retries(client: TestClient, mock_upstream, patient_headers):
+    """Тест исчерпания бюджета: при отказе сервиса повторы прекращаются"""
+    from main import upstreams
+
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    mock_upstream(handler)
+    pool = upstreams.get("notification")
+    requests_sent = 5
+    for _ in range(requests_sent):
+        assert client.get("/notifications", headers=patient_headers).status_code == 503
+
+    stats = pool.hedging_stats()
+    assert stats["retries"] <= pool.hedge_settings.budget_max + 1
+    assert len(calls) == requests_sent + stats["retries"]
+
+    pool.retry_budget.max_tokens = 0
+    pool.retry_budget.reset()
+    calls.clear()
+    assert client.get("/notifications", headers=patient_headers).status_code == 503
+    assert len(calls) == 1
@@ -0,0 +1,71 @@
+"""
+@file: test_logging.py
+@description: Тесты структурированного журнала: выборка, ошибки и медленные запросы, неблокирующая очередь
+@dependencies: pytest, httpx, fastapi, shared/log.py
+@created: 2026-10-18
+"""
+import logging
+import queue
+
+import httpx
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import shared.log as log
+
+class _Recorder:
+    def __init__(self):
+        self.events = []
+
+    def log(self, level, event, **fields):
+        self.events.append((level, event, fields))
+
+def test_request_log_level(monkeypatch):
+    """Тест уровня записи: ошибки и медленные запросы пишутся всегда, успешные - по выборке"""
+    monkeypatch.setattr(log, "LOG_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(log, "LOG_SLOW_REQUEST_SECONDS", 1.0)
+
+    assert log.request_log_level(502, 0.01) == logging.ERROR
+    assert log.request_log_level(200, 2.0) == logging.WARNING
+    assert log.request_log_level(200, 0.01) is None
+
+    monkeypatch.setattr(log, "LOG_SAMPLE_RATE", 1.0)
+    assert log.request_log_level(200, 0.01) == logging.INFO
+
+def test_full_queue_drops_records():
+    """Тест: переполненная очередь не блокирует запись, лишние записи отбрасываются"""
+    records = queue.Queue(maxsize=1)
+    handler = log.NonBlockingQueueHandler(records)
+    before = REGISTRY.get_sample_value("log_records_dropped_total") or 0.0
+
+    for _ in range(3):
+        handler.emit(logging.makeLogRecord({"msg": "event"}))
+
+    assert records.qsize() == 1
+    assert REGISTRY.get_sample_value("log_records_dropped_total") == before + 2
+
+def test_access_log_sampling(client: TestClient, mock_upstream, patient_headers, monkeypatch):
+    """Тест журнала запросов: успешные пропускаются выборкой, ошибки сервиса пишутся"""
+    recorder = _Recorder()
+    monkeypatch.setattr(log, "access_logger", recorder)
+    monkeypatch.setattr(log, "LOG_SAMPLE_RATE", 0.0)
+    mock_upstream(lambda request: httpx.Response(200 if request.url.path == "/bookings" else 502))
+
+    assert client.get("/bookings", headers=patient_headers).status_code == 200
+    assert recorder.events == []
+
+    assert client.get("/bookings/1", headers=patient_headers).status_code == 502
+    level, event, fields = recorder.events[-1]
+    assert (level, event, fields["status"]) == (logging.ERROR, "request", 502)
+
+def test_slow_request_logged(client: TestClient, monkeypatch):
+    """Тест записи медленного запроса независимо от выборки"""
+    recorder = _Recorder()
+    monkeypatch.setattr(log, "access_logger", recorder)
+    monkeypatch.setattr(log, "LOG_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(log, "LOG_SLOW_REQUEST_SECONDS", 0.0)
+
+    client.get("/health")
+    level, event, fields = recorder.events[-1]
+    assert (level, event, fields["status"]) == (logging.WARNING, "slow_request", 200)
+    assert "duration_ms" in fields
@@ -0,0 +1,52 @@
+"""
+@file: test_metrics.py
+@description: Тесты метрик Prometheus API Gateway
+@dependencies: pytest, httpx, fastapi, prometheus_client
+@created: 2026-10-18
+"""
+import httpx
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_metrics_endpoint_exposes_text_format(client: TestClient):
+    """Тест эндпоинта /metrics в формате Prometheus"""
+    client.get("/health")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{method="GET",route="/health",status="200"}' in response.text
+
+def test_table_route_labelled_by_template(client: TestClient, mock_upstream, patient_headers):
+    """Тест метки маршрута таблицы шаблоном пути, а не самим путем"""
+    mock_upstream(lambda request: httpx.Response(200, content=b"x" * 300))
+    labels = {"method": "GET", "route": "/bookings/{booking_id}"}
+    before = _sample("http_requests_total", status="200", **labels)
+
+    client.get("/bookings/123", headers=patient_headers)
+    client.get("/bookings/456", headers=patient_headers)
+
+    assert _sample("http_requests_total", status="200", **labels) == before + 2
+    assert _sample("http_response_size_bytes_sum", **labels) >= 600
+    assert _sample("http_requests_total", method="GET", route="/bookings/123", status="200") == 0
+
+def test_unknown_path_not_used_as_label(client: TestClient):
+    """Тест: неизвестные пути не создают новых рядов метрик"""
+    client.get("/no/such/path/42")
+
+    assert _sample("http_requests_total", method="GET", route="/no/such/path/42", status="404") == 0
+
+def test_upstream_metrics(client: TestClient, mock_upstream, patient_headers):
+    """Тест счетчиков и времени ожидания пула для обращений к сервису"""
+    mock_upstream(lambda request: httpx.Response(502))
+    before = _sample("gateway_upstream_requests_total", upstream="notification", method="GET", status="502")
+    waits = _sample("gateway_upstream_pool_wait_seconds_count", upstream="notification")
+
+    client.get("/notifications", headers=patient_headers)
+
+    assert _sample("gateway_upstream_requests_total", upstream="notification", method="GET", status="502") == before + 1
+    assert _sample("gateway_upstream_pool_wait_seconds_count", upstream="notification") == waits + 1
+    assert _sample("gateway_upstream_in_flight", upstream="notification") == 0
@@ -0,0 +1,64 @@
+"""
+@file: test_proxy.py
+@description: Тесты потоковой пересылки ответов сервисов через API Gateway
+@dependencies: pytest, httpx, fastapi
+@created: 2026-10-18
+"""
+import httpx
+from fastapi.testclient import TestClient
+
+def test_passthrough_keeps_status_and_body(client: TestClient, mock_upstream, patient_headers):
+    """Тест передачи исходного кода статуса и байтов тела без перекодирования"""
+    raw_body = b'{"events": [1, 2, 3],   "note": "spacing is preserved"}'
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/notifications"
+        return httpx.Response(
+            206,
+            content=raw_body,
+            headers={"content-type": "application/json", "etag": '"v1"', "server": "upstream"},
+        )
+
+    mock_upstream(handler)
+    response = client.get("/notifications", headers=patient_headers)
+
+    assert response.status_code == 206
+    assert response.content == raw_body
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["etag"] == '"v1"'
+    assert "upstream" not in response.headers.get("server", "")
+
+def test_passthrough_non_json_content_type(client: TestClient, mock_upstream, patient_headers):
+    """Тест передачи не-JSON ответа с исходным content-type"""
+    mock_upstream(lambda request: httpx.Response(200, content=b"ok", headers={"content-type": "text/csv"}))
+    response = client.get("/notifications", headers=patient_headers)
+
+    assert response.status_code == 200
+    assert response.text == "ok"
+    assert response.headers["content-type"].startswith("text/csv")
+
+def test_passthrough_forwards_user_context(client: TestClient, mock_upstream, make_token):
+    """Тест проброса контекста пользователя в заголовках запроса к сервису"""
+    seen = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.update(request.headers)
+        return httpx.Response(200, json=[])
+
+    mock_upstream(handler)
+    token = make_token("patient", "patient-1")
+    response = client.get("/bookings", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert seen["x-user-id"] == "patient-1"
+    assert seen["x-user-role"] == "patient"
+
+def test_upstream_connection_error_returns_503(client: TestClient, mock_upstream, patient_headers):
+    """Тест ответа 503 при недоступности сервиса"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+
+    mock_upstream(handler)
+    response = client.get("/notifications", headers=patient_headers)
+
+    assert response.status_code == 503
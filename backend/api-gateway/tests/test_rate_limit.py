@@ -0,0 +1,157 @@
+"""
+@file: test_rate_limit.py
+@description: Тесты ограничения частоты запросов API Gateway (token bucket)
+@dependencies: pytest, httpx, fastapi, ratelimit.py
+@created: 2026-10-18
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from ratelimit import (
+    BucketLimit, MemoryBucketStore, RateLimiter, RateLimitExceeded, RateLimitSettings, client_address,
+    parse_trusted_proxies,
+)
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_bucket_refills_over_time():
+    """Тест исчерпания ведра, времени до повтора и пополнения"""
+    clock = _Clock()
+    store = MemoryBucketStore(clock=clock)
+    limit = BucketLimit(rate=2, burst=3)
+
+    results = [asyncio.run(store.take("k", limit)) for _ in range(4)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert results[-1][1] == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert asyncio.run(store.take("k", limit))[0] is True
+
+def test_shards_bounded():
+    """Тест ограничения числа ключей в шардах"""
+    store = MemoryBucketStore(shards=4, max_keys_per_shard=10)
+    for i in range(200):
+        asyncio.run(store.take(f"ip:{i}", BucketLimit(rate=1, burst=1)))
+
+    assert store.size() <= 40
+
+def test_priorities_share_global_budget():
+    """Тест: низкий приоритет отсекается раньше, высокий не ограничен глобально"""
+    limiter = RateLimiter(
+        RateLimitSettings(user=None, route=None, global_=BucketLimit(rate=0.001, burst=10), low_priority_reserve=0.5),
+        memory=MemoryBucketStore(clock=_Clock()),
+    )
+
+    async def admitted(priority: str, count: int) -> int:
+        passed = 0
+        for _ in range(count):
+            try:
+                await limiter.check("u", "GET /x", priority)
+                passed += 1
+            except RateLimitExceeded as e:
+                assert e.scope == "global"
+        return passed
+
+    assert asyncio.run(admitted("low", 10)) == 5
+    assert asyncio.run(admitted("normal", 10)) == 5
+    assert asyncio.run(admitted("high", 10)) == 10
+
+def test_rejected_request_does_not_spend_other_levels():
+    """Тест: запрос, отклоненный глобальным ведром, не расходует бюджет пользователя и маршрута"""
+    clock = _Clock()
+    limiter = RateLimiter(
+        RateLimitSettings(user=BucketLimit(rate=0.001, burst=2), route=BucketLimit(rate=0.001, burst=2), global_=BucketLimit(rate=0.001, burst=1)),
+        memory=MemoryBucketStore(clock=clock),
+    )
+
+    async def scenario():
+        await limiter.check("u", "GET /x")
+        with pytest.raises(RateLimitExceeded) as rejected:
+            await limiter.check("u", "GET /x")
+        # Глобальный бюджет не участвует: пользователю и маршруту остался еще один токен
+        await limiter.check("u", "GET /x", "high")
+        with pytest.raises(RateLimitExceeded) as exhausted:
+            await limiter.check("u", "GET /x", "high")
+        return rejected.value.scope, exhausted.value.scope
+
+    assert asyncio.run(scenario()) == ("global", "user")
+    assert limiter.limited == {"user": 1, "route": 0, "global": 1}
+
+def test_falls_back_to_memory_when_redis_fails():
+    """Тест перехода на память при недоступности Redis"""
+    class _BrokenStore:
+        async def take_all(self, *args, **kwargs):
+            raise ConnectionError("redis down")
+
+    limiter = RateLimiter(
+        RateLimitSettings(user=BucketLimit(rate=1, burst=1), route=None, global_=None),
+        primary=_BrokenStore(),
+    )
+    asyncio.run(limiter.check("u", "GET /x"))
+
+    assert limiter.stats()["backend"] == "memory"
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(limiter.check("u", "GET /x"))
+
+def test_gateway_returns_429(client: TestClient, mock_upstream, make_token, monkeypatch):
+    """Тест ответа 429 с Retry-After при превышении бюджета пользователя"""
+    from main import rate_limiter
+
+    monkeypatch.setattr(
+        rate_limiter, "settings", RateLimitSettings(user=BucketLimit(rate=0.5, burst=2), route=None, global_=None)
+    )
+    mock_upstream(lambda request: httpx.Response(200, json=[]))
+    first = {"Authorization": f"Bearer {make_token('patient', 'patient-1')}"}
+    second = {"Authorization": f"Bearer {make_token('patient', 'patient-2')}"}
+
+    statuses = [client.get("/notifications", headers=first).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+    limited = client.get("/notifications", headers=first)
+    assert limited.headers["retry-after"] == "2"
+    assert client.get("/notifications", headers=second).status_code == 200
+
+def test_client_address_behind_trusted_proxy():
+    """Тест: X-Forwarded-For учитывается только от доверенного прокси, клиент - первый недоверенный справа"""
+    trusted = parse_trusted_proxies("10.0.0.0/8, 192.168.1.10")
+    forwarded = {"x-forwarded-for": "1.1.1.1, 203.0.113.7, 10.0.0.9"}
+
+    assert client_address("10.0.0.5", forwarded, trusted) == "203.0.113.7"
+    assert client_address("10.0.0.5", {"x-real-ip": "203.0.113.8"}, trusted) == "203.0.113.8"
+    assert client_address("10.0.0.5", {}, trusted) == "10.0.0.5"
+    # Заголовки от клиента напрямую (не через прокси) не учитываются
+    assert client_address("198.51.100.1", forwarded, trusted) == "198.51.100.1"
+    assert client_address("10.0.0.5", forwarded, ()) == "10.0.0.5"
+
+def test_anonymous_clients_behind_proxy_have_separate_budgets(mock_upstream, monkeypatch):
+    """Тест: два анонимных клиента за одним nginx получают отдельные бюджеты"""
+    from main import app, rate_limiter
+
+    monkeypatch.setattr(rate_limiter, "settings", RateLimitSettings(
+        user=BucketLimit(rate=0.5, burst=2), route=None, global_=None,
+        trusted_proxies=parse_trusted_proxies("10.0.0.0/8"),
+    ))
+    mock_upstream(lambda request: httpx.Response(200, json={"access_token": "token"}))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app, client=("10.0.0.5", 40000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as proxy:
+            async def login(address: str) -> int:
+                response = await proxy.post("/auth/login", json={}, headers={"X-Forwarded-For": address})
+                return response.status_code
+
+            first = [await login("203.0.113.1") for _ in range(3)]
+            second = await login("203.0.113.2")
+            return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == [200, 200, 429]
+    assert second == 200
@@ -0,0 +1,133 @@
+"""
+@file: test_response_cache.py
+@description: Тесты кэша ответов API Gateway (TTL, ETag/If-None-Match, резервный LRU)
+@dependencies: pytest, httpx, fastapi, response_cache.py
+@created: 2026-10-18
+"""
+import asyncio
+import httpx
+from fastapi.testclient import TestClient
+
+from response_cache import CachedResponse, MemoryBackend, ResponseCache, etag_matches, make_etag
+
+def counting_handler(calls: list, body: dict):
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(200, json=body)
+    return handler
+
+def test_etag_matching():
+    """Тест сравнения ETag с If-None-Match (слабые теги, списки, *)"""
+    etag = make_etag(b"body")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", {etag[2:]}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+def test_memory_backend_ttl_and_lru():
+    """Тест TTL и ограничения размера LRU в памяти"""
+    async def scenario():
+        backend = MemoryBackend(max_entries=1)
+        await backend.set("a", b"1", ttl=60)
+        await backend.set("b", b"2", ttl=60)
+        await backend.set("c", b"3", ttl=0)
+        return await backend.get("a"), await backend.get("c")
+
+    assert asyncio.run(scenario()) == (None, None)
+
+def test_cache_falls_back_to_memory_when_primary_fails():
+    """Тест перехода на LRU в памяти при ошибке основного хранилища"""
+    class BrokenBackend:
+        async def get(self, key):
+            raise ConnectionError("redis down")
+
+        async def set(self, key, raw, ttl):
+            raise ConnectionError("redis down")
+
+    async def scenario():
+        cache = ResponseCache(primary=BrokenBackend())
+        entry = CachedResponse(status_code=200, body=b"{}", etag=make_etag(b"{}"))
+        assert await cache.get("key") is None
+        await cache.set("key", entry, ttl=60)
+        return await cache.get("key"), cache.stats()["backend"]
+
+    cached, backend = asyncio.run(scenario())
+    assert cached.body == b"{}"
+    assert backend == "memory"
+
+def test_public_get_served_from_cache(client: TestClient, mock_upstream):
+    """Тест: повторный GET /doctors не обращается к сервису"""
+    calls = []
+    mock_upstream(counting_handler(calls, {"doctors": []}))
+
+    first = client.get("/doctors")
+    second = client.get("/doctors")
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == {"doctors": []}
+    assert first.headers["etag"] == second.headers["etag"]
+    assert calls == ["/api/doctors/list"]
+
+def test_if_none_match_returns_304(client: TestClient, mock_upstream):
+    """Тест ответа 304 при совпадении ETag"""
+    mock_upstream(counting_handler([], {"events": [1]}))
+    etag = client.get("/events").headers["etag"]
+
+    response = client.get("/events", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+def test_role_scoped_cache_keys(client: TestClient, mock_upstream, make_token):
+    """Тест: ответы, зависящие от роли, кэшируются отдельно для каждой роли"""
+    from main import response_cache
+    calls = []
+    mock_upstream(counting_handler(calls, {"doctors": []}))
+
+    for role in ("patient", "doctor", "patient"):
+        headers = {"Authorization": f"Bearer {make_token(role)}"}
+        assert client.get("/api/doctors/list", headers=headers).status_code == 200
+
+    assert len(calls) == 2
+    assert response_cache.stats()["hits"] == 1
+
+def test_error_responses_not_cached(client: TestClient, mock_upstream):
+    """Тест: ответы с ошибкой не кэшируются"""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(500, json={"detail": "boom"})
+
+    mock_upstream(handler)
+    assert client.get("/events").status_code == 500
+    assert client.get("/events").status_code == 500
+    assert len(calls) == 2
+
+def test_cached_response_has_single_cache_control(client: TestClient, mock_upstream):
+    """Тест: Cache-Control ответа из кэша - только заголовок шлюза, заголовок сервиса не передается"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"events": []}, headers={"Cache-Control": "no-store"})
+
+    mock_upstream(handler)
+    for response in (client.get("/events"), client.get("/events")):
+        assert response.headers.get_list("cache-control") == ["public, max-age=60"]
+
+def test_doctor_directory_headers_replaced_by_gateway(client: TestClient, mock_upstream, patient_headers):
+    """Тест: ETag и Cache-Control: no-cache справочника врачей User Service заменяются заголовками кэша шлюза"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"doctors": []}, headers={"ETag": 'W/"doctors-abc.1"', "Cache-Control": "no-cache"})
+
+    mock_upstream(handler)
+    for path, headers, cache_control in (
+        ("/doctors", {}, "public, max-age=60"),
+        ("/api/doctors/list", patient_headers, "private, max-age=60"),
+    ):
+        response = client.get(path, headers=headers)
+        assert response.headers.get_list("cache-control") == [cache_control]
+        assert len(response.headers.get_list("etag")) == 1
+        assert response.headers["etag"] != 'W/"doctors-abc.1"'
+
+        cached = client.get(path, headers={**headers, "If-None-Match": response.headers["etag"]})
+        assert cached.status_code == 304
+        assert cached.headers.get_list("cache-control") == [cache_control]
@@ -0,0 +1,81 @@
+"""
+@file: test_responses.py
+@description: Тесты быстрой сериализации JSON (FastJSONResponse) и замера стоимости сериализации сервисов
+@dependencies: pytest, pydantic, fastapi, shared/responses.py, benchmarks/serialization.py
+@created: 2026-10-18
+"""
+import asyncio
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import List, Optional
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+import shared.responses as responses
+from benchmarks.serialization import _fast_body, _route, _standard_body, sample_items
+from shared.responses import FastJSONResponse
+
+class Item(BaseModel):
+    id: uuid.UUID
+    name: str
+    created_at: datetime
+    closed_on: Optional[date]
+    price: Decimal
+
+ITEMS = [
+    Item(id=uuid.UUID(int=1), name="Визит", created_at=datetime(2026, 10, 18, 9, 30, 0, 123456), closed_on=None, price=Decimal("2500.50")),
+    Item(id=uuid.UUID(int=2), name="Вызов", created_at=datetime(2026, 10, 18, 9, 30, tzinfo=timezone.utc), closed_on=date(2026, 10, 19), price=Decimal("10")),
+]
+
+def _app() -> FastAPI:
+    app = FastAPI(default_response_class=FastJSONResponse)
+
+    @app.get("/items", response_model=List[Item])
+    async def items_via_model():
+        return ITEMS
+
+    @app.get("/items/direct", response_model=List[Item])
+    async def items_direct():
+        return FastJSONResponse(ITEMS)
+
+    return app
+
+def test_matches_standard_serialization():
+    """Тест: модели, datetime, UUID и Decimal сериализуются так же, как стандартным путем FastAPI"""
+    route = _route(_app(), "GET", "/items")
+    assert asyncio.run(_fast_body(ITEMS)) == asyncio.run(_standard_body(route, ITEMS))
+    assert responses.dumps({"at": ITEMS[1].created_at, 1: "key"}) == b'{"at":"2026-10-18T09:30:00Z","1":"key"}'
+
+def test_default_and_direct_responses():
+    """Тест: default_response_class и прямой возврат дают одинаковый ответ"""
+    client = TestClient(_app())
+    via_model = client.get("/items")
+    direct = client.get("/items/direct")
+
+    assert via_model.headers["content-type"] == direct.headers["content-type"] == "application/json"
+    assert via_model.content == direct.content
+    assert direct.json()[0] == {
+        "id": "00000000-0000-0000-0000-000000000001",
+        "name": "Визит",
+        "created_at": "2026-10-18T09:30:00.123456",
+        "closed_on": None,
+        "price": "2500.50",
+    }
+
+def test_fallback_without_orjson(monkeypatch):
+    """Тест: без orjson ответ совпадает с JSONResponse Starlette"""
+    monkeypatch.setattr(responses, "orjson", None)
+    content = {"items": [item.model_dump(mode="json") for item in ITEMS], "total": 2}
+    assert responses.dumps(content) == JSONResponse(content).body
+    assert responses.loads(b'{"a": [1]}') == {"a": [1]}
+
+def test_sample_items_fill_optional_fields():
+    """Тест данных замера: необязательные поля заполнены, идентификаторы уникальны"""
+    items = sample_items(Item, 3)
+    assert {item.id for item in items} == {uuid.UUID(int=i) for i in range(3)}
+    assert [item.closed_on for item in items] == [date(2026, 10, 18), date(2026, 10, 19), date(2026, 10, 20)]
+    assert items[2].name == "name-000002" and items[2].price == Decimal("0.5")
@@ -0,0 +1,118 @@
+"""
+@file: test_routing_table.py
+@description: Тесты таблицы маршрутов, префиксного дерева и единого диспетчера API Gateway
+@dependencies: pytest, httpx, fastapi, routing.py
+@created: 2026-10-18
+"""
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from main import ROUTE_TABLE
+from routing import QueryParam, Route, RouteParamError, RouteTrie
+
+def test_static_segment_wins_over_param():
+    """Тест приоритета статического сегмента над параметром независимо от порядка"""
+    trie = RouteTrie([
+        Route("GET", "/api/doctors/{doctor_id}", "profile", "/doctor-profiles/{doctor_id}"),
+        Route("GET", "/api/doctors/list", "user", "/api/doctors/list"),
+    ])
+
+    assert trie.match("GET", "/api/doctors/list").route.service == "user"
+    match = trie.match("GET", "/api/doctors/42")
+    assert match.route.service == "profile"
+    assert match.params == {"doctor_id": "42"}
+
+def test_method_mismatch_and_unknown_path():
+    """Тест различения 405 (путь есть, метода нет) и 404 (пути нет)"""
+    trie = RouteTrie([Route("GET", "/admin/users", "user", "/users")])
+
+    match = trie.match("PUT", "/admin/users")
+    assert match.route is None
+    assert match.allowed_methods == ("GET",)
+    assert trie.match("GET", "/admin/unknown") is None
+
+def test_duplicate_route_rejected():
+    """Тест отказа при дублировании маршрута"""
+    route = Route("GET", "/events", "event", "/events")
+    with pytest.raises(ValueError):
+        RouteTrie([route, route])
+
+def test_route_table_compiles():
+    """Тест отсутствия дубликатов в таблице шлюза"""
+    assert len(RouteTrie(ROUTE_TABLE).routes) == len(ROUTE_TABLE)
+
+def test_query_mapping_and_validation():
+    """Тест переименования, приведения и обязательности query-параметров"""
+    route = Route(
+        "GET", "/geo/doctors/nearby", "geo", "/geo/doctors/nearby",
+        query=(QueryParam("lat", cast=float), QueryParam("limit", source="size", default=10, cast=int)),
+    )
+
+    assert route.build_upstream_path({}, {"lat": "55.7", "size": "5"}, None) == "/geo/doctors/nearby?lat=55.7&limit=5"
+    with pytest.raises(RouteParamError):
+        route.build_upstream_path({}, {}, None)
+    with pytest.raises(RouteParamError):
+        route.build_upstream_path({}, {"lat": "north"}, None)
+
+def test_dispatch_substitutes_current_user(client: TestClient, mock_upstream, make_token):
+    """Тест подстановки user_id из токена в путь сервиса"""
+    seen = []
+    mock_upstream(lambda request: seen.append(request.url.path) or httpx.Response(200, json={}))
+
+    token = make_token("patient", "patient-7")
+    response = client.get("/wallets/me", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert seen == ["/wallets/patient-7"]
+
+def test_dispatch_maps_query_params(client: TestClient, mock_upstream, admin_headers):
+    """Тест передачи size клиента как limit сервису"""
+    seen = []
+    mock_upstream(lambda request: seen.append(str(request.url.query, "ascii")) or httpx.Response(200, json=[]))
+
+    response = client.get("/api/users?page=2&size=5", headers=admin_headers)
+
+    assert response.status_code == 200
+    assert seen == ["page=2&limit=5"]
+
+def test_dispatch_forwards_optional_query_params(client: TestClient, mock_upstream, admin_headers):
+    """Тест передачи курсора и роли списка пользователей только если они заданы"""
+    seen = []
+    mock_upstream(lambda request: seen.append(str(request.url.query, "ascii")) or httpx.Response(200, json={}))
+
+    client.get("/admin/users", headers=admin_headers)
+    client.get("/admin/users?role=doctor&cursor=abc", headers=admin_headers)
+    client.get("/api/patients?cursor=abc", headers=admin_headers)
+
+    assert seen == ["page=1&limit=10", "page=1&limit=10&role=doctor&cursor=abc", "role=patient&page=1&limit=10&cursor=abc"]
+
+def test_dispatch_enforces_roles(client: TestClient, mock_upstream, patient_headers):
+    """Тест запрета админского маршрута для не-админа"""
+    mock_upstream(lambda request: httpx.Response(200, json=[]))
+    response = client.get("/api/users", headers=patient_headers)
+
+    assert response.status_code == 403
+
+def test_dispatch_rejects_bad_query(client: TestClient, patient_headers):
+    """Тест ответа 422 при некорректном query-параметре"""
+    response = client.get("/geo/doctors/nearby?lat=1", headers=patient_headers)
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["query", "lon"]
+
+def test_dispatch_405_on_explicit_endpoint(client: TestClient):
+    """Тест 405 для явных эндпоинтов вне таблицы"""
+    response = client.post("/health")
+
+    assert response.status_code == 405
+    assert "GET" in response.headers["allow"]
+
+def test_openapi_includes_table_routes(client: TestClient):
+    """Тест генерации OpenAPI-схемы из таблицы маршрутов"""
+    paths = client.get("/openapi.json").json()["paths"]
+
+    assert "get" in paths["/api/doctors/{doctor_id}"]
+    assert "post" in paths["/auth/login"]
+    assert "/health" in paths
+    assert "/{full_path}" not in paths
@@ -0,0 +1,171 @@
+"""
+@file: test_streaming.py
+@description: Тесты проксирования WebSocket и Server-Sent Events через API Gateway
+@dependencies: pytest, httpx, websockets, fastapi, streaming.py
+@created: 2026-10-18
+"""
+import asyncio
+import socket
+import threading
+import time
+from dataclasses import replace
+
+import httpx
+import pytest
+import websockets
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import streaming
+
+class _EventBody(httpx.AsyncByteStream):
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            yield chunk
+
+@pytest.fixture
+def sse_upstream(monkeypatch):
+    """Подмена клиента потоков SSE: ответы сервиса формирует обработчик"""
+    from main import stream_proxy
+
+    def _install(handler):
+        real_client = httpx.AsyncClient
+        monkeypatch.setattr(
+            streaming.httpx,
+            "AsyncClient",
+            lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs),
+        )
+        stream_proxy._client = None
+        stream_proxy._loop = None
+
+    yield _install
+    stream_proxy._client = None
+    stream_proxy._loop = None
+
+@pytest.fixture
+def ws_upstream(monkeypatch):
+    """WebSocket-сервер чата в отдельном потоке: отвечает "echo:<сообщение>"; chat направляется на него"""
+    from main import upstreams
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    handshakes = []
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    stop = loop.create_future()
+
+    async def echo(connection):
+        handshakes.append((connection.path, connection.request_headers))
+        async for message in connection:
+            await connection.send(f"echo:{message}")
+
+    async def serve():
+        async with websockets.serve(echo, "127.0.0.1", port):
+            ready.set()
+            await stop
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True)
+    thread.start()
+    ready.wait(5)
+
+    pool = upstreams.get("chat")
+    pool.breaker.reset()
+    monkeypatch.setattr(pool.balancer.instances[0], "url", f"http://127.0.0.1:{port}")
+    yield handshakes
+    loop.call_soon_threadsafe(stop.set_result, None)
+    thread.join(5)
+    loop.close()
+
+def test_sse_events_are_relayed(client: TestClient, sse_upstream, patient_headers):
+    """Тест передачи событий SSE клиенту без буферизации и с Last-Event-ID для сервиса"""
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.url.path, request.headers.get("last-event-id"), request.headers.get("x-user-id")))
+        chunks = [b"event: location\nid: 1\ndata: {}\n\n", b": ping\n\n"]
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=_EventBody(chunks))
+
+    sse_upstream(handler)
+    headers = {**patient_headers, "Last-Event-ID": "0"}
+    response = client.get("/geo/doctors/d-1/location/stream", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.text == "event: location\nid: 1\ndata: {}\n\n: ping\n\n"
+    assert seen == [("/geo/doctors/d-1/location/stream", "0", "patient-user")]
+
+def test_sse_upstream_error_is_returned_as_is(client: TestClient, sse_upstream, patient_headers):
+    """Тест: отказ сервиса в потоке (404) возвращается обычным ответом"""
+    sse_upstream(lambda request: httpx.Response(404, json={"detail": "Doctor location not found"}))
+    response = client.get("/geo/doctors/d-1/location/stream", headers=patient_headers)
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Doctor location not found"}
+
+def test_stream_routes_rejected_in_batch(client: TestClient, patient_headers):
+    """Тест: потоковый маршрут недоступен в пакетном запросе"""
+    batch = {"requests": [{"id": "live", "method": "GET", "path": "/geo/doctors/d-1/location/stream"}]}
+    response = client.post("/batch", json=batch, headers=patient_headers)
+    assert response.json()["responses"][0]["status"] == 400
+
+def _wait_streams_closed(timeout: float = 5) -> None:
+    """Ожидание закрытия прокси: TestClient отменяет приложение сразу после выхода из контекста"""
+    from main import stream_proxy
+    deadline = time.monotonic() + timeout
+    while stream_proxy.stats()["active"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_websocket_proxy_relays_messages(client: TestClient, ws_upstream, make_token, admin_headers):
+    """Тест проксирования WebSocket: токен из access_token, контекст пользователя передается сервису"""
+    token = make_token("patient", user_id="ws-user")
+    with client.websocket_connect(f"/chat/rooms/r1/ws?access_token={token}") as ws:
+        ws.send_text("hello")
+        assert ws.receive_text() == "echo:hello"
+        ws.send_text("again")
+        assert ws.receive_text() == "echo:again"
+        active = client.get("/admin/streams", headers=admin_headers).json()["connections"]
+        ws.close()
+        _wait_streams_closed()
+
+    path, headers = ws_upstream[0]
+    assert path == "/chat/rooms/r1/ws"
+    assert headers["X-User-ID"] == "ws-user"
+    assert active[0]["route"] == "/chat/rooms/{room_id}/ws"
+    assert active[0]["messages"] == {"to_upstream": 2, "to_client": 2}
+
+def test_websocket_requires_token(client: TestClient, ws_upstream):
+    """Тест отказа при рукопожатии без токена (код 1008)"""
+    with pytest.raises(WebSocketDisconnect) as error:
+        with client.websocket_connect("/chat/rooms/r1/ws"):
+            pass
+    assert error.value.code == 1008
+    assert ws_upstream == []
+
+def test_websocket_idle_timeout(client: TestClient, ws_upstream, make_token, monkeypatch):
+    """Тест закрытия соединения без сообщений по таймауту простоя (код 1001)"""
+    from main import stream_proxy
+    monkeypatch.setattr(stream_proxy, "settings", replace(stream_proxy.settings, idle_timeout=0.1))
+    closed_before = stream_proxy.stats()["closed"].get("idle", 0)
+
+    with client.websocket_connect(f"/chat/rooms/r1/ws?access_token={make_token()}") as ws:
+        message = ws.receive()
+
+    assert message == {"type": "websocket.close", "code": 1001, "reason": ""}
+    assert stream_proxy.stats()["closed"]["idle"] == closed_before + 1
+
+def test_websocket_unavailable_service(client: TestClient, make_token, monkeypatch):
+    """Тест: сервис недоступен - соединение закрывается с кодом 1013 (повторить позже)"""
+    from main import upstreams
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    monkeypatch.setattr(upstreams.get("chat").balancer.instances[0], "url", f"http://127.0.0.1:{port}")
+
+    with client.websocket_connect(f"/chat/rooms/r1/ws?access_token={make_token()}") as ws:
+        message = ws.receive()
+    assert message["type"] == "websocket.close" and message["code"] == 1013
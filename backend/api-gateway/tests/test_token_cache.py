@@ -0,0 +1,99 @@
+"""
+@file: test_token_cache.py
+@description: Тесты кэша проверенных JWT claims в API Gateway
+@dependencies: pytest, fastapi, token_cache.py
+@created: 2026-10-18
+"""
+import time
+
+import jwt
+from fastapi.testclient import TestClient
+
+from token_cache import ClaimsCache
+
+def test_cache_hit_and_miss_counters():
+    """Тест счетчиков попаданий и промахов"""
+    cache = ClaimsCache(max_size=10)
+    assert cache.get("token") is None
+    cache.put("token", {"user_id": "1", "exp": time.time() + 60})
+    assert cache.get("token")["user_id"] == "1"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_cache_entry_evicted_at_exp():
+    """Тест вытеснения записи не позже exp токена"""
+    cache = ClaimsCache(max_size=10, ttl_seconds=300)
+    cache.put("token", {"user_id": "1", "exp": time.time() - 1})
+    assert cache.get("token") is None
+    assert cache.stats()["size"] == 0
+
+def test_cache_is_bounded_lru():
+    """Тест ограничения размера: вытесняется давно не использованная запись"""
+    cache = ClaimsCache(max_size=2)
+    cache.put("a", {"user_id": "a"})
+    cache.put("b", {"user_id": "b"})
+    cache.get("a")
+    cache.put("c", {"user_id": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+def test_revoke_and_invalidate_user():
+    """Тест отзыва токена и сброса записей пользователя"""
+    cache = ClaimsCache()
+    cache.put("a", {"user_id": "1", "exp": time.time() + 60})
+    cache.put("b", {"user_id": "1"})
+    cache.revoke("a")
+    assert cache.get("a") is None
+    assert cache.is_revoked("a")
+    assert cache.invalidate_user("1") == 1
+
+def test_revoke_uncached_token_until_its_exp(monkeypatch):
+    """Тест: токен, которого нет в кэше, отозван до своего exp, а не до ttl_seconds кэша"""
+    cache = ClaimsCache(ttl_seconds=300)
+    now = time.time()
+    token = jwt.encode({"user_id": "1", "exp": int(now + 3600)}, "secret", algorithm="HS256")
+    cache.revoke(token)
+
+    monkeypatch.setattr(time, "time", lambda: now + 1800)
+    assert cache.is_revoked(token)
+    monkeypatch.setattr(time, "time", lambda: now + 3601)
+    assert not cache.is_revoked(token)
+
+def test_expired_revocations_pruned_on_revoke():
+    """Тест: истекшие отзывы удаляются при следующем отзыве, список не растет"""
+    cache = ClaimsCache()
+    for index in range(5):
+        cache.revoke(f"token-{index}", exp=time.time() - 1)
+    cache.revoke("fresh", exp=time.time() + 60)
+    assert cache.stats()["revoked"] == 1
+
+def test_verify_token_uses_shared_cache(client: TestClient, mock_upstream, make_token):
+    """Тест: повторный запрос с тем же токеном обслуживается из кэша"""
+    from main import claims_cache
+    import httpx
+
+    mock_upstream(lambda request: httpx.Response(200, json=[]))
+    headers = {"Authorization": f"Bearer {make_token('patient', 'cached-user')}"}
+    hits_before = claims_cache.hits
+
+    assert client.get("/bookings", headers=headers).status_code == 200
+    assert client.get("/notifications", headers=headers).status_code == 200
+    assert claims_cache.hits == hits_before + 1
+
+def test_expired_token_rejected(client: TestClient, make_token):
+    """Тест отказа для просроченного токена"""
+    headers = {"Authorization": f"Bearer {make_token('admin', ttl_seconds=-60)}"}
+    response = client.get("/admin/auth-cache", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token expired"
+
+def test_revoked_token_rejected(client: TestClient, make_token):
+    """Тест отказа для отозванного токена"""
+    from main import claims_cache
+
+    token = make_token("admin", "revoked-admin")
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/admin/auth-cache", headers=headers).status_code == 200
+    claims_cache.revoke(token)
+    assert client.get("/admin/auth-cache", headers=headers).status_code == 401
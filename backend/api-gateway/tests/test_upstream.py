@@ -0,0 +1,226 @@
+"""
+@file: test_upstream.py
+@description: Тесты пулов соединений API Gateway к микросервисам
+@dependencies: pytest, httpx, fastapi, upstream.py
+@created: 2026-10-18
+"""
+import asyncio
+import socket
+import threading
+import time
+from dataclasses import replace
+
+from fastapi.testclient import TestClient
+
+from benchmarks.stubs import StubServer, StubSpec
+from upstream import UpstreamPool, UpstreamRegistry, load_pool_settings
+
+def test_pool_settings_from_env(monkeypatch):
+    """Тест чтения лимитов пула: настройка сервиса важнее общей"""
+    monkeypatch.setenv("UPSTREAM_MAX_CONNECTIONS", "50")
+    monkeypatch.setenv("UPSTREAM_BOOKING_MAX_CONNECTIONS", "7")
+    assert load_pool_settings("booking").max_connections == 7
+    assert load_pool_settings("geo").max_connections == 50
+
+def test_pool_reuses_client_within_loop():
+    """Тест переиспользования одного клиента в рамках event loop"""
+    pool = UpstreamPool("user", "http://127.0.0.1:1", load_pool_settings("user"))
+
+    async def scenario():
+        first = pool._ensure_client()
+        second = pool._ensure_client()
+        await pool.aclose()
+        return first is second
+
+    assert asyncio.run(scenario())
+
+def test_pool_closes_client_of_previous_loop():
+    """Тест: при смене event loop соединения прежнего клиента закрываются"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = StubServer("user", StubSpec(port=port, latency_ms=1))
+    server_loop = asyncio.new_event_loop()
+    threading.Thread(target=server_loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(server.start(), server_loop).result()
+    pool = UpstreamPool("user", f"http://127.0.0.1:{port}", load_pool_settings("user"))
+
+    async def call():
+        await pool.request("GET", "/users")
+
+    try:
+        for _ in range(3):
+            asyncio.run(call())
+        deadline = time.monotonic() + 2
+        while server.open_connections > 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Открыто три соединения (по одному на loop), остаться может только соединение последнего клиента
+        assert server.connections == 3
+        assert server.open_connections <= 1
+    finally:
+        asyncio.run(pool.aclose())
+        asyncio.run_coroutine_threadsafe(server.close(), server_loop).result()
+        server_loop.call_soon_threadsafe(server_loop.stop)
+
+def test_pool_counts_failed_requests():
+    """Тест учета запросов и освобождения слота при ошибке соединения"""
+    pool = UpstreamPool("user", "http://127.0.0.1:1", load_pool_settings("user"))
+
+    async def scenario():
+        try:
+            await pool.request("GET", "/health")
+        except Exception:
+            pass
+        stats = pool.stats()
+        await pool.aclose()
+        return stats
+
+    stats = asyncio.run(scenario())
+    # GET после ошибки соединения повторяется один раз (бюджет повторов)
+    assert stats["requests_total"] == 2
+    assert stats["hedging"]["retries"] == 1
+    assert stats["in_use"] == 0
+
+def _http2_pool_stats(service_http2: bool) -> dict:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = StubServer("booking", StubSpec(port=port, latency_ms=1, http2=service_http2))
+    settings = replace(load_pool_settings("booking"), http2=True, http2_max_streams=8)
+    pool = UpstreamPool("booking", f"http://127.0.0.1:{port}", settings)
+
+    async def scenario():
+        await server.start()
+        try:
+            responses = await asyncio.gather(*(pool.request("GET", "/bookings") for _ in range(10)))
+            versions = {response.http_version for response in responses}
+            stats = pool.stats()
+        finally:
+            await pool.aclose()
+            await server.close()
+        return versions, stats, server.connections
+
+    versions, stats, connections = asyncio.run(scenario())
+    return {"versions": versions, "stats": stats, "connections": connections}
+
+def test_pool_http2_settings_from_env(monkeypatch):
+    """Тест настроек HTTP/2: выключено по умолчанию, число потоков задается для сервиса"""
+    monkeypatch.setenv("UPSTREAM_BOOKING_HTTP2", "true")
+    monkeypatch.setenv("UPSTREAM_BOOKING_HTTP2_MAX_STREAMS", "32")
+    assert load_pool_settings("booking").http2 is True
+    assert load_pool_settings("booking").http2_max_streams == 32
+    assert load_pool_settings("geo").http2 is False
+
+def test_pool_multiplexes_over_http2():
+    """Тест h2c: одновременные запросы идут потоками одного соединения"""
+    result = _http2_pool_stats(service_http2=True)
+    assert result["versions"] == {"HTTP/2"}
+    assert result["connections"] == 1
+    assert result["stats"]["http_version"] == "HTTP/2"
+    assert result["stats"]["http2_fallbacks"] == 0
+
+def test_pool_falls_back_to_http1():
+    """Тест перехода на HTTP/1.1 для сервиса без поддержки HTTP/2 без ошибок для клиентов"""
+    result = _http2_pool_stats(service_http2=False)
+    assert result["versions"] == {"HTTP/1.1"}
+    assert result["stats"]["http_version"] == "HTTP/1.1"
+    assert result["stats"]["http2_fallbacks"] == 1
+    assert result["stats"]["in_use"] == 0
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_pool_sends_post_once_to_service_without_http2():
+    """Тест: POST к сервису без HTTP/2 не отправляется по h2c (отказ пришел бы ошибкой записи) и доходит один раз"""
+    port = _free_port()
+    server = StubServer("payment", StubSpec(port=port, latency_ms=1, http2=False))
+    pool = UpstreamPool("payment", f"http://127.0.0.1:{port}", replace(load_pool_settings("payment"), http2=True))
+
+    async def scenario():
+        await server.start()
+        try:
+            response = await pool.request("POST", "/payments", json={"amount": 1})
+            return response.http_version, server.requests, pool.stats()
+        finally:
+            await pool.aclose()
+            await server.close()
+
+    version, requests, stats = asyncio.run(scenario())
+    assert version == "HTTP/1.1"
+    assert requests == 1
+    assert stats["http2_fallbacks"] == 1
+    assert stats["in_use"] == 0
+
+def test_pool_falls_back_per_instance_and_caps_http1_requests():
+    """Тест: на HTTP/1.1 переходит только экземпляр без HTTP/2, одновременно к нему - не больше max_connections"""
+    h2_port, h1_port = _free_port(), _free_port()
+    servers = [
+        StubServer("booking", StubSpec(port=h2_port, latency_ms=5)),
+        StubServer("booking", StubSpec(port=h1_port, latency_ms=5, http2=False)),
+    ]
+    settings = replace(load_pool_settings("booking"), http2=True, http2_max_streams=8, max_connections=2)
+    h1_url = f"http://127.0.0.1:{h1_port}"
+    pool = UpstreamPool("booking", [f"http://127.0.0.1:{h2_port}", h1_url], settings)
+    peak_http1 = 0
+
+    async def watch():
+        nonlocal peak_http1
+        while True:
+            if pool._http1_slots is not None:
+                peak_http1 = max(peak_http1, settings.max_connections - pool._http1_slots._value)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        for server in servers:
+            await server.start()
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await asyncio.gather(*(pool.request("GET", "/bookings") for _ in range(40)))
+            return pool.stats()
+        finally:
+            watcher.cancel()
+            await pool.aclose()
+            for server in servers:
+                await server.close()
+
+    stats = asyncio.run(scenario())
+    versions = {instance["url"]: instance["http_version"] for instance in stats["instances"]}
+    assert versions[h1_url] == "HTTP/1.1"
+    assert set(versions.values()) == {"HTTP/1.1", "HTTP/2"}
+    assert stats["http_version"] == "HTTP/2"
+    assert stats["http2_fallbacks"] == 1
+    assert 0 < peak_http1 <= settings.max_connections
+    assert servers[1].peak_connections <= settings.max_connections
+    assert stats["in_use"] == 0
+
+def test_registry_stats_cover_all_services():
+    """Тест наличия пула для каждой записи SERVICES"""
+    registry = UpstreamRegistry({"user": "http://a", "geo": "http://b"})
+    assert set(registry.stats()) == {"user", "geo"}
+    assert "user" in registry and "chat" not in registry
+
+def test_admin_upstreams_requires_admin(client: TestClient, make_token):
+    """Тест доступа к статистике пулов только для админа"""
+    headers = {"Authorization": f"Bearer {make_token('patient')}"}
+    response = client.get("/admin/upstreams", headers=headers)
+    assert response.status_code == 403
+
+def test_admin_upstreams_stats(client: TestClient, admin_headers):
+    """Тест структуры статистики пулов"""
+    response = client.get("/admin/upstreams", headers=admin_headers)
+    assert response.status_code == 200
+    pools = response.json()["pools"]
+    assert "user" in pools
+    for field in ["in_use", "idle", "wait_time_avg_ms", "max_connections"]:
+        assert field in pools["user"]
+
+def test_lifespan_opens_and_closes_pools():
+    """Тест создания и закрытия пулов в lifespan приложения"""
+    from main import app, upstreams
+
+    with TestClient(app) as lifespan_client:
+        assert lifespan_client.get("/health").status_code == 200
+        assert upstreams.get("user")._client is not None
+    assert upstreams.get("user")._client is None
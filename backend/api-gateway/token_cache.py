@@ -0,0 +1,118 @@
+"""
+@file: token_cache.py
+@description: LRU-кэш проверенных claims JWT для verify_token в API Gateway
+@dependencies: PyJWT, main.py (verify_token)
+@created: 2026-10-18
+"""
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import jwt
+
+
+def token_key(token: str) -> str:
+    """Ключ кэша: хэш токена, сам токен в памяти не хранится"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class ClaimsCache:
+    """Ограниченный LRU проверенных claims.
+
+    Запись живет не дольше exp токена и не дольше ttl_seconds. Отозванные
+    токены хранятся в отдельном списке до истечения их exp (истекшие
+    удаляются при каждом отзыве).
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._revoked: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        key = token_key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, claims = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: dict) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        exp = claims.get("exp")
+        if exp:
+            expires_at = min(expires_at, float(exp))
+
+        key = token_key(token)
+        self._entries[key] = (expires_at, claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def revoke(self, token: str, exp: Optional[float] = None) -> None:
+        """Отзыв токена: удаление из кэша и запрет до истечения exp.
+
+        Без exp срок берется из claims в кэше или из самого токена (без
+        проверки подписи); токен без exp действует бессрочно и отзывается
+        бессрочно. Нечитаемый токен не сохраняется: verify_token его не примет.
+        """
+        now = time.time()
+        self._revoked = {key: until for key, until in self._revoked.items() if until > now}
+
+        key = token_key(token)
+        entry = self._entries.pop(key, None)
+        if exp is None:
+            if entry is not None:
+                exp = entry[1].get("exp")
+            else:
+                try:
+                    exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+                except jwt.InvalidTokenError:
+                    return
+        self._revoked[key] = float(exp) if exp else math.inf
+
+    def is_revoked(self, token: str) -> bool:
+        key = token_key(token)
+        revoked_until = self._revoked.get(key)
+        if revoked_until is None:
+            return False
+        if time.time() >= revoked_until:
+            del self._revoked[key]
+            return False
+        return True
+
+    def invalidate_user(self, user_id: str) -> int:
+        """Удаление всех записей пользователя (например, после смены роли)"""
+        keys = [key for key, (_, claims) in self._entries.items() if str(claims.get("user_id")) == str(user_id)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._revoked.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revoked": len(self._revoked),
+        }
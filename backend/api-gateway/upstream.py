@@ -0,0 +1,629 @@
+"""
+@file: upstream.py
+@description: Долгоживущие пулы HTTP-соединений API Gateway к микросервисам
+@dependencies: httpx, balancer.py, breaker.py (CircuitBreaker), hedging.py, shared/log.py, shared/metrics.py, main.py (SERVICES, forward_request)
+@created: 2026-10-18
+"""
+import asyncio
+import os
+import socket
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import httpx
+
+try:
+    import h2
+except ImportError:  # h2 не установлен - только HTTP/1.1
+    h2 = None
+
+from balancer import BalancerSettings, Balancer, UpstreamInstance
+from breaker import BreakerSettings, CircuitBreaker, CircuitOpenError
+from hedging import HedgeSettings, LatencyWindow, RetryBudget, first_success
+from shared.log import get_logger
+from shared.metrics import (
+    UPSTREAM_EXTRA_ATTEMPTS,
+    UPSTREAM_IN_FLIGHT,
+    UPSTREAM_LATENCY,
+    UPSTREAM_POOL_WAIT,
+    UPSTREAM_REQUESTS,
+)
+
+# Ошибки установления соединения: запрос до сервиса не дошел, повтор безопасен
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+# Ключ расширения запроса httpx с выбранным экземпляром сервиса
+INSTANCE_EXTENSION = "tot_upstream_instance"
+# Ключ расширения: запрос занял слот HTTP/1.1 пула с http2 (экземпляр без поддержки HTTP/2)
+HTTP1_SLOT_EXTENSION = "tot_upstream_http1_slot"
+
+logger = get_logger(__name__)
+
+# Отказ в h2c: сервер HTTP/1.1 не разбирает preface HTTP/2 и отвечает не по протоколу.
+# Обрыв соединения (ReadError/WriteError) отказом не считается - это может быть сетевая ошибка
+HTTP2_FALLBACK_ERRORS = (httpx.ProtocolError,)
+
+# Пауза перед повторной проверкой h2c, если проверка не дала ответа (экземпляр недоступен)
+HTTP2_PROBE_RETRY_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    """Лимиты пула соединений одного сервиса"""
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_expiry: float
+    timeout: float
+    connect_timeout: float
+    # HTTP/2 без TLS (h2c, prior knowledge): запросы мультиплексируются в одном соединении с экземпляром
+    http2: bool = False
+    http2_max_streams: int = 100
+
+
+def _env(service_name: str, name: str, default: str) -> str:
+    """Чтение настройки пула: сначала UPSTREAM_<SERVICE>_<NAME>, затем UPSTREAM_<NAME>"""
+    return os.getenv(
+        f"UPSTREAM_{service_name.upper()}_{name}",
+        os.getenv(f"UPSTREAM_{name}", default),
+    )
+
+
+def load_pool_settings(service_name: str) -> PoolSettings:
+    """Загрузка лимитов пула для сервиса из переменных окружения"""
+    return PoolSettings(
+        max_connections=int(_env(service_name, "MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(_env(service_name, "MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(_env(service_name, "KEEPALIVE_EXPIRY", "30")),
+        timeout=float(_env(service_name, "TIMEOUT_SECONDS", "30")),
+        connect_timeout=float(_env(service_name, "CONNECT_TIMEOUT_SECONDS", "3")),
+        http2=_env(service_name, "HTTP2", "false").lower() == "true",
+        http2_max_streams=int(_env(service_name, "HTTP2_MAX_STREAMS", "100")),
+    )
+
+
+def load_breaker_settings(service_name: str) -> BreakerSettings:
+    """Загрузка порогов выключателя: UPSTREAM_<SERVICE>_BREAKER_<NAME>, затем UPSTREAM_BREAKER_<NAME>"""
+    defaults = BreakerSettings()
+    return BreakerSettings(
+        window_seconds=int(_env(service_name, "BREAKER_WINDOW_SECONDS", str(defaults.window_seconds))),
+        min_calls=int(_env(service_name, "BREAKER_MIN_CALLS", str(defaults.min_calls))),
+        failure_rate=float(_env(service_name, "BREAKER_FAILURE_RATE", str(defaults.failure_rate))),
+        slow_call_seconds=float(_env(service_name, "BREAKER_SLOW_CALL_SECONDS", str(defaults.slow_call_seconds))),
+        slow_call_rate=float(_env(service_name, "BREAKER_SLOW_CALL_RATE", str(defaults.slow_call_rate))),
+        open_seconds=float(_env(service_name, "BREAKER_OPEN_SECONDS", str(defaults.open_seconds))),
+        half_open_calls=int(_env(service_name, "BREAKER_HALF_OPEN_CALLS", str(defaults.half_open_calls))),
+    )
+
+
+def load_hedge_settings(service_name: str) -> HedgeSettings:
+    """Загрузка настроек хеджирования: UPSTREAM_<SERVICE>_HEDGE_<NAME>, затем UPSTREAM_HEDGE_<NAME>;
+    бюджет повторов - UPSTREAM_[<SERVICE>_]RETRY_BUDGET_<NAME>"""
+    defaults = HedgeSettings()
+    return HedgeSettings(
+        enabled=_env(service_name, "HEDGE_ENABLED", "true").lower() == "true",
+        percentile=float(_env(service_name, "HEDGE_PERCENTILE", str(defaults.percentile))),
+        min_samples=int(_env(service_name, "HEDGE_MIN_SAMPLES", str(defaults.min_samples))),
+        min_delay=float(_env(service_name, "HEDGE_MIN_DELAY_SECONDS", str(defaults.min_delay))),
+        max_delay=float(_env(service_name, "HEDGE_MAX_DELAY_SECONDS", str(defaults.max_delay))),
+        budget_ratio=float(_env(service_name, "RETRY_BUDGET_RATIO", str(defaults.budget_ratio))),
+        budget_min_per_second=float(_env(service_name, "RETRY_BUDGET_MIN_PER_SECOND", str(defaults.budget_min_per_second))),
+        budget_max=float(_env(service_name, "RETRY_BUDGET_MAX", str(defaults.budget_max))),
+    )
+
+
+def load_balancer_settings(service_name: str) -> BalancerSettings:
+    """Загрузка настроек балансировки: UPSTREAM_<SERVICE>_<NAME>, затем UPSTREAM_<NAME>"""
+    defaults = BalancerSettings()
+    return BalancerSettings(
+        strategy=_env(service_name, "BALANCER", defaults.strategy),
+        health_interval=float(_env(service_name, "HEALTH_CHECK_INTERVAL_SECONDS", str(defaults.health_interval))),
+        health_timeout=float(_env(service_name, "HEALTH_CHECK_TIMEOUT_SECONDS", str(defaults.health_timeout))),
+        healthy_threshold=int(_env(service_name, "HEALTHY_THRESHOLD", str(defaults.healthy_threshold))),
+        unhealthy_threshold=int(_env(service_name, "UNHEALTHY_THRESHOLD", str(defaults.unhealthy_threshold))),
+        eject_failures=int(_env(service_name, "EJECT_FAILURES", str(defaults.eject_failures))),
+        eject_seconds=float(_env(service_name, "EJECT_SECONDS", str(defaults.eject_seconds))),
+    )
+
+
+def parse_instances(urls: Union[str, Sequence[str]]) -> List[str]:
+    """Адреса экземпляров сервиса: список или строка через запятую"""
+    if isinstance(urls, str):
+        urls = urls.split(",")
+    return [url.strip().rstrip("/") for url in urls if url.strip()]
+
+
+def _request_instance(request: httpx.Request) -> Optional[UpstreamInstance]:
+    return request.extensions.get(INSTANCE_EXTENSION)
+
+
+def _error_instance(error: httpx.RequestError) -> Optional[UpstreamInstance]:
+    try:
+        return _request_instance(error.request)
+    except RuntimeError:  # ошибка не связана с запросом
+        return None
+
+
+def failed_instance_url(error: httpx.RequestError) -> Optional[str]:
+    """Адрес экземпляра, на котором произошла ошибка запроса (для журнала)"""
+    instance = _error_instance(error)
+    return instance.url if instance is not None else None
+
+
+class UpstreamPool:
+    """Пул соединений к одному сервису с учетом занятости и времени ожидания.
+
+    Клиент httpx создается лениво и привязан к event loop, в котором создан:
+    при смене loop (например, в TestClient) клиент пересоздается, а соединения
+    прежнего закрываются.
+    Сервис может состоять из нескольких экземпляров: слоты пула, выключатель
+    и бюджет повторов общие, а экземпляр для каждого запроса выбирает Balancer.
+    С http2 поддержка h2c каждого экземпляра проверяется запросом /health;
+    после ответа по HTTP/2 запросы к нему идут потоками одного соединения (не
+    больше http2_max_streams одновременно). Экземпляр, отклонивший h2c, и
+    экземпляр до проверки обслуживаются отдельным клиентом HTTP/1.1 (не
+    больше max_connections запросов одновременно), поэтому запросы не
+    приходится повторять после отказа в h2c.
+    Каждый вызов проходит через выключатель сервиса: пока он разомкнут,
+    запросы отклоняются CircuitOpenError без ожидания слота и таймаутов.
+    GET-запросы при ошибке соединения повторяются один раз, а маршруты с
+    hedge=True дублируются, если сервис не ответил за свой p95; повторы и
+    хеджи списываются из общего бюджета, чтобы не усиливать отказ сервиса.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        urls: Union[str, Sequence[str]],
+        settings: PoolSettings,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge_settings: Optional[HedgeSettings] = None,
+        balancer_settings: Optional[BalancerSettings] = None,
+    ):
+        self.name = name
+        self.settings = settings
+        self.balancer = Balancer(name, parse_instances(urls), balancer_settings or load_balancer_settings(name))
+        self.http2 = settings.http2
+        if self.http2 and h2 is None:
+            logger.warning("upstream_http2_unavailable", upstream=name, reason="h2 package is missing")
+            self.http2 = False
+        # Поддержка h2c экземпляром: подтверждена ответом по HTTP/2 или отклонена (переход на HTTP/1.1)
+        self._http2_instances: Set[str] = set()
+        self._http1_instances: Set[str] = set()
+        self._http2_probe_after: Dict[str, float] = {}
+        self._probe_lock: Optional[asyncio.Lock] = None
+        self.http2_fallbacks = 0
+        self.breaker = breaker or CircuitBreaker(name, load_breaker_settings(name))
+        self.hedge_settings = hedge_settings or load_hedge_settings(name)
+        self.latencies = LatencyWindow()
+        self.retry_budget = RetryBudget(
+            self.hedge_settings.budget_ratio,
+            self.hedge_settings.budget_min_per_second,
+            self.hedge_settings.budget_max,
+        )
+        self._retries = 0
+        self._hedges = 0
+        self._hedges_won = 0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Клиент и слоты HTTP/1.1 для экземпляров без HTTP/2 (только в пуле с http2)
+        self._http1_client: Optional[httpx.AsyncClient] = None
+        self._http1_transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._http1_slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._in_use = 0
+        self._waiting = 0
+        self._requests_total = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._loop is loop:
+            return self._client
+
+        # Клиенты прежнего event loop закрываются, иначе их соединения остаются открытыми
+        for client in self._clients():
+            _discard_client(client, self._loop)
+        self._client, self._transport = self._create_client(http2=self.http2)
+        self._http1_client = self._http1_transport = None
+        slots = self.settings.max_connections
+        if self.http2:
+            slots = self.settings.http2_max_streams * len(self.balancer.instances)
+            self._http1_slots = asyncio.Semaphore(self.settings.max_connections)
+            self._probe_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(slots)
+        self._loop = loop
+        return self._client
+
+    def _create_client(self, http2: bool) -> Tuple[httpx.AsyncClient, httpx.AsyncHTTPTransport]:
+        limits = httpx.Limits(
+            max_connections=self.settings.max_connections,
+            max_keepalive_connections=self.settings.max_keepalive_connections,
+            keepalive_expiry=self.settings.keepalive_expiry,
+        )
+        transport = httpx.AsyncHTTPTransport(limits=limits, http1=not http2, http2=http2)
+        client = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(self.settings.timeout, connect=self.settings.connect_timeout),
+        )
+        return client, transport
+
+    def _clients(self) -> List[httpx.AsyncClient]:
+        return [client for client in (self._client, self._http1_client) if client is not None]
+
+    def _ensure_http1_client(self) -> httpx.AsyncClient:
+        if self._http1_client is None:
+            self._http1_client, self._http1_transport = self._create_client(http2=False)
+        return self._http1_client
+
+    def _uses_http1_slot(self, instance: UpstreamInstance) -> bool:
+        """Запрос к экземпляру идет через клиент HTTP/1.1 пула с http2: h2c не подтвержден"""
+        return self.http2 and instance.url not in self._http2_instances
+
+    def _needs_http2_probe(self, url: str) -> bool:
+        if url in self._http2_instances or url in self._http1_instances:
+            return False
+        return time.monotonic() >= self._http2_probe_after.get(url, 0.0)
+
+    async def _probe_http2(self, instance: UpstreamInstance) -> None:
+        """Проверка h2c экземпляра запросом GET /health до отправки ему запросов по HTTP/2.
+
+        Запросы клиентов по неподтвержденному h2c не отправляются: отказ
+        сервера HTTP/1.1 может прийти и ошибкой записи, после которой нельзя
+        понять, принят ли запрос. Проверка не дала ответа - экземпляр
+        обслуживается по HTTP/1.1 и проверяется снова через HTTP2_PROBE_RETRY_SECONDS.
+        """
+        if not self._needs_http2_probe(instance.url):
+            return
+        async with self._probe_lock:
+            url = instance.url
+            if not self._needs_http2_probe(url):
+                return
+            try:
+                response = await self._client.get(f"{url}/health", timeout=self.balancer.settings.health_timeout)
+            except HTTP2_FALLBACK_ERRORS:
+                logger.warning("upstream_http2_fallback", upstream=self.name, instance=url)
+                self._http1_instances.add(url)
+                self.http2_fallbacks += 1
+            except httpx.HTTPError:
+                self._http2_probe_after[url] = time.monotonic() + HTTP2_PROBE_RETRY_SECONDS
+            else:
+                if response.http_version == "HTTP/2":
+                    self._http2_instances.add(url)
+
+    def _health_client(self, instance: UpstreamInstance) -> httpx.AsyncClient:
+        """Клиент проверки /health: HTTP/2 - только для экземпляров, ответивших по HTTP/2"""
+        client = self._ensure_client()
+        if self._uses_http1_slot(instance):
+            return self._ensure_http1_client()
+        return client
+
+    async def _acquire(self) -> None:
+        """Ожидание свободного слота пула с замером времени ожидания"""
+        started = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        waited = time.perf_counter() - started
+        UPSTREAM_POOL_WAIT.labels(self.name).observe(waited)
+        UPSTREAM_IN_FLIGHT.labels(self.name).inc()
+        self._in_use += 1
+        self._requests_total += 1
+        self._wait_time_total += waited
+        self._wait_time_max = max(self._wait_time_max, waited)
+
+    def _release(self, instance: Optional[UpstreamInstance] = None, http1_slot: bool = False) -> None:
+        if instance is not None:
+            instance.outstanding -= 1
+        if http1_slot:
+            self._http1_slots.release()
+        UPSTREAM_IN_FLIGHT.labels(self.name).dec()
+        self._in_use -= 1
+        self._semaphore.release()
+
+    def _release_request(self, request: httpx.Request) -> None:
+        """Освобождение слотов запроса, получившего ответ"""
+        self._release(_request_instance(request), request.extensions.get(HTTP1_SLOT_EXTENSION, False))
+
+    async def _send(
+        self, method: str, path: str, stream: bool, avoid: Optional[UpstreamInstance] = None, **kwargs
+    ) -> httpx.Response:
+        """Захват слота и отправка запроса с учетом результата в выключателе.
+
+        Разомкнутый выключатель отклоняет запрос до ожидания слота. Ошибкой
+        считаются сетевые ошибки и ответы 5xx, медленным - ответ, заголовки
+        которого пришли позже порога выключателя. При успехе слот остается занятым.
+        Экземпляр выбирается после захвата слота, по текущей загрузке экземпляров.
+        """
+        client = self._ensure_client()
+        try:
+            probe = self.breaker.before_call()
+        except CircuitOpenError:
+            UPSTREAM_REQUESTS.labels(self.name, method, "rejected").inc()
+            raise
+        try:
+            await self._acquire()
+        except BaseException:
+            self.breaker.cancel(probe)
+            raise
+
+        instance = self.balancer.pick(avoid)
+        instance.outstanding += 1
+        http1_slot = False
+        if self.http2:
+            try:
+                await self._probe_http2(instance)
+                # Экземпляр без HTTP/2: клиент HTTP/1.1, не больше max_connections запросов (по числу соединений)
+                http1_slot = self._uses_http1_slot(instance)
+                if http1_slot:
+                    await self._http1_slots.acquire()
+            except BaseException:
+                self._release(instance)
+                self.breaker.cancel(probe)
+                raise
+        client = self._ensure_http1_client() if http1_slot else self._client
+        request = client.build_request(method, instance.url + path, **kwargs)
+        request.extensions[INSTANCE_EXTENSION] = instance
+        request.extensions[HTTP1_SLOT_EXTENSION] = http1_slot
+        started = time.perf_counter()
+        try:
+            response = await client.send(request, stream=stream)
+        except httpx.RequestError as exc:
+            self._release(instance, http1_slot)
+            latency = time.perf_counter() - started
+            self.breaker.record(probe, failed=True, latency=latency)
+            self.balancer.record(instance, failed=True, latency=None)
+            UPSTREAM_REQUESTS.labels(self.name, method, "error").inc()
+            UPSTREAM_LATENCY.labels(self.name, method).observe(latency)
+            raise
+        except BaseException:
+            self._release(instance, http1_slot)
+            self.breaker.cancel(probe)
+            raise
+        latency = time.perf_counter() - started
+        self.breaker.record(probe, failed=response.status_code >= 500, latency=latency)
+        self.balancer.record(instance, failed=response.status_code >= 500, latency=latency)
+        if response.status_code < 500:
+            self.latencies.add(latency)
+        UPSTREAM_REQUESTS.labels(self.name, method, str(response.status_code)).inc()
+        UPSTREAM_LATENCY.labels(self.name, method).observe(latency)
+        return response
+
+    async def _send_with_retry(self, method: str, path: str, stream: bool, **kwargs) -> httpx.Response:
+        """Отправка с одним повтором GET при ошибке соединения, если позволяет бюджет"""
+        if method != "GET":
+            return await self._send(method, path, stream=stream, **kwargs)
+        try:
+            return await self._send(method, path, stream=stream, **kwargs)
+        except RETRYABLE_ERRORS as error:
+            if not self.retry_budget.withdraw():
+                raise
+            failed = _error_instance(error)
+        self._retries += 1
+        UPSTREAM_EXTRA_ATTEMPTS.labels(self.name, "retry").inc()
+        # Повтор уходит на другой экземпляр, если он есть
+        return await self._send(method, path, stream=stream, avoid=failed, **kwargs)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Задержка перед хеджем; None - хеджирование выключено или мало замеров"""
+        settings = self.hedge_settings
+        if not settings.enabled or len(self.latencies) < settings.min_samples:
+            return None
+        delay = self.latencies.percentile(settings.percentile)
+        return min(max(delay, settings.min_delay), settings.max_delay)
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Выполнение запроса к сервису через общий пул"""
+        self.retry_budget.deposit()
+        response = await self._send_with_retry(method, path, stream=False, **kwargs)
+        self._release_request(response.request)
+        return response
+
+    async def open_stream(self, method: str, path: str, hedge: bool = False, **kwargs) -> "UpstreamStream":
+        """Отправка запроса без чтения тела ответа.
+
+        Слот пула остается занятым, пока поток не будет закрыт.
+        hedge=True разрешает второй запрос для идемпотентного GET.
+        """
+        self.retry_budget.deposit()
+        delay = self.hedge_delay() if hedge and method == "GET" else None
+        if delay is None:
+            response = await self._send_with_retry(method, path, stream=True, **kwargs)
+            return UpstreamStream(self, response)
+        return await self._hedged_stream(path, delay, **kwargs)
+
+    async def _hedged_stream(self, path: str, delay: float, **kwargs) -> "UpstreamStream":
+        """GET с хеджем: если первый запрос не ответил за delay, отправляется второй.
+
+        Используется ответ, пришедший первым; другой запрос отменяется, а
+        если он уже получил заголовки - его поток закрывается и слот освобождается.
+        """
+        async def attempt() -> UpstreamStream:
+            return UpstreamStream(self, await self._send_with_retry("GET", path, stream=True, **kwargs))
+
+        attempts = [asyncio.ensure_future(attempt())]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+        except BaseException:
+            attempts[0].cancel()
+            raise
+        if done or not self.retry_budget.withdraw():
+            return await attempts[0]
+
+        self._hedges += 1
+        UPSTREAM_EXTRA_ATTEMPTS.labels(self.name, "hedge").inc()
+        attempts.append(asyncio.ensure_future(attempt()))
+        stream, index = await first_success(attempts, lambda loser: loser.aclose())
+        if index > 0:
+            self._hedges_won += 1
+        return stream
+
+    def stats(self) -> dict:
+        """Текущее состояние пула"""
+        connections = [
+            connection
+            for transport in (self._transport, self._http1_transport)
+            for connection in getattr(getattr(transport, "_pool", None), "connections", [])
+        ]
+        idle = sum(1 for connection in connections if connection.is_idle())
+        avg_wait = self._wait_time_total / self._requests_total if self._requests_total else 0.0
+        instances = self.balancer.stats()
+        for instance in instances:
+            instance["http_version"] = "HTTP/2" if instance["url"] in self._http2_instances else "HTTP/1.1"
+        return {
+            "instances": instances,
+            # HTTP/2 - хотя бы один экземпляр подтвердил h2c
+            "http_version": "HTTP/2" if any(item["http_version"] == "HTTP/2" for item in instances) else "HTTP/1.1",
+            "http2_fallbacks": self.http2_fallbacks,
+            "max_connections": self.settings.max_connections,
+            "max_keepalive_connections": self.settings.max_keepalive_connections,
+            "in_use": self._in_use,
+            "idle": idle,
+            "open_connections": len(connections),
+            "waiting": self._waiting,
+            "requests_total": self._requests_total,
+            "wait_time_avg_ms": round(avg_wait * 1000, 3),
+            "wait_time_max_ms": round(self._wait_time_max * 1000, 3),
+            "hedging": self.hedging_stats(),
+        }
+
+    def hedging_stats(self) -> dict:
+        delay = self.hedge_delay()
+        return {
+            "enabled": self.hedge_settings.enabled,
+            "hedge_delay_ms": round(delay * 1000, 3) if delay is not None else None,
+            "latency_samples": len(self.latencies),
+            "hedges": self._hedges,
+            "hedges_won": self._hedges_won,
+            "retries": self._retries,
+            "budget_tokens": round(self.retry_budget.tokens, 3),
+            "budget_exhausted": self.retry_budget.exhausted,
+        }
+
+    def reset_hedging(self) -> None:
+        """Сброс замеров задержки, бюджета и счетчиков (тесты, смена конфигурации)"""
+        self.latencies.clear()
+        self.retry_budget.reset()
+        self._retries = 0
+        self._hedges = 0
+        self._hedges_won = 0
+
+    async def run_health_checks(self) -> None:
+        """Периодическая проверка /health экземпляров сервиса"""
+        while True:
+            await self.balancer.check_health(self._health_client)
+            await asyncio.sleep(self.balancer.settings.health_interval)
+
+    async def aclose(self) -> None:
+        same_loop = self._loop is asyncio.get_running_loop()
+        for client in self._clients():
+            if same_loop:
+                await client.aclose()
+            else:
+                _discard_client(client, self._loop)
+        self._client = self._http1_client = None
+        self._transport = self._http1_transport = None
+        self._loop = None
+
+
+def _discard_client(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Закрытие клиента, созданного в другом event loop.
+
+    Если тот loop еще работает (в другом потоке), клиент закрывается в нем.
+    Иначе aclose невозможен (транспорт привязан к остановленному loop):
+    TCP-соединения разрываются напрямую, сокеты освобождаются вместе с клиентом.
+    """
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        return
+    transport = getattr(client, "_transport", None)
+    for connection in getattr(getattr(transport, "_pool", None), "connections", []):
+        stream = getattr(getattr(connection, "_connection", None), "_network_stream", None)
+        sock = stream.get_extra_info("socket") if stream is not None else None
+        if sock is None:
+            continue
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class UpstreamStream:
+    """Открытый потоковый ответ сервиса, удерживающий слот пула до закрытия"""
+
+    def __init__(self, pool: UpstreamPool, response: httpx.Response):
+        self.pool = pool
+        self.response = response
+        self._closed = False
+
+    @property
+    def status_code(self) -> int:
+        return self.response.status_code
+
+    @property
+    def headers(self) -> httpx.Headers:
+        return self.response.headers
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """Сырые байты тела без декодирования и распаковки"""
+        try:
+            async for chunk in self.response.aiter_raw():
+                yield chunk
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self.response.aclose()
+        finally:
+            self.pool._release_request(self.response.request)
+
+
+class UpstreamRegistry:
+    """Набор пулов: по одному на каждую запись SERVICES"""
+
+    def __init__(self, services: Dict[str, Union[str, Sequence[str]]]):
+        self._pools = {
+            name: UpstreamPool(name, urls, load_pool_settings(name))
+            for name, urls in services.items()
+        }
+        self._health_tasks: List[asyncio.Task] = []
+
+    def __contains__(self, service_name: str) -> bool:
+        return service_name in self._pools
+
+    def get(self, service_name: str) -> UpstreamPool:
+        return self._pools[service_name]
+
+    async def start(self) -> None:
+        """Создание клиентов и запуск проверок здоровья при старте приложения.
+
+        Проверки запускаются только для сервисов из нескольких экземпляров:
+        единственный экземпляр все равно получает весь трафик.
+        """
+        for pool in self._pools.values():
+            pool._ensure_client()
+            if len(pool.balancer.instances) > 1:
+                self._health_tasks.append(asyncio.create_task(pool.run_health_checks()))
+
+    async def close(self) -> None:
+        """Остановка проверок здоровья и закрытие всех соединений при остановке приложения"""
+        for task in self._health_tasks:
+            task.cancel()
+        await asyncio.gather(*self._health_tasks, return_exceptions=True)
+        self._health_tasks = []
+        for pool in self._pools.values():
+            await pool.aclose()
+
+    def stats(self) -> Dict[str, dict]:
+        return {name: pool.stats() for name, pool in self._pools.items()}
+
+    def breaker_stats(self) -> Dict[str, dict]:
+        return {name: pool.breaker.stats() for name, pool in self._pools.items()}
@@ -1,27 +1,45 @@
 from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
 import os
 from datetime import datetime, timedelta
 from typing import Optional, List
-import logging
 from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text, Float, ForeignKey
+from sqlalchemy import select, func, Column, Integer, String, Boolean, DateTime, Text, Float, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import relationship
 import uuid
 import json
 from fastapi import Request
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+import sys
+
+# Общий пакет backend/shared
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.db import Database
+from shared.log import get_logger, setup_logging
+from shared.metrics import setup_metrics
+from shared.responses import FastJSONResponse
+
+logger = get_logger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Создание таблиц при старте и закрытие соединений с БД при остановке"""
+    await database.create_all(Base.metadata)
+    yield
+    await database.dispose()
 
 app = FastAPI(
     title="ТОТ Booking Service",
     description="Сервис управления заказами вызовов врачей",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
+setup_metrics(app)
+setup_logging(app, "booking-service")
 
 # Настройка CORS
 app.add_middleware(
@@ -34,8 +52,7 @@ app.add_middleware(
 
 # База данных
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tot_mvp.db")
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+database = Database(DATABASE_URL)
 Base = declarative_base()
 
 # Модели данных
@@ -110,9 +127,6 @@ class BookingStatusUpdate(Base):
     
     booking = relationship("Booking", back_populates="status_updates")
 
-# Создание таблиц
-Base.metadata.create_all(bind=engine)
-
 # Pydantic модели
 class BookingCreate(BaseModel):
     call_type: str
@@ -174,14 +188,6 @@ class MessageResponse(BaseModel):
     content: str
     created_at: datetime
 
-# Функции для работы с базой данных
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def get_user_from_header(request):
     """Получение информации о пользователе из заголовков"""
     user_id = request.headers.get("X-User-ID")
@@ -200,7 +206,7 @@ def get_user_from_header(request):
 async def create_booking(
     booking_data: BookingCreate,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(database.session)
 ):
     """Создание нового заказа вызова врача"""
     
@@ -222,8 +228,8 @@ async def create_booking(
     )
     
     db.add(booking)
-    db.commit()
-    db.refresh(booking)
+    await db.commit()
+    await db.refresh(booking)
     
     # Создание записи о статусе
     status_update = BookingStatusUpdate(
@@ -233,9 +239,9 @@ async def create_booking(
         reason="Booking created"
     )
     db.add(status_update)
-    db.commit()
+    await db.commit()
     
-    return BookingResponse(
+    return FastJSONResponse(BookingResponse(
         id=booking.id,
         patient_id=booking.patient_id,
         doctor_id=booking.doctor_id,
@@ -261,25 +267,32 @@ async def create_booking(
         final_price=booking.final_price,
         is_emergency=booking.is_emergency,
         emergency_type=booking.emergency_type
-    )
+    ))
 
 @app.get("/bookings/count")
-async def get_bookings_count(db: Session = Depends(get_db)):
+async def get_bookings_count(db: AsyncSession = Depends(database.session)):
     """Получение количества заказов (без аутентификации для статистики)"""
-    count = db.query(Booking).count()
+    count = await db.scalar(select(func.count()).select_from(Booking))
     return {"count": count}
 
+@app.get("/bookings/stats")
+async def get_bookings_stats(db: AsyncSession = Depends(database.session)):
+    """Количество заказов по статусам одним запросом (без аутентификации для статистики)"""
+    rows = (await db.execute(select(Booking.status, func.count(Booking.id)).group_by(Booking.status))).all()
+    by_status = {booking_status: count for booking_status, count in rows}
+    return {"total": sum(by_status.values()), "by_status": by_status}
+
 @app.get("/bookings/{booking_id}", response_model=BookingResponse)
 async def get_booking(
     booking_id: str,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(database.session)
 ):
     """Получение информации о заказе"""
     
     user_info = get_user_from_header(request)
     
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.scalar(select(Booking).where(Booking.id == booking_id).limit(1))
     if not booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -295,7 +308,7 @@ async def get_booking(
             detail="Access denied"
         )
     
-    return BookingResponse(
+    return FastJSONResponse(BookingResponse(
         id=booking.id,
         patient_id=booking.patient_id,
         doctor_id=booking.doctor_id,
@@ -321,7 +334,7 @@ async def get_booking(
         final_price=booking.final_price,
         is_emergency=booking.is_emergency,
         emergency_type=booking.emergency_type
-    )
+    ))
 
 @app.get("/bookings", response_model=List[BookingResponse])
 async def get_user_bookings(
@@ -329,19 +342,19 @@ async def get_user_bookings(
     status_filter: Optional[str] = None,
     limit: int = 50,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(database.session)
 ):
     """Получение списка заказов пользователя"""
     
     user_info = get_user_from_header(request)
     
-    query = db.query(Booking)
+    query = select(Booking)
     
     # Фильтрация по пользователю
     if user_info["role"] == "doctor":
-        query = query.filter(Booking.doctor_id == user_info["user_id"])
+        query = query.where(Booking.doctor_id == user_info["user_id"])
     elif user_info["role"] == "patient":
-        query = query.filter(Booking.patient_id == user_info["user_id"])
+        query = query.where(Booking.patient_id == user_info["user_id"])
     elif user_info["role"] != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -350,12 +363,12 @@ async def get_user_bookings(
     
     # Фильтрация по статусу
     if status_filter:
-        query = query.filter(Booking.status == status_filter)
+        query = query.where(Booking.status == status_filter)
     
     # Сортировка и пагинация
-    bookings = query.order_by(Booking.created_at.desc()).offset(offset).limit(limit).all()
+    bookings = (await db.scalars(query.order_by(Booking.created_at.desc()).offset(offset).limit(limit))).all()
     
-    return [
+    return FastJSONResponse([
         BookingResponse(
             id=booking.id,
             patient_id=booking.patient_id,
@@ -384,20 +397,20 @@ async def get_user_bookings(
             emergency_type=booking.emergency_type
         )
         for booking in bookings
-    ]
+    ])
 
 @app.put("/bookings/{booking_id}/cancel")
 async def cancel_booking(
     booking_id: str,
     request: Request,
     reason: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(database.session)
 ):
     """Отмена заказа"""
     
     user_info = get_user_from_header(request)
     
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.scalar(select(Booking).where(Booking.id == booking_id).limit(1))
     if not booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -436,7 +449,7 @@ async def cancel_booking(
     )
     
     db.add(status_update)
-    db.commit()
+    await db.commit()
     
     return {"message": "Booking cancelled successfully"}
 
@@ -445,7 +458,7 @@ async def assign_doctor(
     booking_id: str,
     doctor_id: str,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(database.session)
 ):
     """Назначение врача к заказу"""
     
@@ -458,7 +471,7 @@ async def assign_doctor(
             detail="Access denied"
         )
     
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.scalar(select(Booking).where(Booking.id == booking_id).limit(1))
     if not booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -488,7 +501,7 @@ async def assign_doctor(
     )
     
     db.add(status_update)
-    db.commit()
+    await db.commit()
     
     return {"message": "Doctor assigned successfully"}
 
@@ -496,13 +509,13 @@ async def assign_doctor(
 async def start_booking(
     booking_id: str,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(database.session)
 ):
     """Начало выполнения заказа"""
     
     user_info = get_user_from_header(request)
     
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.scalar(select(Booking).where(Booking.id == booking_id).limit(1))
     if not booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -538,7 +551,7 @@ async def start_booking(
     )
     
     db.add(status_update)
-    db.commit()
+    await db.commit()
     
     return {"message": "Booking started successfully"}
 
@@ -547,13 +560,13 @@ async def complete_booking(
     booking_id: str,
     booking_data: BookingUpdate,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(database.session)
 ):
     """Завершение заказа"""
     
     user_info = get_user_from_header(request)
     
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.scalar(select(Booking).where(Booking.id == booking_id).limit(1))
     if not booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -596,7 +609,7 @@ async def complete_booking(
     )
     
     db.add(status_update)
-    db.commit()
+    await db.commit()
     
     return {"message": "Booking completed successfully"}
 
@@ -605,13 +618,13 @@ async def send_message(
     booking_id: str,
     message_data: MessageCreate,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(database.session)
 ):
     """Отправка сообщения в заказе"""
     
     user_info = get_user_from_header(request)
     
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.scalar(select(Booking).where(Booking.id == booking_id).limit(1))
     if not booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -637,10 +650,10 @@ async def send_message(
     )
     
     db.add(message)
-    db.commit()
-    db.refresh(message)
+    await db.commit()
+    await db.refresh(message)
     
-    return MessageResponse(
+    return FastJSONResponse(MessageResponse(
         id=message.id,
         booking_id=message.booking_id,
         sender_id=message.sender_id,
@@ -648,7 +661,7 @@ async def send_message(
         message_type=message.message_type,
         content=message.content,
         created_at=message.created_at
-    )
+    ))
 
 @app.get("/bookings/{booking_id}/messages", response_model=List[MessageResponse])
 async def get_messages(
@@ -656,13 +669,13 @@ async def get_messages(
     request: Request,
     limit: int = 50,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(database.session)
 ):
     """Получение сообщений заказа"""
     
     user_info = get_user_from_header(request)
     
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.scalar(select(Booking).where(Booking.id == booking_id).limit(1))
     if not booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -678,11 +691,11 @@ async def get_messages(
             detail="Access denied"
         )
     
-    messages = db.query(BookingMessage).filter(
+    messages = (await db.scalars(select(BookingMessage).where(
         BookingMessage.booking_id == booking_id
-    ).order_by(BookingMessage.created_at.desc()).offset(offset).limit(limit).all()
+    ).order_by(BookingMessage.created_at.desc()).offset(offset).limit(limit))).all()
     
-    return [
+    return FastJSONResponse([
         MessageResponse(
             id=message.id,
             booking_id=message.booking_id,
@@ -693,7 +706,7 @@ async def get_messages(
             created_at=message.created_at
         )
         for message in messages
-    ]
+    ])
 
 @app.get("/health")
 async def health_check():
@@ -705,9 +718,6 @@ async def health_check():
     }
 
 if __name__ == "__main__":
-    # Создаем таблицы
-    Base.metadata.create_all(bind=engine)
-    
     import uvicorn
     uvicorn.run(
         app,
@@ -1,7 +1,8 @@
-from fastapi import FastAPI, HTTPException, Depends, Header
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from sqlalchemy import select, Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from typing import Optional, List, Literal
 from datetime import datetime
@@ -18,6 +19,15 @@ import qrcode
 from io import BytesIO
 import base64
 
+import sys
+
+# Общий пакет backend/shared
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.db import Database
+from shared.log import setup_logging
+from shared.metrics import setup_metrics
+from shared.responses import FastJSONResponse
+
 # Импорты для ЮKassa
 try:
     from yookassa import Payment as YooKassaPayment
@@ -28,12 +38,20 @@ except ImportError:
 
 load_dotenv()
 
-app = FastAPI(title="Payment Service", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Создание таблиц при старте и закрытие соединений с БД при остановке"""
+    await database.create_all(Base.metadata)
+    yield
+    await database.dispose()
+
+app = FastAPI(title="Payment Service", version="1.0.0", default_response_class=FastJSONResponse, lifespan=lifespan)
+setup_metrics(app)
+setup_logging(app, "payment-service")
 
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tot_mvp.db")
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+database = Database(DATABASE_URL)
 Base = declarative_base()
 
 # Настройки платежных систем
@@ -57,7 +75,8 @@ class Payment(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, index=True)
-    booking_id = Column(Integer, index=True)
+    # UUID заказа Booking Service; в БД, созданной с INTEGER, тип меняется вручную (docs/DEPLOYMENT.md)
+    booking_id = Column(String, index=True)
     amount = Column(Float)
     currency = Column(String(3), default="RUB")
     payment_method = Column(String(50))  # yookassa, sbp, wallet
@@ -94,7 +113,7 @@ class Transaction(Base):
 # Pydantic models
 class PaymentBase(BaseModel):
     user_id: int
-    booking_id: Optional[int] = None
+    booking_id: Optional[str] = None
     amount: float
     currency: str = "RUB"
     payment_method: Literal["yookassa", "sbp", "wallet"]
@@ -186,14 +205,6 @@ class YooKassaPaymentResponse(BaseModel):
     description: str
     metadata: Optional[dict] = None
 
-# Database dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Auth dependency
 def get_user_from_header(authorization: str = Header(None)):
     if not authorization:
@@ -207,6 +218,13 @@ def get_user_from_header(authorization: str = Header(None)):
     except:
         raise HTTPException(status_code=401, detail="Invalid authorization header")
 
+def get_user_from_gateway(request: Request) -> dict:
+    """Пользователь запроса, проксированного API Gateway (заголовки X-User-ID и X-User-Role)"""
+    user_id = request.headers.get("X-User-ID")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="User ID not provided")
+    return {"user_id": user_id, "role": request.headers.get("X-User-Role")}
+
 # СБП интеграция
 class SBPIntegration:
     def __init__(self):
@@ -298,7 +316,7 @@ async def health_check():
     return {"status": "healthy", "service": "payment-service"}
 
 @app.post("/payments/", response_model=PaymentResponse)
-async def create_payment(payment: PaymentCreate, db: Session = Depends(get_db)):
+async def create_payment(payment: PaymentCreate, db: AsyncSession = Depends(database.session)):
     """Создает новый платеж"""
     # Генерируем уникальный transaction_id
     transaction_id = str(uuid.uuid4())
@@ -316,8 +334,8 @@ async def create_payment(payment: PaymentCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_payment)
-    db.commit()
-    db.refresh(db_payment)
+    await db.commit()
+    await db.refresh(db_payment)
     
     # Обрабатываем платеж в зависимости от метода
     if payment.payment_method == "yookassa":
@@ -333,11 +351,11 @@ async def create_payment(payment: PaymentCreate, db: Session = Depends(get_db)):
             db_payment.payment_provider = "yookassa"
             db_payment.provider_payment_id = yookassa_payment.id
             db_payment.payment_metadata = json.dumps(yookassa_payment.dict())
-            db.commit()
+            await db.commit()
             
         except Exception as e:
             db_payment.status = "failed"
-            db.commit()
+            await db.commit()
             raise HTTPException(status_code=500, detail=f"Ошибка создания платежа ЮKassa: {str(e)}")
     
     elif payment.payment_method == "sbp":
@@ -352,30 +370,30 @@ async def create_payment(payment: PaymentCreate, db: Session = Depends(get_db)):
             # Обновляем запись с данными СБП
             db_payment.payment_provider = "sbp"
             db_payment.payment_metadata = json.dumps(qr_code.dict())
-            db.commit()
+            await db.commit()
             
         except Exception as e:
             db_payment.status = "failed"
-            db.commit()
+            await db.commit()
             raise HTTPException(status_code=500, detail=f"Ошибка создания платежа СБП: {str(e)}")
     
     elif payment.payment_method == "wallet":
         # Проверяем баланс кошелька
-        wallet = db.query(Wallet).filter(Wallet.user_id == payment.user_id).first()
+        wallet = await db.scalar(select(Wallet).where(Wallet.user_id == payment.user_id).limit(1))
         if not wallet or wallet.balance < payment.amount:
             raise HTTPException(status_code=400, detail="Недостаточно средств в кошельке")
         
         # Списываем средства
         wallet.balance -= payment.amount
         db_payment.status = "completed"
-        db.commit()
+        await db.commit()
     
     return db_payment
 
 @app.get("/payments/{payment_id}", response_model=PaymentResponse)
-async def get_payment(payment_id: int, db: Session = Depends(get_db)):
+async def get_payment(payment_id: int, db: AsyncSession = Depends(database.session)):
     """Получает информацию о платеже"""
-    payment = db.query(Payment).filter(Payment.id == payment_id).first()
+    payment = await db.scalar(select(Payment).where(Payment.id == payment_id).limit(1))
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     return payment
@@ -384,10 +402,10 @@ async def get_payment(payment_id: int, db: Session = Depends(get_db)):
 async def update_payment(
     payment_id: int, 
     payment_update: PaymentUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(database.session)
 ):
     """Обновляет статус платежа"""
-    payment = db.query(Payment).filter(Payment.id == payment_id).first()
+    payment = await db.scalar(select(Payment).where(Payment.id == payment_id).limit(1))
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     
@@ -398,40 +416,53 @@ async def update_payment(
             setattr(payment, field, value)
     
     payment.updated_at = datetime.utcnow()  # pyright: ignore[reportAttributeAccessIssue]
-    db.commit()
-    db.refresh(payment)
+    await db.commit()
+    await db.refresh(payment)
     return payment
 
 @app.get("/payments/user/{user_id}", response_model=List[PaymentResponse])
 async def get_user_payments(
     user_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(database.session),
     current_user_id: int = Depends(get_user_from_header)
 ):
     """Получает все платежи пользователя"""
     if user_id != current_user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    payments = db.query(Payment).filter(Payment.user_id == user_id).all()
+    payments = (await db.scalars(select(Payment).where(Payment.user_id == user_id))).all()
     return payments
 
+@app.get("/payments/booking/{booking_id}", response_model=List[PaymentResponse])
+async def get_booking_payments(
+    booking_id: str,
+    db: AsyncSession = Depends(database.session),
+    current_user: dict = Depends(get_user_from_gateway)
+):
+    """Получает платежи пользователя по заказу (администратор - все платежи заказа)"""
+    query = select(Payment).where(Payment.booking_id == booking_id)
+    if current_user["role"] != "admin":
+        # ID пользователя из шлюза - строка (UUID), в платежах - целое число: сравнение как строк
+        query = query.where(Payment.user_id.cast(String) == current_user["user_id"])
+    return (await db.scalars(query.order_by(Payment.created_at))).all()
+
 @app.post("/payments/{payment_id}/complete")
-async def complete_payment(payment_id: int, db: Session = Depends(get_db)):
+async def complete_payment(payment_id: int, db: AsyncSession = Depends(database.session)):
     """Завершает платеж (webhook от платежных систем)"""
-    payment = db.query(Payment).filter(Payment.id == payment_id).first()
+    payment = await db.scalar(select(Payment).where(Payment.id == payment_id).limit(1))
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     
     payment.status = "completed"
     payment.updated_at = datetime.utcnow()  # pyright: ignore[reportAttributeAccessIssue]
-    db.commit()
+    await db.commit()
     
     return {"status": "completed", "payment_id": payment_id}
 
 @app.post("/payments/{payment_id}/refund")
-async def refund_payment(payment_id: int, db: Session = Depends(get_db)):
+async def refund_payment(payment_id: int, db: AsyncSession = Depends(database.session)):
     """Возвращает платеж"""
-    payment = db.query(Payment).filter(Payment.id == payment_id).first()
+    payment = await db.scalar(select(Payment).where(Payment.id == payment_id).limit(1))
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     
@@ -440,36 +471,36 @@ async def refund_payment(payment_id: int, db: Session = Depends(get_db)):
     
     payment.status = "refunded"
     payment.updated_at = datetime.utcnow()  # pyright: ignore[reportAttributeAccessIssue]
-    db.commit()
+    await db.commit()
     
     return {"status": "refunded", "payment_id": payment_id}
 
 # Wallet endpoints
 @app.post("/wallets/", response_model=WalletResponse)
-async def create_wallet(wallet: WalletCreate, db: Session = Depends(get_db)):
+async def create_wallet(wallet: WalletCreate, db: AsyncSession = Depends(database.session)):
     """Создает кошелек для пользователя"""
     # Проверяем, не существует ли уже кошелек для этого пользователя
-    existing_wallet = db.query(Wallet).filter(Wallet.user_id == wallet.user_id).first()
+    existing_wallet = await db.scalar(select(Wallet).where(Wallet.user_id == wallet.user_id).limit(1))
     if existing_wallet:
         raise HTTPException(status_code=400, detail="Wallet already exists for this user")
     
     db_wallet = Wallet(**wallet.dict())
     db.add(db_wallet)
-    db.commit()
-    db.refresh(db_wallet)
+    await db.commit()
+    await db.refresh(db_wallet)
     return db_wallet
 
 @app.get("/wallets/{user_id}", response_model=WalletResponse)
 async def get_wallet(
     user_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(database.session),
     current_user_id: int = Depends(get_user_from_header)
 ):
     """Получает кошелек пользователя"""
     if user_id != current_user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
+    wallet = await db.scalar(select(Wallet).where(Wallet.user_id == user_id).limit(1))
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
     return wallet
@@ -478,14 +509,14 @@ async def get_wallet(
 async def update_wallet(
     user_id: int, 
     wallet_update: WalletUpdate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(database.session),
     current_user_id: int = Depends(get_user_from_header)
 ):
     """Обновляет кошелек пользователя"""
     if user_id != current_user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
+    wallet = await db.scalar(select(Wallet).where(Wallet.user_id == user_id).limit(1))
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
     
@@ -493,15 +524,15 @@ async def update_wallet(
         setattr(wallet, field, value)
     
     wallet.updated_at = datetime.utcnow()  # pyright: ignore[reportAttributeAccessIssue]
-    db.commit()
-    db.refresh(wallet)
+    await db.commit()
+    await db.refresh(wallet)
     return wallet
 
 @app.post("/wallets/{user_id}/deposit")
 async def deposit_to_wallet(
     user_id: int, 
     amount: float, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(database.session),
     current_user_id: int = Depends(get_user_from_header)
 ):
     """Пополняет кошелек пользователя"""
@@ -511,7 +542,7 @@ async def deposit_to_wallet(
     if amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
     
-    wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
+    wallet = await db.scalar(select(Wallet).where(Wallet.user_id == user_id).limit(1))
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
     
@@ -526,7 +557,7 @@ async def deposit_to_wallet(
         description=f"Пополнение кошелька на {amount} RUB"
     )
     db.add(transaction)
-    db.commit()
+    await db.commit()
     
     return {"status": "success", "new_balance": wallet.balance}
 
@@ -534,7 +565,7 @@ async def deposit_to_wallet(
 async def withdraw_from_wallet(
     user_id: int, 
     amount: float, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(database.session),
     current_user_id: int = Depends(get_user_from_header)
 ):
     """Списывает средства с кошелька пользователя"""
@@ -544,7 +575,7 @@ async def withdraw_from_wallet(
     if amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
     
-    wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
+    wallet = await db.scalar(select(Wallet).where(Wallet.user_id == user_id).limit(1))
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
     
@@ -562,32 +593,32 @@ async def withdraw_from_wallet(
         description=f"Списание с кошелька {amount} RUB"
     )
     db.add(transaction)
-    db.commit()
+    await db.commit()
     
     return {"status": "success", "new_balance": wallet.balance}
 
 # Transaction endpoints
 @app.get("/transactions/wallet/{wallet_id}", response_model=List[TransactionResponse])
-async def get_wallet_transactions(wallet_id: int, db: Session = Depends(get_db)):
+async def get_wallet_transactions(wallet_id: int, db: AsyncSession = Depends(database.session)):
     """Получает транзакции кошелька"""
-    transactions = db.query(Transaction).filter(Transaction.wallet_id == wallet_id).all()
+    transactions = (await db.scalars(select(Transaction).where(Transaction.wallet_id == wallet_id))).all()
     return transactions
 
 @app.get("/transactions/user/{user_id}", response_model=List[TransactionResponse])
 async def get_user_transactions(
     user_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(database.session),
     current_user_id: int = Depends(get_user_from_header)
 ):
     """Получает все транзакции пользователя"""
     if user_id != current_user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
+    wallet = await db.scalar(select(Wallet).where(Wallet.user_id == user_id).limit(1))
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
     
-    transactions = db.query(Transaction).filter(Transaction.wallet_id == wallet.id).all()
+    transactions = (await db.scalars(select(Transaction).where(Transaction.wallet_id == wallet.id))).all()
     return transactions
 
 if __name__ == "__main__":
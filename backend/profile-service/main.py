@@ -1,21 +1,39 @@
 from fastapi import FastAPI, HTTPException, Depends, Header
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import select, func, Column, Integer, String, DateTime, Boolean, Text, ForeignKey
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 
+import sys
+
+# Общий пакет backend/shared
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.db import Database
+from shared.log import setup_logging
+from shared.metrics import setup_metrics
+from shared.responses import FastJSONResponse
+
 load_dotenv()
 
-app = FastAPI(title="Profile Service", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Создание таблиц при старте и закрытие соединений с БД при остановке"""
+    await database.create_all(Base.metadata)
+    yield
+    await database.dispose()
+
+app = FastAPI(title="Profile Service", version="1.0.0", default_response_class=FastJSONResponse, lifespan=lifespan)
+setup_metrics(app)
+setup_logging(app, "profile-service")
 
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tot_mvp.db")
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+database = Database(DATABASE_URL)
 Base = declarative_base()
 
 # Models
@@ -163,14 +181,6 @@ class ClinicProfileResponse(ClinicProfileBase):
     class Config:
         from_attributes = True
 
-# Database dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Auth dependency
 def get_user_from_header(authorization: str = Header(None)):
     if not authorization:
@@ -183,25 +193,22 @@ def get_user_from_header(authorization: str = Header(None)):
     except:
         raise HTTPException(status_code=401, detail="Invalid authorization header")
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "profile-service"}
 
 # Profile endpoints
 @app.post("/profiles/", response_model=ProfileResponse)
-async def create_profile(profile: ProfileCreate, db: Session = Depends(get_db)):
+async def create_profile(profile: ProfileCreate, db: AsyncSession = Depends(database.session)):
     db_profile = Profile(**profile.dict())
     db.add(db_profile)
-    db.commit()
-    db.refresh(db_profile)
+    await db.commit()
+    await db.refresh(db_profile)
     return db_profile
 
 @app.get("/profiles/{user_id}", response_model=ProfileResponse)
-async def get_profile(user_id: int, db: Session = Depends(get_db)):
-    profile = db.query(Profile).filter(Profile.user_id == user_id).first()
+async def get_profile(user_id: int, db: AsyncSession = Depends(database.session)):
+    profile = await db.scalar(select(Profile).where(Profile.user_id == user_id).limit(1))
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     return profile
@@ -210,13 +217,13 @@ async def get_profile(user_id: int, db: Session = Depends(get_db)):
 async def update_profile(
     user_id: int, 
     profile_update: ProfileUpdate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(database.session),
     current_user_id: int = Depends(get_user_from_header)
 ):
     if user_id != current_user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    profile = db.query(Profile).filter(Profile.user_id == user_id).first()
+    profile = await db.scalar(select(Profile).where(Profile.user_id == user_id).limit(1))
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
@@ -224,28 +231,28 @@ async def update_profile(
         setattr(profile, field, value)
     
     profile.updated_at = datetime.utcnow()  # pyright: ignore[reportAttributeAccessIssue]
-    db.commit()
-    db.refresh(profile)
+    await db.commit()
+    await db.refresh(profile)
     return profile
 
 # Doctor profile endpoints
 @app.post("/doctor-profiles/", response_model=DoctorProfileResponse)
-async def create_doctor_profile(profile: DoctorProfileCreate, db: Session = Depends(get_db)):
+async def create_doctor_profile(profile: DoctorProfileCreate, db: AsyncSession = Depends(database.session)):
     db_profile = DoctorProfile(**profile.dict())
     db.add(db_profile)
-    db.commit()
-    db.refresh(db_profile)
+    await db.commit()
+    await db.refresh(db_profile)
     return db_profile
 
 @app.get("/doctor-profiles/count")
-async def get_doctors_count(db: Session = Depends(get_db)):
+async def get_doctors_count(db: AsyncSession = Depends(database.session)):
     """Получение количества врачей"""
-    count = db.query(DoctorProfile).count()
+    count = await db.scalar(select(func.count()).select_from(DoctorProfile))
     return {"count": count}
 
 @app.get("/doctor-profiles/{user_id}", response_model=DoctorProfileResponse)
-async def get_doctor_profile(user_id: int, db: Session = Depends(get_db)):
-    profile = db.query(DoctorProfile).filter(DoctorProfile.user_id == user_id).first()
+async def get_doctor_profile(user_id: int, db: AsyncSession = Depends(database.session)):
+    profile = await db.scalar(select(DoctorProfile).where(DoctorProfile.user_id == user_id).limit(1))
     if not profile:
         raise HTTPException(status_code=404, detail="Doctor profile not found")
     return profile
@@ -254,13 +261,13 @@ async def get_doctor_profile(user_id: int, db: Session = Depends(get_db)):
 async def update_doctor_profile(
     user_id: int, 
     profile_update: DoctorProfileUpdate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(database.session),
     current_user_id: int = Depends(get_user_from_header)
 ):
     if user_id != current_user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    profile = db.query(DoctorProfile).filter(DoctorProfile.user_id == user_id).first()
+    profile = await db.scalar(select(DoctorProfile).where(DoctorProfile.user_id == user_id).limit(1))
     if not profile:
         raise HTTPException(status_code=404, detail="Doctor profile not found")
     
@@ -268,44 +275,44 @@ async def update_doctor_profile(
         setattr(profile, field, value)
     
     profile.updated_at = datetime.utcnow()  # pyright: ignore[reportAttributeAccessIssue]
-    db.commit()
-    db.refresh(profile)
+    await db.commit()
+    await db.refresh(profile)
     return profile
 
 @app.get("/doctor-profiles/", response_model=List[DoctorProfileResponse])
 async def get_doctors(
     specialization: Optional[str] = None,
     is_available: Optional[bool] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(database.session)
 ):
-    query = db.query(DoctorProfile)
+    query = select(DoctorProfile)
     
     if specialization:
-        query = query.filter(DoctorProfile.specialization == specialization)
+        query = query.where(DoctorProfile.specialization == specialization)
     
     if is_available is not None:
-        query = query.filter(DoctorProfile.is_available == is_available)
+        query = query.where(DoctorProfile.is_available == is_available)
     
-    return query.all()
+    return (await db.scalars(query)).all()
 
 # Clinic profile endpoints
 @app.post("/clinic-profiles/", response_model=ClinicProfileResponse)
-async def create_clinic_profile(profile: ClinicProfileCreate, db: Session = Depends(get_db)):
+async def create_clinic_profile(profile: ClinicProfileCreate, db: AsyncSession = Depends(database.session)):
     db_profile = ClinicProfile(**profile.dict())
     db.add(db_profile)
-    db.commit()
-    db.refresh(db_profile)
+    await db.commit()
+    await db.refresh(db_profile)
     return db_profile
 
 @app.get("/clinic-profiles/count")
-async def get_clinics_count(db: Session = Depends(get_db)):
+async def get_clinics_count(db: AsyncSession = Depends(database.session)):
     """Получение количества клиник"""
-    count = db.query(ClinicProfile).count()
+    count = await db.scalar(select(func.count()).select_from(ClinicProfile))
     return {"count": count}
 
 @app.get("/clinic-profiles/{user_id}", response_model=ClinicProfileResponse)
-async def get_clinic_profile(user_id: int, db: Session = Depends(get_db)):
-    profile = db.query(ClinicProfile).filter(ClinicProfile.user_id == user_id).first()
+async def get_clinic_profile(user_id: int, db: AsyncSession = Depends(database.session)):
+    profile = await db.scalar(select(ClinicProfile).where(ClinicProfile.user_id == user_id).limit(1))
     if not profile:
         raise HTTPException(status_code=404, detail="Clinic profile not found")
     return profile
@@ -314,13 +321,13 @@ async def get_clinic_profile(user_id: int, db: Session = Depends(get_db)):
 async def update_clinic_profile(
     user_id: int, 
     profile_update: ClinicProfileUpdate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(database.session),
     current_user_id: int = Depends(get_user_from_header)
 ):
     if user_id != current_user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    profile = db.query(ClinicProfile).filter(ClinicProfile.user_id == user_id).first()
+    profile = await db.scalar(select(ClinicProfile).where(ClinicProfile.user_id == user_id).limit(1))
     if not profile:
         raise HTTPException(status_code=404, detail="Clinic profile not found")
     
@@ -328,13 +335,13 @@ async def update_clinic_profile(
         setattr(profile, field, value)
     
     profile.updated_at = datetime.utcnow()  # pyright: ignore[reportAttributeAccessIssue]
-    db.commit()
-    db.refresh(profile)
+    await db.commit()
+    await db.refresh(profile)
     return profile
 
 @app.get("/clinic-profiles/", response_model=List[ClinicProfileResponse])
-async def get_clinics(db: Session = Depends(get_db)):
-    return db.query(ClinicProfile).all()
+async def get_clinics(db: AsyncSession = Depends(database.session)):
+    return (await db.scalars(select(ClinicProfile))).all()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,6 @@
+"""
+@file: __init__.py
+@description: Общий код backend-сервисов ТОТ (подключается из main.py каждого сервиса)
+@dependencies: нет
+@created: 2026-10-18
+"""
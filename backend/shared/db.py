@@ -0,0 +1,79 @@
+"""
+@file: db.py
+@description: Асинхронный доступ к БД для сервисов: движок SQLAlchemy asyncio (asyncpg, aiosqlite) и зависимость AsyncSession
+@dependencies: sqlalchemy[asyncio], asyncpg (PostgreSQL), aiosqlite (SQLite)
+@created: 2026-10-18
+"""
+import os
+from typing import AsyncIterator
+
+from sqlalchemy import MetaData
+from sqlalchemy.engine import Connection, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+# Асинхронные драйверы по диалекту DATABASE_URL (postgresql://, postgresql+psycopg2:// и т.п.)
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+# Пул соединений движка (для SQLite не применяется: у aiosqlite свой пул)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+
+
+def async_database_url(url: str) -> str:
+    """URL с асинхронным драйвером: postgresql:// -> postgresql+asyncpg://, sqlite:/// -> sqlite+aiosqlite:///"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend in ASYNC_DRIVERS and parsed.get_driver_name() != ASYNC_DRIVERS[backend]:
+        parsed = parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    return parsed.render_as_string(hide_password=False)
+
+
+def _create_all(connection: Connection, metadata: MetaData) -> None:
+    metadata.create_all(connection)
+    # Миграций нет: индекс, добавленный в модель после создания таблицы, создается здесь
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+class Database:
+    """Движок и фабрика асинхронных сессий одного сервиса.
+
+    database.session - зависимость FastAPI вместо синхронного get_db:
+    запросы выполняются без блокировки event loop, сессия закрывается
+    после ответа. expire_on_commit=False: после commit поля объектов
+    остаются загруженными, ответ собирается без повторного запроса к БД
+    (ленивые загрузки в asyncio недоступны).
+    """
+
+    def __init__(self, url: str, echo: bool = False):
+        self.url = async_database_url(url)
+        options = {"echo": echo}
+        if make_url(self.url).get_backend_name() != "sqlite":
+            # Проверка соединения при выдаче из пула: PostgreSQL мог закрыть его после рестарта
+            options.update(
+                pool_pre_ping=True,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+                pool_recycle=DB_POOL_RECYCLE_SECONDS,
+            )
+        self.engine: AsyncEngine = create_async_engine(self.url, **options)
+        self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False, autoflush=False)
+
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        async with self.sessionmaker() as session:
+            yield session
+
+    async def create_all(self, metadata: MetaData) -> None:
+        """Создание таблиц и недостающих индексов при старте сервиса (lifespan)"""
+        async with self.engine.begin() as connection:
+            await connection.run_sync(_create_all, metadata)
+
+    async def dispose(self) -> None:
+        await self.engine.dispose()
@@ -0,0 +1,192 @@
+"""
+@file: log.py
+@description: Структурированное логирование API Gateway и сервисов: очередь, фоновая запись, сэмплирование
+@dependencies: structlog, shared/metrics.py
+@created: 2026-10-18
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from typing import Optional
+
+import structlog
+
+from shared.metrics import LOG_RECORDS_DROPPED
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Доля успешных запросов, попадающих в журнал; ошибки и медленные запросы пишутся всегда
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+LOG_SLOW_REQUEST_SECONDS = float(os.getenv("LOG_SLOW_REQUEST_SECONDS", "1.0"))
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Передача записей в очередь фонового потока без ожидания.
+
+    Запись форматируется в потоке записи, а не на event loop. При
+    переполнении очереди запись отбрасывается и учитывается в метрике:
+    обработка запроса никогда не ждет вывода журнала.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Очередь внутри процесса: запись передается как есть, форматирование - в ProcessorFormatter
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def should_sample(rate: Optional[float] = None) -> bool:
+    """Попадание успешного события в выборку"""
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    return rate >= 1.0 or random.random() < rate
+
+
+def _shared_processors(service_name: str) -> list:
+    def add_service(_, __, event_dict):
+        event_dict.setdefault("service", service_name)
+        return event_dict
+
+    return [
+        structlog.contextvars.merge_contextvars,
+        structlog.stdlib.add_log_level,
+        structlog.stdlib.add_logger_name,
+        structlog.processors.TimeStamper(fmt="iso", utc=True),
+        add_service,
+        # Трассировка извлекается в потоке, где возникло исключение (только для ошибок)
+        structlog.processors.format_exc_info,
+    ]
+
+
+def configure_logging(service_name: str) -> None:
+    """Настройка корневого логгера и structlog; повторный вызов ничего не меняет.
+
+    Записи stdlib-логгеров (uvicorn, sqlalchemy) и structlog проходят через
+    одну очередь и выводятся в stdout фоновым потоком.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    renderer = (
+        structlog.dev.ConsoleRenderer(colors=False)
+        if LOG_FORMAT == "console"
+        else structlog.processors.JSONRenderer()
+    )
+    shared = _shared_processors(service_name)
+    formatter = structlog.stdlib.ProcessorFormatter(
+        foreign_pre_chain=shared,
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            renderer,
+        ],
+    )
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(formatter)
+
+    records: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    root.handlers = [NonBlockingQueueHandler(records)]
+    root.setLevel(LOG_LEVEL)
+
+    structlog.configure(
+        processors=shared + [structlog.stdlib.ProcessorFormatter.wrap_for_formatter],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+    # uvicorn настраивает свои логгеры до импорта приложения: они переводятся в общую очередь,
+    # а построчный access-журнал uvicorn заменяется выборочным журналом RequestLogMiddleware
+    for name in ("uvicorn", "uvicorn.error"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    logging.getLogger("uvicorn.access").handlers = []
+    logging.getLogger("uvicorn.access").propagate = False
+    # httpx пишет INFO на каждый запрос к сервису; обращения к сервисам видны в метриках
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def get_logger(name: str):
+    return structlog.get_logger(name)
+
+
+access_logger = get_logger("access")
+
+
+def request_log_level(status: int, duration: float) -> Optional[int]:
+    """Уровень записи о запросе: ошибки и медленные запросы всегда, остальные - по выборке"""
+    if status >= 500:
+        return logging.ERROR
+    if duration >= LOG_SLOW_REQUEST_SECONDS:
+        return logging.WARNING
+    if should_sample():
+        return logging.INFO
+    return None
+
+
+class RequestLogMiddleware:
+    """ASGI-middleware журнала запросов.
+
+    На время запроса в контекст structlog добавляются метод и путь, поэтому
+    они попадают во все записи обработчика. Решение о выборке принимается
+    до построения события: пропущенный запрос почти ничего не стоит.
+    Потоки Server-Sent Events длятся долго по своей природе и медленными не считаются.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        event_stream = False
+
+        async def status_send(message):
+            nonlocal status, event_stream
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                event_stream = any(
+                    name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        with structlog.contextvars.bound_contextvars(method=scope["method"], path=scope["path"]):
+            try:
+                await self.app(scope, receive, status_send)
+            finally:
+                duration = time.perf_counter() - started
+                level = request_log_level(status, 0.0 if event_stream else duration)
+                if level is not None:
+                    access_logger.log(
+                        level,
+                        "slow_request" if level == logging.WARNING else "request",
+                        status=status,
+                        duration_ms=round(duration * 1000, 3),
+                    )
+
+
+def setup_logging(app, service_name: str) -> None:
+    """Настройка журнала процесса и подключение журнала запросов к приложению FastAPI"""
+    configure_logging(service_name)
+    app.add_middleware(RequestLogMiddleware)
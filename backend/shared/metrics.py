@@ -0,0 +1,180 @@
+"""
+@file: metrics.py
+@description: Метрики Prometheus для API Gateway и сервисов: ASGI-middleware и эндпоинт /metrics
+@dependencies: prometheus_client, starlette
+@created: 2026-10-18
+"""
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Границы гистограмм: задержки от 5 мс до 30 с, размеры от 100 байт до 10 МБ
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Маршрут, не сопоставленный ни одному эндпоинту (404): путь не попадает в метки
+UNMATCHED_ROUTE = "unmatched"
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "Запросы по маршрутам и кодам ответа", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Время обработки запроса", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Запросы в обработке", ["method"])
+HTTP_REQUEST_SIZE = Histogram(
+    "http_request_size_bytes", "Размер тела запроса", ["method", "route"], buckets=SIZE_BUCKETS
+)
+HTTP_RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Размер тела ответа", ["method", "route"], buckets=SIZE_BUCKETS
+)
+
+# Метрики обращений API Gateway к сервисам
+UPSTREAM_REQUESTS = Counter(
+    "gateway_upstream_requests_total",
+    "Запросы шлюза к сервисам (status: код ответа, error или rejected)",
+    ["upstream", "method", "status"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "gateway_upstream_request_duration_seconds",
+    "Время до получения заголовков ответа сервиса",
+    ["upstream", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_IN_FLIGHT = Gauge("gateway_upstream_in_flight", "Занятые слоты пула соединений", ["upstream"])
+UPSTREAM_POOL_WAIT = Histogram(
+    "gateway_upstream_pool_wait_seconds",
+    "Ожидание свободного слота пула соединений",
+    ["upstream"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_EXTRA_ATTEMPTS = Counter(
+    "gateway_upstream_extra_attempts_total",
+    "Дополнительные попытки запросов к сервисам (kind: retry или hedge)",
+    ["upstream", "kind"],
+)
+
+# Потоковые соединения шлюза (WebSocket и SSE): kind - websocket или sse
+STREAM_DURATION_BUCKETS = (1.0, 10.0, 60.0, 300.0, 900.0, 1800.0, 3600.0, 14400.0)
+GATEWAY_STREAMS_ACTIVE = Gauge(
+    "gateway_streams_active", "Открытые потоковые соединения через шлюз", ["kind", "upstream"]
+)
+GATEWAY_STREAMS_CLOSED = Counter(
+    "gateway_streams_closed_total",
+    "Закрытые потоковые соединения (reason: client, upstream, idle, error, rejected)",
+    ["kind", "upstream", "reason"],
+)
+GATEWAY_STREAM_MESSAGES = Counter(
+    "gateway_stream_messages_total",
+    "Сообщения потоковых соединений (direction: to_upstream или to_client)",
+    ["kind", "upstream", "direction"],
+)
+GATEWAY_STREAM_BYTES = Counter(
+    "gateway_stream_bytes_total", "Объем данных потоковых соединений", ["kind", "upstream", "direction"]
+)
+GATEWAY_STREAM_DURATION = Histogram(
+    "gateway_stream_duration_seconds",
+    "Длительность потоковых соединений",
+    ["kind", "upstream"],
+    buckets=STREAM_DURATION_BUCKETS,
+)
+
+# Пул хеширования паролей User Service (operation: hash или verify)
+PASSWORD_HASH_QUEUE_WAIT = Histogram(
+    "password_hash_queue_wait_seconds",
+    "Ожидание свободного процесса пула хеширования паролей",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "Время хеширования и проверки пароля в процессе пула", ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+PASSWORD_HASH_PENDING = Gauge("password_hash_pending", "Задачи пула хеширования паролей: в очереди и в работе")
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total", "Задачи, отклоненные при переполнении очереди пула (503)", ["operation"]
+)
+
+RATE_LIMITED = Counter(
+    "gateway_rate_limited_total", "Запросы, отклоненные ограничением частоты (429)", ["scope"]
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total", "Записи журнала, отброшенные при переполнении очереди"
+)
+
+
+def set_route_label(request: Request, route: str) -> None:
+    """Явная метка маршрута (например, шаблон из таблицы маршрутов шлюза)"""
+    request.scope["metrics_route"] = route
+
+
+def _route_label(scope: dict) -> str:
+    if "metrics_route" in scope:
+        return scope["metrics_route"]
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class PrometheusMiddleware:
+    """ASGI-middleware учета запросов.
+
+    Метка маршрута - шаблон пути (/users/{user_id}), а не сам путь, чтобы число
+    рядов не росло с числом идентификаторов. Тело ответа не буферизуется:
+    размер считается по отправленным частям, поэтому потоковые ответы не задерживаются.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        request_size = 0
+        response_size = 0
+        status = "500"
+
+        async def counting_receive():
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_size += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal response_size, status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            in_flight.dec()
+            route = _route_label(scope)
+            HTTP_REQUESTS.labels(method, route, status).inc()
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+            HTTP_REQUEST_SIZE.labels(method, route).observe(request_size)
+            HTTP_RESPONSE_SIZE.labels(method, route).observe(response_size)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Метрики процесса в текстовом формате Prometheus"""
+    set_route_label(request, "/metrics")
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+def setup_metrics(app) -> None:
+    """Подключение middleware и эндпоинта /metrics к приложению FastAPI"""
+    app.add_middleware(PrometheusMiddleware)
+    app.add_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
@@ -0,0 +1,65 @@
+"""
+@file: responses.py
+@description: Быстрая сериализация JSON для API Gateway и сервисов: класс ответа на orjson, dumps/loads
+@dependencies: orjson (необязательно), pydantic, fastapi
+@created: 2026-10-18
+"""
+import json
+from decimal import Decimal
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # без orjson - стандартный json с тем же результатом
+    orjson = None
+
+# Ключи словарей не только строки (как у json); datetime с UTC - с суффиксом Z (как у pydantic)
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z if orjson is not None else 0
+
+
+def _default(value: Any) -> Any:
+    """Типы, которые orjson не сериализует сам.
+
+    Модель pydantic выгружается в python-режиме: datetime, date, UUID и Enum
+    остаются объектами и сериализуются orjson без промежуточных строк.
+    """
+    if isinstance(value, BaseModel):
+        return value.model_dump(by_alias=True)
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """JSON в UTF-8 без пробелов; модели pydantic, datetime и UUID - как у FastAPI"""
+    if orjson is None:
+        return json.dumps(
+            jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+def loads(data: Any) -> Any:
+    """Разбор JSON; ошибка - ValueError, как у json.loads"""
+    if orjson is None:
+        return json.loads(data)
+    return orjson.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON-ответ на orjson: default_response_class API Gateway и сервисов.
+
+    Эндпоинт, который сам собирает модели ответа, возвращает этот класс
+    напрямую (return FastJSONResponse(items)): FastAPI тогда не проверяет
+    готовые модели повторно по response_model и не строит из них
+    промежуточные словари. response_model остается для схемы OpenAPI.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,6 @@
+"""
+@file: __init__.py
+@description: Нагрузочные тесты User Service
+@dependencies: benchmarks/login.py
+@created: 2026-10-18
+"""
@@ -0,0 +1,180 @@
+"""
+@file: login.py
+@description: Пропускная способность входа (POST /auth/login) User Service по числу процессов пула хеширования
+@dependencies: uvicorn, httpx, main.py
+@created: 2026-10-18
+
+Запуск из backend/user-service:
+    python -m benchmarks.login --pool-workers 1 2 4 --concurrency 32 --duration 10
+
+Для каждого значения --pool-workers сервис запускается заново (uvicorn, один
+процесс, SQLite во временном каталоге), регистрируется пользователь и
+нагружается входом. Параллельно раз в 50 мс запрашивается GET /health: его
+задержка показывает, не останавливает ли bcrypt event loop сервиса.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import httpx
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_USER = {
+    "email": "bench-login@example.com",
+    "password": "bench-password-123",
+    "first_name": "Bench",
+    "last_name": "Login",
+    "role": "patient",
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited with code {process.returncode} before {url} became ready")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} is not ready after {timeout} s")
+
+
+@contextmanager
+def _service(port: int, pool_workers: int, max_queue: int, database: str) -> Iterator[str]:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{database}",
+        "PASSWORD_POOL_WORKERS": str(pool_workers),
+        "PASSWORD_POOL_MAX_QUEUE": str(max_queue),
+        "LOG_SAMPLE_RATE": "0",
+    })
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(f"{base_url}/health", process)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def _drive(base_url: str, concurrency: int, duration: float, warmup: float) -> dict:
+    credentials = {"email": BENCH_USER["email"], "password": BENCH_USER["password"]}
+    latencies: List[float] = []
+    probes: List[float] = []
+    statuses: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        response = await client.post("/auth/register", json=BENCH_USER)
+        if response.status_code not in (200, 400):
+            raise RuntimeError(f"Registration failed: {response.status_code} {response.text}")
+
+        async def worker(until: float, record: bool) -> None:
+            while time.perf_counter() < until:
+                started = time.perf_counter()
+                response = await client.post("/auth/login", json=credentials)
+                if record:
+                    latencies.append(time.perf_counter() - started)
+                    statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+        async def probe(until: float) -> None:
+            while time.perf_counter() < until:
+                started = time.perf_counter()
+                await client.get("/health")
+                probes.append(time.perf_counter() - started)
+                await asyncio.sleep(0.05)
+
+        warmup_until = time.perf_counter() + warmup
+        await asyncio.gather(*(worker(warmup_until, False) for _ in range(concurrency)))
+        started = time.perf_counter()
+        until = started + duration
+        await asyncio.gather(probe(until), *(worker(until, True) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    succeeded = statuses.get("200", 0)
+    return {
+        "logins": succeeded,
+        "statuses": statuses,
+        "logins_per_second": round(succeeded / elapsed, 1),
+        "login_p50_ms": round(_percentile(latencies, 0.5) * 1000, 1),
+        "login_p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "health_p50_ms": round(_percentile(probes, 0.5) * 1000, 1),
+        "health_p95_ms": round(_percentile(probes, 0.95) * 1000, 1),
+        "health_max_ms": round(max(probes, default=0.0) * 1000, 1),
+    }
+
+
+def format_table(results: List[dict]) -> str:
+    header = (
+        f"{'pool':>5} {'cores':>5} {'logins/s':>9} {'per core':>9} {'p50_ms':>8} {'p95_ms':>8} "
+        f"{'503':>5} {'health_p95':>10} {'health_max':>10}"
+    )
+    lines = [header, "-" * len(header)]
+    for row in results:
+        lines.append(
+            f"{row['pool_workers']:>5} {row['cores']:>5} {row['logins_per_second']:>9} {row['per_core']:>9} "
+            f"{row['login_p50_ms']:>8} {row['login_p95_ms']:>8} {row['statuses'].get('503', 0):>5} "
+            f"{row['health_p95_ms']:>10} {row['health_max_ms']:>10}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Пропускная способность входа User Service")
+    parser.add_argument("--pool-workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--max-queue", type=int, default=256, help="PASSWORD_POOL_MAX_QUEUE сервиса")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд измерения")
+    parser.add_argument("--warmup", type=float, default=2.0, help="секунд прогрева")
+    parser.add_argument("--output", help="файл результатов JSON")
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    results = []
+    for pool_workers in dict.fromkeys(args.pool_workers):
+        with tempfile.TemporaryDirectory() as tmp, \
+                _service(_free_port(), pool_workers, args.max_queue, os.path.join(tmp, "bench.db")) as base_url:
+            result = asyncio.run(_drive(base_url, args.concurrency, args.duration, args.warmup))
+        # bcrypt занимает ядро целиком: процессов пула больше, чем ядер, не прибавляют пропускной способности
+        cores = min(pool_workers, cpu_count)
+        result.update({"pool_workers": pool_workers, "cores": cores, "per_core": round(result["logins_per_second"] / cores, 1)})
+        results.append(result)
+
+    print(format_table(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"cpu_count": cpu_count, "concurrency": args.concurrency, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
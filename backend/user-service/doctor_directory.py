@@ -0,0 +1,222 @@
+"""
+@file: doctor_directory.py
+@description: Справочник врачей User Service: готовый JSON в памяти (или в Redis) с версией для ETag
+@dependencies: redis (опционально), shared/responses.py, shared/log.py
+@created: 2026-10-18
+"""
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis не установлен - справочник только в памяти процесса
+    aioredis = None
+
+from shared.log import get_logger
+from shared.responses import dumps
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class DoctorDirectorySettings:
+    """Настройки справочника врачей"""
+    # Срок жизни копии: изменения в обход сервиса (и других экземпляров без Redis) видны не позже
+    ttl: float = 60.0
+    # auto (Redis, если задан redis_url и установлен redis), redis или memory
+    backend: str = "auto"
+    redis_url: Optional[str] = None
+
+
+def load_doctor_directory_settings() -> DoctorDirectorySettings:
+    return DoctorDirectorySettings(
+        ttl=float(os.getenv("DOCTOR_DIRECTORY_TTL_SECONDS", "60")),
+        backend=os.getenv("DOCTOR_DIRECTORY_BACKEND", "auto"),
+        redis_url=os.getenv("REDIS_URL"),
+    )
+
+
+@dataclass(frozen=True)
+class DirectorySnapshot:
+    """Собранный справочник: версия и тело ответа"""
+    version: str
+    body: bytes
+    built_at: float
+
+    @property
+    def etag(self) -> str:
+        return f'W/"doctors-{self.version}"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Заголовок If-None-Match (список или "*") совпадает с версией - ответ 304"""
+        if not if_none_match:
+            return False
+        candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+        return "*" in candidates or any(candidate.removeprefix("W/") == self.etag[2:] for candidate in candidates)
+
+
+class DoctorDirectory:
+    """Готовый ответ GET /api/doctors/list с версией.
+
+    Справочник собирается одним запросом и сериализуется один раз; запросы
+    получают готовые байты. Запись врача (регистрация, PUT /auth/me)
+    вызывает invalidate: версия увеличивается, следующий запрос собирает
+    справочник заново. Версия читается до запроса к БД, поэтому изменение во
+    время сборки не теряется: собранная копия получает старую версию.
+
+    С Redis версия и тело общие для всех экземпляров сервиса, без Redis -
+    свои в каждом процессе (версия включает идентификатор процесса, чтобы
+    ETag разных экземпляров не совпадали). При ошибке Redis справочник на
+    RETRY_SECONDS переходит на память процесса; изменения за это время
+    увеличивают версию в Redis после восстановления.
+
+    Как и в памяти процесса, справочник, пересобранный после истечения
+    TTL, получает новую версию, если его содержимое (хеш тела) изменилось.
+    """
+
+    RETRY_SECONDS = 30
+    # Попытки опубликовать пересобранный справочник, если версия в Redis изменилась во время сборки
+    PUBLISH_ATTEMPTS = 3
+    REDIS_PREFIX = "tot:user:doctors:"
+
+    def __init__(self, settings: DoctorDirectorySettings, load: Callable[[], Awaitable[List[dict]]]):
+        self.settings = settings
+        self._load = load
+        self._instance = uuid.uuid4().hex[:8]
+        self._counter = 0
+        self._snapshot: Optional[DirectorySnapshot] = None
+        self._lock = asyncio.Lock()
+        self._redis = None
+        self._redis_down_until = 0.0
+        # invalidate без Redis: версия в Redis увеличивается при восстановлении
+        self._redis_invalidation_pending = False
+        self.hits = 0
+        self.rebuilds = 0
+        if settings.backend != "memory" and settings.redis_url and aioredis is not None:
+            self._redis = aioredis.from_url(settings.redis_url)
+        elif settings.backend == "redis":
+            logger.warning("doctor_directory_redis_unavailable", reason="REDIS_URL or redis package is missing")
+
+    def _active_redis(self):
+        if self._redis is not None and time.monotonic() >= self._redis_down_until:
+            return self._redis
+        return None
+
+    def _mark_redis_down(self, error: Exception) -> None:
+        logger.warning("doctor_directory_redis_down", error=repr(error))
+        self._redis_down_until = time.monotonic() + self.RETRY_SECONDS
+
+    def _local_version(self) -> str:
+        return f"{self._instance}.{self._counter}"
+
+    def _fresh(self, version: str) -> Optional[DirectorySnapshot]:
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != version:
+            return None
+        if time.monotonic() - snapshot.built_at >= self.settings.ttl:
+            return None
+        return snapshot
+
+    async def _build(self) -> bytes:
+        self.rebuilds += 1
+        return dumps({"doctors": await self._load()})
+
+    async def get(self) -> DirectorySnapshot:
+        """Текущий справочник; БД - только если справочник изменился или копия устарела"""
+        redis = self._active_redis()
+        if redis is not None:
+            try:
+                return await self._get_shared(redis)
+            except Exception as e:
+                self._mark_redis_down(e)
+        return await self._get_local()
+
+    async def _get_local(self) -> DirectorySnapshot:
+        snapshot = self._fresh(self._local_version())
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+        async with self._lock:
+            version = self._local_version()
+            snapshot = self._fresh(version)
+            if snapshot is not None:
+                return snapshot
+            previous = self._snapshot
+            body = await self._build()
+            if previous is not None and previous.version == version and previous.body != body:
+                # Копия устарела по TTL, и данные изменились в обход этого процесса: новая версия
+                self._counter += 1
+                version = self._local_version()
+            self._snapshot = DirectorySnapshot(version, body, time.monotonic())
+            return self._snapshot
+
+    async def _shared_version(self, redis) -> int:
+        return int(await redis.get(self.REDIS_PREFIX + "version") or 0)
+
+    async def _get_shared(self, redis) -> DirectorySnapshot:
+        if self._redis_invalidation_pending:
+            await redis.incr(self.REDIS_PREFIX + "version")
+            self._redis_invalidation_pending = False
+        number = await self._shared_version(redis)
+        snapshot = self._fresh(f"r{number}")
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+        async with self._lock:
+            for _ in range(self.PUBLISH_ATTEMPTS):
+                version = f"r{number}"
+                snapshot = self._fresh(version)
+                if snapshot is not None:
+                    return snapshot
+                body = await redis.get(self.REDIS_PREFIX + version)
+                if body is None:
+                    body = await self._build()
+                    published = await self._publish(redis, number, body)
+                    if published is None:
+                        number = await self._shared_version(redis)
+                        continue
+                    version = f"r{published}"
+                self._snapshot = DirectorySnapshot(version, body, time.monotonic())
+                return self._snapshot
+            # Версия меняется быстрее сборки: ответ без сохранения копии
+            return DirectorySnapshot(f"r{number}", body, time.monotonic())
+
+    async def _publish(self, redis, number: int, body: bytes) -> Optional[int]:
+        """Сохранение собранного справочника в Redis; версия тела или None, если ее нужно перечитать.
+
+        Хеш последнего опубликованного тела хранится без срока жизни: тело,
+        пересобранное после истечения TTL, с другим хешем получает новую
+        версию (данные изменились в обход invalidate). Если версия изменилась
+        во время сборки, тело могло устареть и под прежней версией не сохраняется.
+        """
+        digest = hashlib.sha256(body).hexdigest()
+        previous = await redis.getset(self.REDIS_PREFIX + "hash", digest)
+        if previous is not None and previous.decode() != digest:
+            number = await redis.incr(self.REDIS_PREFIX + "version")
+        elif await self._shared_version(redis) != number:
+            return None
+        await redis.set(self.REDIS_PREFIX + f"r{number}", body, ex=max(1, int(self.settings.ttl)))
+        return number
+
+    async def invalidate(self) -> None:
+        """Справочник изменился: вызывается после commit записи врача"""
+        self._counter += 1
+        redis = self._active_redis()
+        if redis is None:
+            self._redis_invalidation_pending = self._redis is not None
+            return
+        try:
+            await redis.incr(self.REDIS_PREFIX + "version")
+            self._redis_invalidation_pending = False
+        except Exception as e:
+            self._redis_invalidation_pending = True
+            self._mark_redis_down(e)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
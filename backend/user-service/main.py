@@ -1,27 +1,56 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
 import jwt
 import os
 from datetime import datetime, timedelta
-from typing import Optional
-import logging
+from typing import List, Optional
 from pydantic import BaseModel, EmailStr, validator, Field
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import select, func, update, Column, Index, Integer, String, Boolean, DateTime, Text
+from sqlalchemy.orm import declarative_base
 import uuid
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+import sys
+
+# Общий пакет backend/shared
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.db import Database
+from shared.log import get_logger, setup_logging
+from shared.metrics import setup_metrics
+from shared.responses import FastJSONResponse
+from password_pool import PasswordPool, PasswordPoolOverloaded, load_password_pool_settings
+from pagination import InvalidCursor, decode_cursor, keyset_page, split_page
+from doctor_directory import DoctorDirectory, load_doctor_directory_settings
+
+logger = get_logger(__name__)
+
+# Хеширование и проверка паролей (bcrypt) - в пуле процессов, не на event loop
+password_pool = PasswordPool(load_password_pool_settings())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Создание таблиц и запуск процессов пула хеширования при старте, остановка при завершении"""
+    await database.create_all(Base.metadata)
+    async with database.sessionmaker() as db:
+        await init_user_counters(db)
+    await password_pool.warm_up()
+    yield
+    password_pool.shutdown()
+    await doctor_directory.close()
+    await database.dispose()
 
 app = FastAPI(
     title="ТОТ User Service",
     description="Сервис управления пользователями и аутентификации",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
+setup_metrics(app)
+setup_logging(app, "user-service")
 
 # Настройка CORS
 app.add_middleware(
@@ -33,7 +62,6 @@ app.add_middleware(
 )
 
 # Настройки безопасности
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
 # JWT настройки
@@ -43,8 +71,7 @@ JWT_EXPIRATION = int(os.getenv("JWT_EXPIRATION_HOURS", 24))
 
 # База данных
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tot_mvp.db")
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+database = Database(DATABASE_URL)
 Base = declarative_base()
 
 # Модели данных
@@ -73,8 +100,21 @@ class User(Base):
     clinic_address = Column(Text, nullable=True)
     clinic_license = Column(String, nullable=True)
 
-# Создание таблиц
-Base.metadata.create_all(bind=engine)
+    __table_args__ = (
+        # Курсорная пагинация GET /users: порядок (created_at, id), фильтр по роли
+        Index("ix_users_created_at_id", "created_at", "id"),
+        Index("ix_users_role_created_at_id", "role", "created_at", "id"),
+    )
+
+class UserCounter(Base):
+    """Число пользователей по ролям: total списка без COUNT(*) по всей таблице"""
+    __tablename__ = "user_counters"
+
+    role = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+USER_ROLES = ("patient", "doctor", "clinic", "admin")
+USERS_PAGE_MAX_LIMIT = 100
 
 # Pydantic модели
 class UserCreate(BaseModel):
@@ -136,25 +176,21 @@ class UserResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class UserBatchRequest(BaseModel):
+    ids: List[str]
+    fields: Optional[List[str]] = None
+
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str
     expires_in: int
     user: UserResponse
 
-# Функции для работы с базой данных
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_pool.verify(plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    return await password_pool.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -178,9 +214,9 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-def get_current_user(
+async def get_current_user(
     token: dict = Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(database.session)
 ) -> User:
     user_id = token.get("user_id")
     if user_id is None:
@@ -190,7 +226,7 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id).limit(1))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -200,16 +236,49 @@ def get_current_user(
     
     return user
 
+async def init_user_counters(db: AsyncSession):
+    """Заполнение счетчиков по ролям одним подсчетом, если таблица счетчиков пуста (первый запуск)"""
+    if await db.scalar(select(func.count()).select_from(UserCounter)):
+        return
+    counts = dict((await db.execute(select(User.role, func.count()).group_by(User.role))).all())
+    db.add_all(UserCounter(role=role, count=counts.get(role, 0)) for role in {*USER_ROLES, *counts})
+    await db.commit()
+
+async def increment_user_counter(db: AsyncSession, role: str, delta: int = 1):
+    """Изменение счетчика роли в транзакции, которая добавляет или удаляет пользователя"""
+    result = await db.execute(
+        update(UserCounter).where(UserCounter.role == role).values(count=UserCounter.count + delta)
+    )
+    if not result.rowcount:
+        db.add(UserCounter(role=role, count=delta))
+
+async def count_users(db: AsyncSession, role: Optional[str] = None) -> int:
+    """Число пользователей (роли) из счетчиков, без COUNT(*) по таблице users"""
+    query = select(func.coalesce(func.sum(UserCounter.count), 0))
+    if role:
+        query = query.where(UserCounter.role == role)
+    return await db.scalar(query)
+
+@app.exception_handler(PasswordPoolOverloaded)
+async def password_pool_overloaded_handler(request: Request, exc: PasswordPoolOverloaded):
+    """Переполнение очереди хеширования: клиенту - повторить позже"""
+    logger.warning("password_pool_overloaded", path=request.url.path, **password_pool.stats())
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Authentication is temporarily overloaded, retry later"},
+        headers={"Retry-After": "1"},
+    )
+
 # API endpoints
 @app.post("/auth/register", response_model=TokenResponse)
-async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user_data: UserCreate, db: AsyncSession = Depends(database.session)):
     """Регистрация нового пользователя"""
     
     # Проверка существования пользователя
-    existing_user = db.query(User).filter(
+    existing_user = await db.scalar(select(User).where(
         (User.email == user_data.email) | 
         (User.phone == user_data.phone if user_data.phone else False)
-    ).first()
+    ).limit(1))
     
     if existing_user:
         raise HTTPException(
@@ -217,11 +286,15 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
             detail="User with this email or phone already exists"
         )
     
+    # Соединение с БД возвращается в пул на время хеширования в очереди пула процессов
+    await db.close()
+    password_hash = await get_password_hash(user_data.password)
+    
     # Создание нового пользователя
     user = User(
         email=user_data.email,
         phone=user_data.phone,
-        password_hash=get_password_hash(user_data.password),
+        password_hash=password_hash,
         first_name=user_data.first_name,
         last_name=user_data.last_name,
         role=user_data.role,
@@ -234,15 +307,18 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await increment_user_counter(db, user.role)
+    await db.commit()
+    await db.refresh(user)
+    if user.role == "doctor":
+        await doctor_directory.invalidate()
     
     # Создание токена
     access_token = create_access_token(
         data={"user_id": user.id, "email": user.email, "role": user.role}
     )
     
-    return TokenResponse(
+    return FastJSONResponse(TokenResponse(
         access_token=access_token,
         token_type="bearer",
         expires_in=JWT_EXPIRATION * 3600,
@@ -264,22 +340,23 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
             created_at=user.created_at,
             updated_at=user.updated_at
         )
-    )
+    ))
 
 @app.post("/auth/login", response_model=TokenResponse)
-async def login_user(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login_user(user_data: UserLogin, db: AsyncSession = Depends(database.session)):
     """Авторизация пользователя"""
     
     # Поиск пользователя
-    user = db.query(User).filter(User.email == user_data.email).first()
+    user = await db.scalar(select(User).where(User.email == user_data.email).limit(1))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
-    # Проверка пароля
-    if not verify_password(user_data.password, user.password_hash):
+    # Проверка пароля; соединение с БД на это время возвращается в пул (загруженные поля user доступны)
+    await db.close()
+    if not await verify_password(user_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -297,7 +374,7 @@ async def login_user(user_data: UserLogin, db: Session = Depends(get_db)):
         data={"user_id": user.id, "email": user.email, "role": user.role}
     )
     
-    return TokenResponse(
+    return FastJSONResponse(TokenResponse(
         access_token=access_token,
         token_type="bearer",
         expires_in=JWT_EXPIRATION * 3600,
@@ -319,12 +396,12 @@ async def login_user(user_data: UserLogin, db: Session = Depends(get_db)):
             created_at=user.created_at,
             updated_at=user.updated_at
         )
-    )
+    ))
 
 @app.get("/auth/me", response_model=UserResponse)
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Получение информации о текущем пользователе"""
-    return UserResponse(
+    return FastJSONResponse(UserResponse(
         id=current_user.id,
         email=current_user.email,
         phone=current_user.phone,
@@ -341,13 +418,13 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
         clinic_license=current_user.clinic_license,
         created_at=current_user.created_at,
         updated_at=current_user.updated_at
-    )
+    ))
 
 @app.put("/auth/me", response_model=UserResponse)
 async def update_current_user(
     user_data: dict,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(database.session)
 ):
     """Обновление информации о текущем пользователе"""
     
@@ -363,10 +440,12 @@ async def update_current_user(
             setattr(current_user, field, value)
     
     current_user.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
+    if current_user.role == "doctor":
+        await doctor_directory.invalidate()
     
-    return UserResponse(
+    return FastJSONResponse(UserResponse(
         id=current_user.id,
         email=current_user.email,
         phone=current_user.phone,
@@ -383,25 +462,60 @@ async def update_current_user(
         clinic_license=current_user.clinic_license,
         created_at=current_user.created_at,
         updated_at=current_user.updated_at
-    )
+    ))
 
 @app.get("/users/count")
-async def get_users_count(db: Session = Depends(get_db)):
+async def get_users_count(db: AsyncSession = Depends(database.session)):
     """Получение количества пользователей"""
-    count = db.query(User).count()
+    count = await count_users(db)
     return {"count": count}
 
+# Пакетный запрос пользователей: поля ответа - только публичные поля UserResponse
+USERS_BATCH_MAX_IDS = int(os.getenv("USERS_BATCH_MAX_IDS", "100"))
+USER_BATCH_FIELDS = tuple(UserResponse.model_fields)
+
+async def get_users_by_ids(db: AsyncSession, ids: List[str], fields: Optional[List[str]] = None) -> dict:
+    """Пользователи по списку ID одним запросом IN: {"users": {id: {поля}}, "missing": [id]}.
+
+    fields - нужные поля (id возвращается всегда), по умолчанию все поля
+    UserResponse. Повторяющиеся ID запрашиваются один раз.
+    """
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > USERS_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many ids: {len(ids)} (max {USERS_BATCH_MAX_IDS})"
+        )
+    fields = list(dict.fromkeys(["id", *(fields or USER_BATCH_FIELDS)]))
+    unknown = [field for field in fields if field not in USER_BATCH_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    
+    users = {}
+    if ids:
+        rows = await db.execute(select(*(getattr(User, field) for field in fields)).where(User.id.in_(ids)))
+        users = {row["id"]: dict(row) for row in rows.mappings()}
+    return {"users": users, "missing": [user_id for user_id in ids if user_id not in users]}
+
+@app.post("/users/batch")
+async def get_users_batch(batch: UserBatchRequest, db: AsyncSession = Depends(database.session)):
+    """Пакетное получение пользователей по ID (для других сервисов и агрегаций шлюза вместо запроса на каждый ID)"""
+    return FastJSONResponse(await get_users_by_ids(db, batch.ids, batch.fields))
+
 @app.get("/users/{user_id}", response_model=UserResponse)
-async def get_user(user_id: str, db: Session = Depends(get_db)):
+async def get_user(user_id: str, db: AsyncSession = Depends(database.session)):
     """Получение информации о пользователе по ID"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id).limit(1))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    return UserResponse(
+    return FastJSONResponse(UserResponse(
         id=user.id,
         email=user.email,
         phone=user.phone,
@@ -418,22 +532,47 @@ async def get_user(user_id: str, db: Session = Depends(get_db)):
         clinic_license=user.clinic_license,
         created_at=user.created_at,
         updated_at=user.updated_at
-    )
+    ))
 
 @app.get("/users", response_model=dict)
 async def get_users(
     page: int = 1,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    role: Optional[str] = None,
+    cursor: Optional[str] = None,
+    ids: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(database.session)
 ):
-    """Получение списка пользователей"""
-    skip = (page - 1) * limit
+    """Получение списка пользователей: новые первыми, следующая и предыдущая страницы - по next_cursor/prev_cursor.
+
+    Страница по курсору выбирается по индексу (created_at, id) без OFFSET;
+    page > 1 без курсора - прежний переход по номеру страницы. total - из
+    счетчиков по ролям, без COUNT(*) по таблице.
+
+    ids (через запятую) - пакетный запрос, ответ как у POST /users/batch;
+    fields (через запятую) - поля пользователей в этом ответе.
+    """
+    if ids is not None:
+        return FastJSONResponse(await get_users_by_ids(
+            db,
+            [user_id for user_id in ids.split(",") if user_id],
+            [field for field in fields.split(",") if field] if fields else None
+        ))
     
-    # Получаем общее количество пользователей
-    total = db.query(User).count()
+    limit = max(1, min(limit, USERS_PAGE_MAX_LIMIT))
+    try:
+        page_cursor = decode_cursor(cursor) if cursor else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    skip = 0 if page_cursor else max(page - 1, 0) * limit
     
-    # Получаем пользователей с пагинацией
-    users = db.query(User).offset(skip).limit(limit).all()
+    query = select(User)
+    if role:
+        query = query.where(User.role == role)
+    rows = (await db.scalars(keyset_page(query, User.created_at, User.id, limit, page_cursor, skip))).all()
+    users, next_cursor, prev_cursor = split_page(rows, limit, page_cursor, lambda user: (user.created_at, user.id), skip)
+    total = await count_users(db, role)
     
     # Преобразуем в словари
     users_data = []
@@ -457,37 +596,42 @@ async def get_users(
             "updated_at": user.updated_at
         })
     
-    return {
+    return FastJSONResponse({
         "users": users_data,
         "total": total,
-        "page": page,
+        "page": None if page_cursor else page,
         "limit": limit,
-        "pages": (total + limit - 1) // limit
-    }
+        "pages": (total + limit - 1) // limit,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor
+    })
+
+DOCTOR_DIRECTORY_FIELDS = (
+    User.id, User.first_name, User.last_name, User.specialization, User.license_number,
+    User.experience_years, User.email, User.phone, User.is_active, User.is_verified,
+    User.created_at, User.updated_at
+)
+
+async def load_doctor_directory() -> list:
+    """Врачи для справочника: только нужные колонки, без объектов ORM"""
+    async with database.sessionmaker() as db:
+        rows = await db.execute(
+            select(*DOCTOR_DIRECTORY_FIELDS).where(User.role == "doctor").order_by(User.created_at, User.id)
+        )
+        return [dict(row) for row in rows.mappings()]
+
+# Справочник врачей собирается при изменении, а не на каждый запрос
+doctor_directory = DoctorDirectory(load_doctor_directory_settings(), load_doctor_directory)
 
 @app.get("/api/doctors/list")
-async def get_doctors_list(db: Session = Depends(get_db)):
-    """Получение списка врачей"""
-    doctors = db.query(User).filter(User.role == "doctor").all()
-    
-    doctors_data = []
-    for doctor in doctors:
-        doctors_data.append({
-            "id": doctor.id,
-            "first_name": doctor.first_name,
-            "last_name": doctor.last_name,
-            "specialization": doctor.specialization,
-            "license_number": doctor.license_number,
-            "experience_years": doctor.experience_years,
-            "email": doctor.email,
-            "phone": doctor.phone,
-            "is_active": doctor.is_active,
-            "is_verified": doctor.is_verified,
-            "created_at": doctor.created_at,
-            "updated_at": doctor.updated_at
-        })
-    
-    return {"doctors": doctors_data}
+async def get_doctors_list(request: Request):
+    """Получение списка врачей (ETag по версии справочника, If-None-Match - 304 без обращения к БД)"""
+    snapshot = await doctor_directory.get()
+    # no-cache - для прямых клиентов сервиса; API Gateway кэширует ответ сам и заменяет этот заголовок своим
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if snapshot.matches(request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(snapshot.body, media_type="application/json", headers=headers)
 
 @app.get("/health")
 async def health_check():
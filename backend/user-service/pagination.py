@@ -0,0 +1,82 @@
+"""
+@file: pagination.py
+@description: Курсорная (keyset) пагинация списка пользователей по (created_at, id)
+@dependencies: sqlalchemy
+@created: 2026-10-18
+"""
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, tuple_
+
+NEXT = "next"
+PREV = "prev"
+
+
+class InvalidCursor(ValueError):
+    """Курсор поврежден или выдан не этим сервисом"""
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """Ключ граничной строки страницы и направление перехода от нее"""
+    created_at: datetime
+    id: str
+    direction: str = NEXT
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """Непрозрачная строка для клиента: base64url от JSON без выравнивания"""
+    payload = json.dumps([cursor.created_at.isoformat(), cursor.id, cursor.direction], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(value: str) -> Cursor:
+    try:
+        padded = value + "=" * (-len(value) % 4)
+        created_at, id_, direction = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in (NEXT, PREV) or not isinstance(id_, str):
+            raise ValueError(direction)
+        return Cursor(datetime.fromisoformat(created_at), id_, direction)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {value}") from e
+
+
+def keyset_page(query: Select, created_at: Any, id_: Any, limit: int, cursor: Optional[Cursor],
+                offset: int = 0) -> Select:
+    """Запрос страницы: новые записи первыми, на одну строку больше limit - признак следующей страницы.
+
+    Страница "prev" выбирается в обратном порядке от ключа курсора; split_page
+    возвращает ее строки в обычном порядке. offset - только для первого
+    запроса без курсора (номер страницы у старых клиентов).
+    """
+    key = tuple_(created_at, id_)
+    if cursor is None:
+        return query.order_by(created_at.desc(), id_.desc()).offset(offset).limit(limit + 1)
+    bound = (cursor.created_at, cursor.id)
+    if cursor.direction == NEXT:
+        return query.where(key < bound).order_by(created_at.desc(), id_.desc()).limit(limit + 1)
+    return query.where(key > bound).order_by(created_at.asc(), id_.asc()).limit(limit + 1)
+
+
+def split_page(rows: Sequence[Any], limit: int, cursor: Optional[Cursor], key: Any,
+               offset: int = 0) -> Tuple[List[Any], Optional[str], Optional[str]]:
+    """Строки страницы и курсоры соседних страниц (None - страницы нет).
+
+    key(row) -> (created_at, id) граничной строки.
+    """
+    has_more = len(rows) > limit
+    rows = list(rows[:limit])
+    if cursor is not None and cursor.direction == PREV:
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = cursor is not None or offset > 0, has_more
+    if not rows:
+        return rows, None, None
+    next_cursor = encode_cursor(Cursor(*key(rows[-1]), NEXT)) if has_next else None
+    prev_cursor = encode_cursor(Cursor(*key(rows[0]), PREV)) if has_prev else None
+    return rows, next_cursor, prev_cursor
@@ -0,0 +1,158 @@
+"""
+@file: password_pool.py
+@description: Хеширование и проверка паролей (bcrypt) в пуле процессов вне event loop User Service
+@dependencies: passlib, concurrent.futures, shared/metrics.py
+@created: 2026-10-18
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from shared.log import get_logger
+from shared.metrics import (
+    PASSWORD_HASH_DURATION,
+    PASSWORD_HASH_PENDING,
+    PASSWORD_HASH_QUEUE_WAIT,
+    PASSWORD_HASH_REJECTED,
+)
+
+logger = get_logger(__name__)
+
+# Создается и в процессах пула: хеширование выполняется там
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+HASH = "hash"
+VERIFY = "verify"
+
+
+@dataclass(frozen=True)
+class PasswordPoolSettings:
+    """Настройки пула хеширования паролей"""
+    # Процессов пула; bcrypt занимает ядро целиком, поэтому по умолчанию - по числу ядер
+    workers: int = 1
+    # Задач сверх числа процессов, ожидающих в очереди; следующие отклоняются (503)
+    max_queue: int = 64
+    # spawn: процесс пула не наследует потоки и блокировки сервиса (журнал, соединения БД)
+    start_method: str = "spawn"
+
+
+def load_password_pool_settings() -> PasswordPoolSettings:
+    workers = int(os.getenv("PASSWORD_POOL_WORKERS", "0")) or os.cpu_count() or 1
+    return PasswordPoolSettings(
+        workers=workers,
+        max_queue=int(os.getenv("PASSWORD_POOL_MAX_QUEUE", str(workers * 16))),
+        start_method=os.getenv("PASSWORD_POOL_START_METHOD", "spawn"),
+    )
+
+
+class PasswordPoolOverloaded(Exception):
+    """Очередь пула заполнена: запрос отклоняется сразу, а не ждет десятки хеширований"""
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    return pwd_context.verify(password, password_hash)
+
+
+def _timed(func: Callable[..., Any], *args: Any) -> Tuple[Any, float, float]:
+    """Вызов в процессе пула: результат, время начала и длительность"""
+    started = time.time()
+    result = func(*args)
+    return result, started, time.time() - started
+
+
+class PasswordPool:
+    """Пул процессов для bcrypt с ограниченной очередью.
+
+    Хеширование занимает десятки миллисекунд процессора; в обработчике
+    async def оно останавливает все запросы процесса. Пул выполняет его в
+    отдельных процессах (GIL не мешает), а число задач в очереди ограничено:
+    при всплеске входов лишние запросы получают 503 сразу, вместо того чтобы
+    ждать дольше таймаута клиента. Процессы создаются при первом вызове или
+    в warm_up, уже после запуска сервиса.
+    """
+
+    def __init__(self, settings: PasswordPoolSettings):
+        self.settings = settings
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        """Задач в работе и в очереди, после которых новые отклоняются"""
+        return self.settings.workers + self.settings.max_queue
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.settings.workers,
+                mp_context=multiprocessing.get_context(self.settings.start_method),
+            )
+        return self._executor
+
+    def _submit(self, func: Callable[..., Any], *args: Any) -> "Future":
+        try:
+            return self._get_executor().submit(_timed, func, *args)
+        except BrokenProcessPool:
+            # Процесс пула завершился аварийно: пул пересоздается
+            logger.warning("password_pool_restarted", workers=self.settings.workers)
+            self._executor = None
+            return self._get_executor().submit(_timed, func, *args)
+
+    async def run(self, operation: str, func: Callable[..., Any], *args: Any) -> Any:
+        """Выполнение func(*args) в процессе пула; PasswordPoolOverloaded, если очередь заполнена"""
+        if self._pending >= self.capacity:
+            self.rejected += 1
+            PASSWORD_HASH_REJECTED.labels(operation).inc()
+            raise PasswordPoolOverloaded(f"Password pool queue is full ({self._pending} pending)")
+
+        self._pending += 1
+        PASSWORD_HASH_PENDING.inc()
+        submitted = time.time()
+        try:
+            # Отмена запроса снимает задачу из очереди, если процесс ее еще не взял
+            result, started, duration = await asyncio.wrap_future(self._submit(func, *args))
+        finally:
+            self._pending -= 1
+            PASSWORD_HASH_PENDING.dec()
+        self.completed += 1
+        PASSWORD_HASH_QUEUE_WAIT.labels(operation).observe(max(0.0, started - submitted))
+        PASSWORD_HASH_DURATION.labels(operation).observe(duration)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self.run(HASH, hash_password, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self.run(VERIFY, verify_password, password, password_hash)
+
+    async def warm_up(self) -> None:
+        """Запуск всех процессов заранее, чтобы первые входы не ждали старта интерпретатора"""
+        executor = self._get_executor()
+        await asyncio.gather(*(asyncio.wrap_future(executor.submit(os.getpid)) for _ in range(self.settings.workers)))
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.settings.workers,
+            "max_queue": self.settings.max_queue,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
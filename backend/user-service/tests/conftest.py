@@ -16,8 +16,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 @pytest.fixture
 def client():
-    """Фикстура для тестового клиента FastAPI"""
-    return TestClient(app)
+    """Фикстура для тестового клиента FastAPI (с lifespan: таблицы БД, пул хеширования)"""
+    with TestClient(app) as test_client:
+        yield test_client
 
 @pytest.fixture
 def test_user_data():
@@ -0,0 +1,142 @@
+"""
+@file: test_doctor_directory.py
+@description: Тесты справочника врачей: ETag и 304 без обращения к БД, сброс версии при изменении врача
+@dependencies: pytest, fastapi, main.py, doctor_directory.py
+@created: 2026-10-18
+"""
+import asyncio
+import uuid
+
+from fastapi.testclient import TestClient
+
+from doctor_directory import DoctorDirectory, DoctorDirectorySettings
+from main import User, create_access_token, database, doctor_directory, increment_user_counter
+
+def _seed_doctor(client: TestClient) -> User:
+    doctor = User(
+        id=str(uuid.uuid4()), email=f"doctor-{uuid.uuid4().hex[:8]}@example.com", password_hash="hash",
+        first_name="Directory", last_name="Doctor", role="doctor", specialization="therapist",
+    )
+
+    async def seed():
+        async with database.sessionmaker() as db:
+            db.add(doctor)
+            await increment_user_counter(db, "doctor")
+            await db.commit()
+        await doctor_directory.invalidate()
+
+    client.portal.call(seed)
+    return doctor
+
+class FakeRedis:
+    """Минимальный Redis в памяти: get/set/getset/incr, истечение ключей с ex - вручную"""
+
+    def __init__(self):
+        self.data = {}
+        self.expiring = set()
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError("redis is down")
+
+    async def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self._check()
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        if ex is not None:
+            self.expiring.add(key)
+
+    async def getset(self, key, value):
+        previous = await self.get(key)
+        await self.set(key, value)
+        return previous
+
+    async def incr(self, key):
+        self._check()
+        value = int(self.data.get(key, b"0")) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+    def expire(self):
+        for key in self.expiring:
+            self.data.pop(key, None)
+        self.expiring.clear()
+
+def _shared_directory(doctors: list) -> tuple:
+    async def load():
+        return list(doctors)
+
+    # ttl=0: копия в памяти процесса не используется, каждый запрос читает Redis
+    directory = DoctorDirectory(DoctorDirectorySettings(ttl=0, backend="memory"), load)
+    redis = FakeRedis()
+    directory._redis = redis
+    return directory, redis
+
+def test_shared_directory_changes_version_when_expired_body_differs():
+    """Тест Redis: тело, пересобранное после TTL с другими данными (без invalidate), получает новую версию"""
+    doctors = [{"id": "1", "specialization": "therapist"}]
+    directory, redis = _shared_directory(doctors)
+
+    async def scenario():
+        first = await directory.get()
+        redis.expire()
+        same = await directory.get()
+        doctors[0] = {"id": "1", "specialization": "cardiologist"}
+        redis.expire()
+        changed = await directory.get()
+        return first, same, changed
+
+    first, same, changed = asyncio.run(scenario())
+    assert same.etag == first.etag
+    assert changed.etag != first.etag
+    assert b"cardiologist" in changed.body
+
+def test_shared_directory_applies_invalidation_made_while_redis_was_down():
+    """Тест Redis: invalidate при недоступном Redis увеличивает версию в Redis после восстановления"""
+    directory, redis = _shared_directory([{"id": "1"}])
+
+    async def scenario():
+        before = await directory.get()
+        redis.down = True
+        await directory.invalidate()
+        redis.down = False
+        directory._redis_down_until = 0.0
+        return before, await directory.get()
+
+    before, after = asyncio.run(scenario())
+    assert after.etag != before.etag
+    assert after.version.startswith("r")
+
+def test_not_modified_served_without_rebuild(client: TestClient):
+    """Тест: повторный запрос с If-None-Match - 304 с тем же ETag, справочник не пересобирается"""
+    doctor = _seed_doctor(client)
+
+    response = client.get("/api/doctors/list")
+    assert response.status_code == 200
+    assert doctor.id in [item["id"] for item in response.json()["doctors"]]
+    etag = response.headers["etag"]
+
+    rebuilds = doctor_directory.rebuilds
+    cached = client.get("/api/doctors/list", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert doctor_directory.rebuilds == rebuilds
+
+def test_doctor_update_invalidates_directory(client: TestClient):
+    """Тест: PUT /auth/me врача меняет версию, новый ответ содержит изменение"""
+    doctor = _seed_doctor(client)
+    etag = client.get("/api/doctors/list").headers["etag"]
+
+    token = create_access_token(data={"user_id": doctor.id, "email": doctor.email, "role": doctor.role})
+    updated = client.put("/auth/me", json={"specialization": "cardiologist"}, headers={"Authorization": f"Bearer {token}"})
+    assert updated.status_code == 200
+
+    response = client.get("/api/doctors/list", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    entry = next(item for item in response.json()["doctors"] if item["id"] == doctor.id)
+    assert entry["specialization"] == "cardiologist"
@@ -0,0 +1,65 @@
+"""
+@file: test_pagination.py
+@description: Тесты курсорной пагинации GET /users: порядок, переходы вперед и назад, фильтр по роли, total из счетчиков
+@dependencies: pytest, fastapi, main.py, pagination.py
+@created: 2026-10-18
+"""
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from main import User, database, increment_user_counter
+
+def _seed_users(client: TestClient, role: str, count: int) -> list:
+    """Пользователи с отдельной ролью (список не зависит от других тестов); у пар - одинаковый created_at"""
+    created = datetime(2026, 10, 18, 12, 0, 0)
+    users = [
+        User(
+            id=f"{role}-{index:02d}", email=f"{role}-{index}@example.com", password_hash="hash",
+            first_name="Page", last_name="User", role=role, created_at=created + timedelta(seconds=index // 2),
+        )
+        for index in range(count)
+    ]
+
+    async def seed():
+        async with database.sessionmaker() as db:
+            db.add_all(users)
+            await increment_user_counter(db, role, count)
+            await db.commit()
+
+    client.portal.call(seed)
+    # Ожидаемый порядок: новые первыми, при равном created_at - по убыванию id
+    return [user.id for user in sorted(users, key=lambda user: (user.created_at, user.id), reverse=True)]
+
+def _ids(response) -> list:
+    return [user["id"] for user in response.json()["users"]]
+
+def test_cursor_pages_forward_and_back(client: TestClient):
+    """Тест: страницы по next_cursor без пропусков и повторов, prev_cursor возвращает предыдущую страницу"""
+    role = f"pagination-{uuid.uuid4().hex[:8]}"
+    expected = _seed_users(client, role, 7)
+
+    first = client.get("/users", params={"role": role, "limit": 3})
+    assert first.status_code == 200
+    assert first.json()["total"] == 7 and first.json()["pages"] == 3
+    assert first.json()["prev_cursor"] is None
+
+    pages = [first]
+    while pages[-1].json()["next_cursor"]:
+        pages.append(client.get("/users", params={"role": role, "limit": 3, "cursor": pages[-1].json()["next_cursor"]}))
+    assert [_ids(page) for page in pages] == [expected[0:3], expected[3:6], expected[6:7]]
+
+    back = client.get("/users", params={"role": role, "limit": 3, "cursor": pages[2].json()["prev_cursor"]})
+    assert _ids(back) == expected[3:6]
+    start = client.get("/users", params={"role": role, "limit": 3, "cursor": back.json()["prev_cursor"]})
+    assert _ids(start) == expected[0:3]
+    assert start.json()["prev_cursor"] is None
+
+    # Старые клиенты: номер страницы
+    assert _ids(client.get("/users", params={"role": role, "limit": 3, "page": 2})) == expected[3:6]
+
+def test_invalid_cursor_rejected(client: TestClient):
+    """Тест: поврежденный курсор - 400"""
+    response = client.get("/users", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
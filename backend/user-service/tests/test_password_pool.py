@@ -0,0 +1,60 @@
+"""
+@file: test_password_pool.py
+@description: Тесты пула хеширования паролей: работа вне event loop, ограничение очереди, отказ 503
+@dependencies: pytest, fastapi, password_pool.py
+@created: 2026-10-18
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from password_pool import PasswordPool, PasswordPoolOverloaded, PasswordPoolSettings
+
+def _sample(name: str, operation: str) -> float:
+    return REGISTRY.get_sample_value(name, {"operation": operation}) or 0.0
+
+def test_pool_runs_off_loop_and_rejects_overflow():
+    """Тест: задачи идут в процессах пула, лишняя задача сверх очереди отклоняется сразу"""
+    pool = PasswordPool(PasswordPoolSettings(workers=1, max_queue=1))
+    rejected_before = _sample("password_hash_rejected_total", "hash")
+    waits_before = _sample("password_hash_queue_wait_seconds_count", "hash")
+
+    async def scenario():
+        await pool.warm_up()
+        jobs = [asyncio.create_task(pool.run("hash", time.sleep, 0.3)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordPoolOverloaded):
+            await pool.run("hash", time.sleep, 0.3)
+
+        # Пока процесс пула занят, event loop продолжает обслуживать другие задачи
+        ticks = 0
+        started = time.perf_counter()
+        while not all(job.done() for job in jobs):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        await asyncio.gather(*jobs)
+        return ticks, time.perf_counter() - started
+
+    try:
+        ticks, elapsed = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert elapsed >= 0.5  # задачи выполнялись одна за другой в единственном процессе
+    assert ticks >= 20
+    assert pool.stats() == {"workers": 1, "max_queue": 1, "pending": 0, "completed": 2, "rejected": 1}
+    assert _sample("password_hash_rejected_total", "hash") == rejected_before + 1
+    assert _sample("password_hash_queue_wait_seconds_count", "hash") == waits_before + 2
+
+def test_register_returns_503_when_pool_is_full(client: TestClient, test_user_data, monkeypatch):
+    """Тест: при заполненной очереди хеширования регистрация получает 503 и Retry-After"""
+    from main import password_pool
+    monkeypatch.setattr(password_pool, "_pending", password_pool.capacity)
+
+    response = client.post("/auth/register", json={**test_user_data, "email": "overload@example.com", "role": "patient"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
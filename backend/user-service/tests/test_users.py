@@ -124,3 +124,12 @@ def test_users_endpoint_methods(client: TestClient, auth_headers):
     # DELETE не должен работать
     response = client.delete("/users", headers=auth_headers)
     assert response.status_code == 405  # Method Not Allowed
+
+def test_metrics_endpoint(client: TestClient):
+    """Тест эндпоинта /metrics с метками по шаблону маршрута"""
+    client.get("/users/some-user-id")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert 'route="/users/{user_id}"' in response.text
+    assert "some-user-id" not in response.text
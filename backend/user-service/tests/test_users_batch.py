@@ -0,0 +1,54 @@
+"""
+@file: test_users_batch.py
+@description: Тесты пакетного запроса пользователей POST /users/batch и GET /users?ids=
+@dependencies: pytest, fastapi, main.py
+@created: 2026-10-18
+"""
+import uuid
+
+from fastapi.testclient import TestClient
+
+from main import USERS_BATCH_MAX_IDS, User, database
+
+def _seed_users(client: TestClient, count: int) -> list:
+    users = [
+        User(
+            id=str(uuid.uuid4()), email=f"batch-{uuid.uuid4().hex[:8]}@example.com", password_hash="hash",
+            first_name=f"Batch{index}", last_name="User", role="patient",
+        )
+        for index in range(count)
+    ]
+
+    async def seed():
+        async with database.sessionmaker() as db:
+            db.add_all(users)
+            await db.commit()
+
+    client.portal.call(seed)
+    return [user.id for user in users]
+
+def test_batch_returns_requested_fields(client: TestClient):
+    """Тест: найденные пользователи по ID только с запрошенными полями, ненайденные - в missing"""
+    ids = _seed_users(client, 3)
+    response = client.post("/users/batch", json={"ids": ids + ["unknown", ids[0]], "fields": ["first_name", "last_name"]})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert set(data["users"]) == set(ids)
+    assert data["users"][ids[1]] == {"id": ids[1], "first_name": "Batch1", "last_name": "User"}
+    assert data["missing"] == ["unknown"]
+
+def test_batch_query_string_matches_post(client: TestClient):
+    """Тест: GET /users?ids= возвращает то же, что POST /users/batch; без fields - все поля UserResponse"""
+    ids = _seed_users(client, 2)
+    response = client.get("/users", params={"ids": ",".join(ids)})
+
+    assert response.status_code == 200
+    assert response.json() == client.post("/users/batch", json={"ids": ids}).json()
+    assert "password_hash" not in response.json()["users"][ids[0]]
+
+def test_batch_rejects_unknown_fields_and_too_many_ids(client: TestClient):
+    """Тест: неизвестное (в том числе закрытое) поле и превышение лимита ID - 400"""
+    assert client.post("/users/batch", json={"ids": ["a"], "fields": ["password_hash"]}).status_code == 400
+    ids = [str(index) for index in range(USERS_BATCH_MAX_IDS + 1)]
+    assert client.post("/users/batch", json={"ids": ids}).status_code == 400